@@ -1,16 +1,24 @@
+import os
 
 import requests
 
+from sitefix.httpcache import HTTPCache
+
 urls = [
     "https://srrn.net/Michael-Webster-640x360-1.mp4",
     "https://srrn.net/wp-content/uploads/Michael-Webster-640x360-1.mp4",
     "https://srrn.net/wp-content/uploads/2021/09/Michael-Webster-640x360-1.mp4"
 ]
 
+# HEAD results are cached for an hour in .sitefix/http-cache
+cache = HTTPCache(os.getcwd(), ttl=3600)
+session = requests.Session()
+
 print("Checking video URLs...")
 for url in urls:
     try:
-        r = requests.head(url, allow_redirects=True, timeout=5)
-        print(f"{url}: {r.status_code}")
+        r = cache.head(session, url, allow_redirects=True, timeout=5)
+        print(f"{url}: {r.status_code}{' (cached)' if r.from_cache else ''}")
     except Exception as e:
         print(f"{url}: Error {e}")
+cache.save()
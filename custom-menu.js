@@ -13,6 +13,20 @@
         initMobileMenu();
         initSearch();
     }
+    initVideoFacades();
+
+    function initVideoFacades() {
+        // Swap a YouTube click-to-load facade (sitefix youtube-facade) for
+        // the player kept in its <template>
+        document.addEventListener('click', function(e) {
+            const facade = e.target.closest && e.target.closest('.yt-facade');
+            if (!facade) return;
+            const template = facade.querySelector('template');
+            if (!template) return;
+            e.preventDefault();
+            facade.replaceWith(template.content.cloneNode(true));
+        });
+    }
 
     function initSearch() {
         const searchButtons = document.querySelectorAll('.et_pb_menu__search-button');
@@ -1,8 +1,10 @@
 
 import os
-import requests
 import re
 
+from sitefix.fetch import Downloader
+from sitefix.httpcache import HTTPCache
+
 REPO_ROOT = os.getcwd()
 HTML_FILE = os.path.join(REPO_ROOT, "about-us/index.html")
 ASSETS_DIR = os.path.join(REPO_ROOT, "assets")
@@ -11,28 +13,17 @@ LOGO_URL = "https://srrn.net/wp-content/uploads/2020/11/SRRN-Circle-Design-Teal-
 LOGO_LOCAL = os.path.join(LOGO_DIR, "SRRN-Circle-Design-Teal-480x467.png")
 JS_FILE = os.path.join(REPO_ROOT, "fix_toggles.js")
 
-def ensure_dir(path):
-    if not os.path.exists(path):
-        os.makedirs(path)
-
 def download_logo():
     print(f"Checking logo at {LOGO_LOCAL}...")
-    ensure_dir(LOGO_DIR)
-    if not os.path.exists(LOGO_LOCAL):
-        print(f"Downloading {LOGO_URL}...")
-        try:
-            headers = {'User-Agent': 'Mozilla/5.0'}
-            r = requests.get(LOGO_URL, headers=headers, timeout=10)
-            if r.status_code == 200:
-                with open(LOGO_LOCAL, 'wb') as f:
-                    f.write(r.content)
-                print("Logo downloaded successfully.")
-            else:
-                print(f"Failed to download logo. Status: {r.status_code}")
-        except Exception as e:
-            print(f"Error downloading logo: {e}")
+    # Revalidates an existing copy (If-None-Match / If-Modified-Since)
+    with Downloader(REPO_ROOT, cache=HTTPCache(REPO_ROOT)) as downloader:
+        result = downloader.fetch(LOGO_URL, LOGO_LOCAL)
+    if result.status == "downloaded":
+        print("Logo downloaded successfully.")
+    elif result.status == "not-modified":
+        print("Logo already up to date.")
     else:
-        print("Logo already exists.")
+        print(f"Failed to download logo: {result.error}")
 
 def create_toggle_script():
     print(f"Creating {JS_FILE}...")
@@ -1,41 +1,19 @@
 import os
 
+from sitefix.transforms import REPO_PATHS_REPLACER
+
 # Root directory
 ROOT_DIR = r"c:\Users\clark\OneDrive\Documents\AntiGravity\FFC-EX-SRRN.net"
-REPO_NAME = "/FFC-EX-SRRN.net/"
 
 def fix_paths(file_path):
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
             content = f.read()
         
-        # replacements map - simplified to replace any known relative asset path with absolute
-        # We target specific folders that we know are in the root
-        
-        replacements = {}
-        
-        # Prefixes to handle: ./, ../, ../../, and maybe nothing (if relative)
-        prefixes = ['./', '../', '../../', '../../../']
-        targets = ['assets/', 'wp-content/', 'wp-includes/', 'css/', 'js/', 'images/', 'feed/', 'comments/', 'xmlrpc.php']
-        
-        for prefix in prefixes:
-            for target in targets:
-                # href="...
-                old_href = f'href="{prefix}{target}'
-                new_href = f'href="{REPO_NAME}{target}'
-                replacements[old_href] = new_href
-                
-                # src="...
-                old_src = f'src="{prefix}{target}'
-                new_src = f'src="{REPO_NAME}{target}'
-                replacements[old_src] = new_src
-        
-        # Also handle specific css file name if it differs, but absolute path fix should solve 404 if file exists now.
-        
-        new_content = content
-        for old, new in replacements.items():
-            new_content = new_content.replace(old, new)
-            
+        # The 4 prefixes x 9 targets x 2 attributes table is compiled once in
+        # sitefix/transforms.py and applied in a single scan of the page
+        new_content = REPO_PATHS_REPLACER.replace(content)
+
         if new_content != content:
             with open(file_path, 'w', encoding='utf-8') as f:
                 f.write(new_content)
@@ -1,8 +1,9 @@
 
 import os
-import requests
 import re
-from pathlib import Path
+
+from sitefix.fetch import Downloader
+from sitefix.httpcache import HTTPCache
 
 # Configuration
 REPO_ROOT = os.getcwd()
@@ -15,30 +16,16 @@ LIVE_BASE_URL = "https://srrn.net/wp-content/uploads"
 PLACEHOLDER_URL = "https://srrn.net/wp-content/themes/Divi/includes/builder/images/placeholder-image-square.jpg" # Or generic
 PLACEHOLDER_LOCAL = os.path.join(ASSETS_DIR, "placeholder-user.jpg")
 
-def ensure_dir(path):
-    Path(path).parent.mkdir(parents=True, exist_ok=True)
-
-def download_file(url, local_path):
-    if os.path.exists(local_path):
-        print(f"Skipping (exists): {local_path}")
-        return True
-    
-    print(f"Downloading: {url} -> {local_path}")
-    try:
-        headers = {'User-Agent': 'Mozilla/5.0'}
-        r = requests.get(url, headers=headers, timeout=10)
-        if r.status_code == 200:
-            ensure_dir(local_path)
-            with open(local_path, 'wb') as f:
-                f.write(r.content)
-            print("Success.")
-            return True
+def download_files(jobs):
+    """Download [(url, local_path), ...] concurrently, revalidating existing files"""
+    with Downloader(REPO_ROOT, cache=HTTPCache(REPO_ROOT)) as downloader:
+        results = downloader.fetch_all(jobs)
+    for result in results:
+        if result.status == "failed":
+            print(f"Failed ({result.error}): {result.url}")
         else:
-            print(f"Failed (Status {r.status_code}): {url}")
-            return False
-    except Exception as e:
-        print(f"Error downloading {url}: {e}")
-        return False
+            print(f"{result.status.capitalize()}: {result.dest}")
+    return results
 
 def recover_assets():
     print(f"Scanning {HTML_FILE} for missing assets...")
@@ -49,13 +36,14 @@ def recover_assets():
     # Regex to find images pointing to our local structure /FFC-EX-SRRN.net/assets/uploads/...
     # Pattern: src="/FFC-EX-SRRN.net/assets/uploads/([^"]+)"
     matches = re.findall(r'src="/FFC-EX-SRRN.net/assets/uploads/([^"]+)"', content)
+    jobs = []
     
     for relative_path in matches:
         # relative_path is like "2021/09/image.jpg"
         local_path = os.path.join(UPLOADS_DIR, relative_path.replace("/", os.sep))
         live_url = f"{LIVE_BASE_URL}/{relative_path}"
         
-        download_file(live_url, local_path)
+        jobs.append((live_url, local_path))
 
     # Regex for srcset
     srcset_matches = re.findall(r'srcset="([^"]+)"', content)
@@ -75,10 +63,13 @@ def recover_assets():
                 
                 local_path = os.path.join(UPLOADS_DIR, clean.replace("/", os.sep))
                 live_url = f"{LIVE_BASE_URL}/{clean}"
-                download_file(live_url, local_path)
+                jobs.append((live_url, local_path))
 
     # Download Placeholder for Testimonials
-    download_file("https://secure.gravatar.com/avatar/ad516503a11cd5ca435acc9bb6523536?s=500", PLACEHOLDER_LOCAL)
+    jobs.append(("https://secure.gravatar.com/avatar/ad516503a11cd5ca435acc9bb6523536?s=500", PLACEHOLDER_LOCAL))
+
+    # All at once over pooled connections (duplicates removed)
+    download_files(list(dict.fromkeys(jobs)))
 
     # Inject Placeholder into Testimonials
     # We look for <div class="et_pb_testimonial_portrait"></div> and replace it with img
@@ -3,11 +3,18 @@
 Check Wayback Machine for archived versions of srrn.net pages.
 """
 
-import requests
-import json
+import os
 import sys
 
+import requests
+
+# Run from the repository root: python3 scripts/check_wayback.py
+sys.path.insert(0, os.getcwd())
+from sitefix.httpcache import HTTPCache
+
 BASE_URL = "https://archive.org/wayback/available"
+# Snapshot lookups rarely change; answer repeat runs from .sitefix/http-cache
+CACHE_TTL = 24 * 3600
 
 # Pages to check
 PAGES = [
@@ -28,9 +35,12 @@ print("=" * 70)
 print("Checking Wayback Machine for SRRN.net archives")
 print("=" * 70)
 
+cache = HTTPCache(os.getcwd(), ttl=CACHE_TTL)
+session = requests.Session()
+
 for page in PAGES:
     try:
-        response = requests.get(f"{BASE_URL}?url={page}", timeout=10)
+        response = cache.get(session, f"{BASE_URL}?url={page}", timeout=10)
         if response.status_code == 200:
             data = response.json()
             if data.get("archived_snapshots") and data["archived_snapshots"].get("closest"):
@@ -46,4 +56,6 @@ for page in PAGES:
     except Exception as e:
         print(f"\n❌ {page} - Error: {str(e)}")
 
+cache.save()
+print(f"\nHTTP cache: {cache.stats()}")
 print("\n" + "=" * 70)
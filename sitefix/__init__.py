@@ -0,0 +1,14 @@
+"""
+sitefix
+
+Site-wide fix pipeline for the scraped SRRN.net static site.
+
+The one-off fix scripts in the repository root (cache busters, footer and
+donate button injection, path rewrites) each re-read and re-write every page.
+sitefix registers those fixes as transforms and runs them through a single
+engine that reads each page once and writes it at most once.
+
+Usage (from the repository root):
+    python3 -m sitefix run               # default pipeline over every page
+    python3 -m sitefix run --list        # show registered transforms
+"""
@@ -0,0 +1,551 @@
+"""
+Command line entry point: python3 -m sitefix <command> [options]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from . import engine
+from . import fingerprint
+from . import refindex
+from . import state
+from . import transforms
+
+
+def cmd_run(args):
+    """Run the transform pipeline over every page"""
+    if args.list:
+        for name, t in transforms.REGISTRY.items():
+            marker = "*" if name in transforms.DEFAULT_PIPELINE else " "
+            print(f"{marker} {name:<28} v{t.version_for(args.root):<14} {t.description}")
+        print("\n* = part of the default pipeline")
+        return 0
+
+    if args.jobs < 1:
+        print("❌ Error: --jobs must be at least 1", file=sys.stderr)
+        return 2
+    names = args.only.split(",") if args.only else None
+    try:
+        report = engine.run(args.root, names, dry_run=args.dry_run, verbose=args.verbose,
+                            incremental=not args.full, jobs=args.jobs)
+    except KeyError as e:
+        print(f"❌ Error: {e.args[0]}", file=sys.stderr)
+        return 2
+    report.print_summary(verbose=args.verbose)
+    if args.report:
+        state.save_json(args.report, {"pages": report.notes_by_page()})
+        print(f"Notes written to {args.report}")
+    return 1 if report.errors else 0
+
+
+def cmd_fingerprint(args):
+    """Hash assets and refresh the asset manifest"""
+    previous = fingerprint.load_manifest(args.root)
+    assets, changed, hashed = fingerprint.build_manifest(args.root)
+    fingerprint.save_manifest(args.root, assets)
+    removed = sorted(set(previous) - set(assets))
+
+    print(f"Assets: {len(assets)} ({hashed} hashed, {len(assets) - hashed} unchanged by size/mtime)")
+    print(f"Changed since last manifest: {len(changed)}")
+    print(f"Removed since last manifest: {len(removed)}")
+    if args.verbose:
+        for rel_path in changed:
+            print(f"  ~ {rel_path} -> {assets[rel_path]['hash']}")
+        for rel_path in removed:
+            print(f"  - {rel_path}")
+    print(f"Manifest: {fingerprint.MANIFEST_PATH}")
+    if changed and previous:
+        print("Run 'python3 -m sitefix run' to update references on affected pages.")
+    return 0
+
+
+def cmd_index(args):
+    """Index every reference and report missing assets and broken links"""
+    start = time.perf_counter()
+    report = refindex.build_report(args.root, jobs=max(1, args.jobs))
+    output = args.output or os.path.join(args.root, refindex.REPORT_PATH)
+    state.save_json(output, report)
+
+    summary = report["summary"]
+    print("=" * 60)
+    print(f"References: {summary['references']} ({summary['external']} external)")
+    print(f"OK: {summary['ok']}")
+    print(f"Missing: {summary['missing']} references to {summary['missing-targets']} targets")
+    print(f"Broken fragments: {summary['broken-fragment']}")
+    if args.verbose:
+        for entry in report["missing"]:
+            print(f"  ✗ [{entry['type']}] {entry['target']} ({len(entry['sources'])} referencing files)")
+        for entry in report["broken_fragments"]:
+            print(f"  # {entry['source']}: {entry['url']}")
+    print(f"Report: {output}")
+    print(f"Time: {(time.perf_counter() - start) * 1000:.0f} ms")
+    print("=" * 60)
+    return 1 if args.strict and (summary["missing"] or summary["broken-fragment"]) else 0
+
+
+def cmd_recover(args):
+    """Download missing assets from the live origin"""
+    # Imported here so the offline commands do not need requests installed
+    from . import fetch
+    from . import httpcache
+    from . import recover
+
+    if args.concurrency < 1:
+        print("❌ Error: --concurrency must be at least 1", file=sys.stderr)
+        return 2
+    rel_paths = list(args.paths) or recover.missing_from_report(args.root, args.report)
+    if args.refresh:
+        rel_paths += sorted(fetch.load_meta(args.root))
+    jobs, unmapped = recover.plan(args.root, rel_paths, args.origin)
+
+    print(f"Assets to recover: {len(jobs)} ({len(unmapped)} with no origin path)")
+    if args.dry_run:
+        for url, dest in jobs:
+            print(f"  {os.path.relpath(dest, args.root)} <- {url}")
+        return 0
+
+    cache = None if args.no_cache or args.force else httpcache.HTTPCache(args.root, ttl=args.ttl)
+    start = time.perf_counter()
+    results, _ = recover.recover(args.root, rel_paths, args.origin, concurrency=args.concurrency,
+                                 retries=args.retries, revalidate=not args.force, cache=cache)
+    elapsed = time.perf_counter() - start
+
+    counts = {"downloaded": 0, "cached": 0, "not-modified": 0, "failed": 0}
+    for result in results:
+        counts[result.status] += 1
+        if result.status == "failed":
+            print(f"  ❌ {result.url}: {result.error}")
+        elif args.verbose:
+            print(f"  ✓ [{result.status}] {os.path.relpath(result.dest, args.root)} ({result.bytes} bytes)")
+    if args.verbose:
+        for rel_path in unmapped:
+            print(f"  ? {rel_path} (no origin path)")
+
+    print("=" * 60)
+    print(f"Downloaded: {counts['downloaded']} ({sum(r.bytes for r in results) / 1e6:.1f} MB)")
+    print(f"From cache: {counts['cached']}")
+    print(f"Not modified: {counts['not-modified']}")
+    print(f"Failed: {counts['failed']}")
+    print(f"Time: {elapsed:.1f} s with {args.concurrency} connections")
+    print("=" * 60)
+    return 1 if counts["failed"] else 0
+
+
+def cmd_wayback(args):
+    """Fill missing assets and LFS stubs from Wayback Machine captures"""
+    from . import recover
+    from . import wayback
+
+    if args.concurrency < 1 or args.rate <= 0:
+        print("❌ Error: --concurrency must be at least 1 and --rate positive", file=sys.stderr)
+        return 2
+    rel_paths = list(args.paths) or recover.missing_from_report(args.root, args.report)
+    if not args.paths and not args.no_stubs:
+        rel_paths += wayback.lfs_stubs(args.root)
+
+    if args.dry_run:
+        recovery = wayback.WaybackRecovery(args.root, args.archive, args.concurrency, args.rate)
+        try:
+            targets = wayback.make_targets(rel_paths)
+            found = recovery.lookup(targets)
+        finally:
+            recovery.close()
+        for target in found:
+            print(f"  {target.rel_path} <- {wayback.capture_url(*target.capture, archive=args.archive)}")
+        print(f"Captures found: {len(found)} of {len(targets)}")
+        return 0
+
+    targets, results, errors, elapsed = wayback.recover_from_wayback(
+        args.root, rel_paths, args.archive, args.concurrency, args.rate)
+    found = sum(1 for target in targets if target.capture)
+    downloaded = [r for r in results if r.status in ("downloaded", "cached")]
+    failed = [r for r in results if r.status == "failed"]
+    for url, error in errors:
+        print(f"  ❌ lookup {url}: {error}")
+    for result in failed:
+        print(f"  ❌ {result.url}: {result.error}")
+    if args.verbose:
+        for result in downloaded:
+            print(f"  ✓ {os.path.relpath(result.dest, args.root)} ({result.bytes} bytes)")
+        for target in targets:
+            if not target.capture:
+                print(f"  ? {target.rel_path} (no capture)")
+
+    print("=" * 60)
+    print(f"Targets: {len(targets)}")
+    print(f"Captures found: {found}")
+    print(f"Recovered: {len(downloaded)} ({sum(r.bytes for r in downloaded) / 1e6:.1f} MB)")
+    print(f"Failed: {len(failed) + len(errors)}")
+    print(f"Time: {elapsed:.1f} s")
+    print("=" * 60)
+    return 1 if failed or errors else 0
+
+
+def cmd_responsive(args):
+    """Generate responsive image variants referenced by srcset but missing"""
+    from . import responsive
+
+    if args.jobs < 1:
+        print("❌ Error: --jobs must be at least 1", file=sys.stderr)
+        return 2
+    report = responsive.build(args.root, jobs=args.jobs, force=args.force, dry_run=args.dry_run)
+    if args.dry_run:
+        for source, outputs in sorted(report.plan.tasks.items()):
+            for rel_path, width, height in outputs:
+                print(f"  {rel_path} <- {source}")
+    report.print_summary(args.verbose)
+    return 1 if report.errors else 0
+
+
+def cmd_webp(args):
+    """Encode WebP siblings for every raster referenced by a page"""
+    from . import webp
+
+    if args.jobs < 1 or not 0 < args.quality <= 100:
+        print("❌ Error: --jobs must be at least 1 and --quality in 1-100", file=sys.stderr)
+        return 2
+    report = webp.build(args.root, jobs=args.jobs, quality=args.quality, force=args.force)
+    report.print_summary(args.verbose)
+    if report.encoded:
+        print("Run 'python3 -m sitefix run' to wrap images in <picture> on affected pages.")
+    return 1 if report.errors else 0
+
+
+def cmd_optimize(args):
+    """Recompress PNG/JPEG assets losslessly or within a PSNR tolerance"""
+    from . import optimize
+
+    if args.jobs < 1:
+        print("❌ Error: --jobs must be at least 1", file=sys.stderr)
+        return 2
+    report = optimize.optimize(args.root, args.paths, jobs=args.jobs, min_psnr=args.min_psnr,
+                               force=args.force, dry_run=args.dry_run)
+    report.print_summary(args.verbose)
+    if report.optimized and not args.dry_run:
+        print("Run 'python3 -m sitefix webp' and 'python3 -m sitefix run' to refresh siblings and references.")
+    return 1 if report.errors else 0
+
+
+def cmd_purge_css(args):
+    """Drop CSS rules that match nothing in any page or script"""
+    from . import purge
+
+    if args.jobs < 1:
+        print("❌ Error: --jobs must be at least 1", file=sys.stderr)
+        return 2
+    report = purge.purge(args.root, args.paths, jobs=args.jobs, allow=args.allow, dry_run=args.dry_run)
+    report.print_summary(args.verbose)
+    if args.report:
+        state.save_json(args.report, report.as_json())
+        print(f"Report written to {args.report}")
+    if any(row[4] for row in report.files) and not args.dry_run:
+        print("Run 'python3 -m sitefix run' to refresh fingerprints and critical CSS.")
+    return 1 if report.errors else 0
+
+
+def cmd_compact_css(args):
+    """Merge same-selector rules and drop overridden declarations in hand-maintained CSS"""
+    from . import compact
+
+    report = compact.compact(args.root, args.paths or ["css/custom-fixes.css"], dry_run=args.dry_run)
+    report.print_summary(args.verbose, diff=args.diff)
+    if args.report:
+        state.save_json(args.report, report.as_json())
+        print(f"Report written to {args.report}")
+    if any(row[5] for row in report.files) and not args.dry_run:
+        print("Run 'python3 -m sitefix run' to refresh fingerprints and critical CSS.")
+    return 1 if report.errors else 0
+
+
+def cmd_style_classes(args):
+    """Replace repeated style attributes with classes in one shared stylesheet"""
+    from . import styleclasses
+
+    if args.jobs < 1:
+        print("❌ Error: --jobs must be at least 1", file=sys.stderr)
+        return 2
+    if args.min_uses < 1:
+        print("❌ Error: --min-uses must be at least 1", file=sys.stderr)
+        return 2
+    report = styleclasses.build(args.root, jobs=args.jobs, min_uses=args.min_uses, dry_run=args.dry_run)
+    report.print_summary(args.verbose)
+    if args.report:
+        state.save_json(args.report, report.as_json())
+        print(f"Report written to {args.report}")
+    if not args.dry_run:
+        print("Run 'python3 -m sitefix run' to rewrite the style attributes.")
+    return 0
+
+
+def cmd_archive_extract(args):
+    """Extract the news archive's post cards and page template"""
+    from . import archive
+
+    report = archive.extract(args.root, model=args.model, dry_run=args.dry_run)
+    report.print_summary(args.verbose)
+    if args.report:
+        state.save_json(args.report, report.as_json())
+        print(f"Report written to {args.report}")
+    if report.errors:
+        return 1
+    if not args.dry_run:
+        print(f"Run 'python3 -m sitefix archive-render' to rebuild the archive pages from {archive.DATA_PATH}.")
+    return 0
+
+
+def cmd_archive_render(args):
+    """Rebuild the news archive pages from the post data and the template"""
+    from . import archive
+
+    report = archive.render(args.root, dry_run=args.dry_run)
+    report.print_summary(args.verbose)
+    if args.report:
+        state.save_json(args.report, report.as_json())
+        print(f"Report written to {args.report}")
+    if report.errors:
+        return 1
+    if not args.dry_run:
+        print("Run 'python3 -m sitefix run' to apply the pipeline to the rebuilt pages.")
+    return 0
+
+
+def cmd_minify_html(args):
+    """Report what minify-html saves on every page, raw and gzipped"""
+    from . import htmlmin
+
+    if args.jobs < 1:
+        print("❌ Error: --jobs must be at least 1", file=sys.stderr)
+        return 2
+    report = htmlmin.measure(args.root, jobs=args.jobs)
+    report.print_summary(args.verbose)
+    if args.report:
+        state.save_json(args.report, report.as_json())
+        print(f"Report written to {args.report}")
+    print("Run 'python3 -m sitefix run' to minify the pages (minify-html is the last default transform).")
+    return 0
+
+
+def cmd_hoist(args):
+    """Move inline blocks that many pages repeat into shared files"""
+    from . import hoist
+
+    if args.jobs < 1:
+        print("❌ Error: --jobs must be at least 1", file=sys.stderr)
+        return 2
+    report = hoist.build(args.root, jobs=args.jobs, shared_pages=args.pages, min_bytes=args.min_bytes,
+                         dry_run=args.dry_run)
+    report.print_summary(args.verbose)
+    if args.report:
+        state.save_json(args.report, report.as_json())
+        print(f"Report written to {args.report}")
+    if not args.dry_run:
+        print("Run 'python3 -m sitefix run' to load the shared files from the pages.")
+    return 0
+
+
+def cmd_bundle(args):
+    """Merge scripts and stylesheets that load together into shared bundles"""
+    from . import bundle
+
+    if args.jobs < 1:
+        print("❌ Error: --jobs must be at least 1", file=sys.stderr)
+        return 2
+    report = bundle.build(args.root, jobs=args.jobs, dry_run=args.dry_run)
+    report.print_summary(args.verbose)
+    if args.report:
+        state.save_json(args.report, report.as_json())
+        print(f"Report written to {args.report}")
+    if not args.dry_run:
+        print("Run 'python3 -m sitefix run' to point pages at the bundles and refresh fingerprints.")
+    return 0
+
+
+def cmd_youtube(args):
+    """Cache poster images for every embedded YouTube video"""
+    from . import httpcache
+    from . import thirdparty
+
+    videos = thirdparty.embedded_videos(args.root, args.jobs)
+    posters = thirdparty.get_posters(args.root)
+    print(f"Embedded YouTube videos: {len(videos)} ({len(posters & set(videos))} with a local poster)")
+    if args.verbose:
+        for vid, pages in sorted(videos.items()):
+            print(f"  {vid}: {', '.join(pages)}")
+    if args.dry_run:
+        return 0
+
+    cache = None if args.no_cache else httpcache.HTTPCache(args.root)
+    results = thirdparty.fetch_posters(args.root, sorted(videos), base=args.base,
+                                       concurrency=args.concurrency, cache=cache, refresh=args.refresh)
+    failed = [result for result in results.values() if result.status == "failed"]
+    for vid, result in sorted(results.items()):
+        if result.status == "failed":
+            print(f"  ❌ {vid}: {result.error}")
+        elif args.verbose:
+            print(f"  ✓ [{result.status}] {os.path.relpath(result.dest, args.root)} <- {result.url}")
+    print(f"Posters fetched: {len(results) - len(failed)}, failed: {len(failed)}")
+    if len(results) > len(failed):
+        print("Run 'python3 -m sitefix run' to replace the embeds with facades.")
+    return 1 if failed else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python3 -m sitefix", description=__doc__)
+    parser.add_argument("--root", default=os.getcwd(), help="site root (default: current directory)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="apply site-wide fixes in a single pass")
+    run_parser.add_argument("--only", help="comma-separated transform names, in order")
+    run_parser.add_argument("--dry-run", action="store_true", help="report changes without writing")
+    run_parser.add_argument("--verbose", action="store_true", help="list every updated page and every note")
+    run_parser.add_argument("--jobs", "-j", type=int, default=1, help="worker processes (default: 1)")
+    run_parser.add_argument("--full", action="store_true", help="ignore the build manifest and re-check every page")
+    run_parser.add_argument("--list", action="store_true", help="list registered transforms and exit")
+    run_parser.add_argument("--report", help="write per-page notes from transforms to this JSON file")
+    run_parser.set_defaults(func=cmd_run)
+
+    fp_parser = subparsers.add_parser("fingerprint", help="hash assets and write the asset manifest")
+    fp_parser.add_argument("--verbose", action="store_true", help="list changed and removed assets")
+    fp_parser.set_defaults(func=cmd_fingerprint)
+
+    index_parser = subparsers.add_parser("index", help="report missing assets and broken links site-wide")
+    index_parser.add_argument("--jobs", "-j", type=int, default=1, help="worker processes (default: 1)")
+    index_parser.add_argument("--output", help=f"report path (default: {refindex.REPORT_PATH})")
+    index_parser.add_argument("--verbose", action="store_true", help="list every missing target and broken fragment")
+    index_parser.add_argument("--strict", action="store_true", help="exit 1 if anything is missing or broken")
+    index_parser.set_defaults(func=cmd_index)
+
+    recover_parser = subparsers.add_parser("recover", help="download missing assets from the live origin")
+    recover_parser.add_argument("paths", nargs="*", help="repository-relative asset paths (default: missing assets from the report)")
+    recover_parser.add_argument("--report", help=f"reference report to read (default: {refindex.REPORT_PATH})")
+    recover_parser.add_argument("--origin", default="https://srrn.net", help="origin base URL (default: https://srrn.net)")
+    recover_parser.add_argument("--concurrency", "-c", type=int, default=8, help="parallel connections (default: 8)")
+    recover_parser.add_argument("--retries", type=int, default=3, help="retries per asset on errors (default: 3)")
+    recover_parser.add_argument("--refresh", action="store_true", help="also revalidate every previously recovered asset")
+    recover_parser.add_argument("--force", action="store_true", help="download even if the local copy is current (skips the cache)")
+    recover_parser.add_argument("--ttl", type=int, default=24 * 3600, help="seconds a cached response is used without revalidating (default: 86400)")
+    recover_parser.add_argument("--no-cache", action="store_true", help="bypass the HTTP cache")
+    recover_parser.add_argument("--dry-run", action="store_true", help="list what would be downloaded")
+    recover_parser.add_argument("--verbose", action="store_true", help="list every asset")
+    recover_parser.set_defaults(func=cmd_recover)
+
+    wayback_parser = subparsers.add_parser("wayback", help="recover assets from Wayback Machine captures")
+    wayback_parser.add_argument("paths", nargs="*", help="repository-relative asset paths (default: missing assets and LFS stubs)")
+    wayback_parser.add_argument("--report", help=f"reference report to read (default: {refindex.REPORT_PATH})")
+    wayback_parser.add_argument("--archive", default="https://web.archive.org", help="archive base URL (default: https://web.archive.org)")
+    wayback_parser.add_argument("--concurrency", "-c", type=int, default=4, help="parallel requests (default: 4)")
+    wayback_parser.add_argument("--rate", type=float, default=2.0, help="max requests per second to the archive (default: 2)")
+    wayback_parser.add_argument("--no-stubs", action="store_true", help="do not try to replace Git LFS pointer stubs")
+    wayback_parser.add_argument("--dry-run", action="store_true", help="look up captures without downloading")
+    wayback_parser.add_argument("--verbose", action="store_true", help="list every target")
+    wayback_parser.set_defaults(func=cmd_wayback)
+
+    responsive_parser = subparsers.add_parser("responsive", help="generate missing srcset image variants")
+    responsive_parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1, help="worker processes (default: CPU count)")
+    responsive_parser.add_argument("--force", action="store_true", help="rebuild generated variants even if their source is unchanged")
+    responsive_parser.add_argument("--dry-run", action="store_true", help="list variants that would be generated")
+    responsive_parser.add_argument("--verbose", action="store_true", help="list every generated variant")
+    responsive_parser.set_defaults(func=cmd_responsive)
+
+    youtube_parser = subparsers.add_parser("youtube", help="cache poster images for YouTube click-to-load facades")
+    youtube_parser.add_argument("--base", default="https://i.ytimg.com/vi", help="thumbnail base URL (default: https://i.ytimg.com/vi)")
+    youtube_parser.add_argument("--jobs", "-j", type=int, default=1, help="worker processes for the page scan (default: 1)")
+    youtube_parser.add_argument("--concurrency", "-c", type=int, default=4, help="parallel downloads (default: 4)")
+    youtube_parser.add_argument("--refresh", action="store_true", help="revalidate posters that are already cached")
+    youtube_parser.add_argument("--no-cache", action="store_true", help="bypass the HTTP cache")
+    youtube_parser.add_argument("--dry-run", action="store_true", help="list embedded videos without downloading")
+    youtube_parser.add_argument("--verbose", action="store_true", help="list every video and poster")
+    youtube_parser.set_defaults(func=cmd_youtube)
+
+    webp_parser = subparsers.add_parser("webp", help="encode WebP siblings for referenced images")
+    webp_parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1, help="worker processes (default: CPU count)")
+    webp_parser.add_argument("--quality", "-q", type=int, default=80, help="lossy quality target, 1-100 (default: 80)")
+    webp_parser.add_argument("--force", action="store_true", help="re-encode even if the source is unchanged")
+    webp_parser.add_argument("--verbose", action="store_true", help="list every image")
+    webp_parser.set_defaults(func=cmd_webp)
+
+    optimize_parser = subparsers.add_parser("optimize", help="recompress PNG/JPEG assets in place")
+    optimize_parser.add_argument("paths", nargs="*", help="repository-relative images (default: assets/uploads and images/)")
+    optimize_parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1, help="worker processes (default: CPU count)")
+    optimize_parser.add_argument("--min-psnr", type=float, default=40.0, help="lowest PSNR (dB) a lossy candidate may have (default: 40)")
+    optimize_parser.add_argument("--force", action="store_true", help="reprocess files already in the cache")
+    optimize_parser.add_argument("--dry-run", action="store_true", help="report savings without writing")
+    optimize_parser.add_argument("--verbose", action="store_true", help="list every optimized file")
+    optimize_parser.set_defaults(func=cmd_optimize)
+
+    purge_parser = subparsers.add_parser("purge-css", help="drop CSS rules that can never match in place")
+    purge_parser.add_argument("paths", nargs="*", help="repository-relative stylesheets (default: every .css file but css/custom-fixes.css)")
+    purge_parser.add_argument("--allow", action="append", default=[], metavar="PATTERN",
+                              help="also keep classes, ids, tags and attributes matching this fnmatch pattern (repeatable)")
+    purge_parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1, help="worker processes for the page scan (default: CPU count)")
+    purge_parser.add_argument("--dry-run", action="store_true", help="report savings without writing")
+    purge_parser.add_argument("--report", help="write the per-file before/after sizes to this JSON file")
+    purge_parser.add_argument("--verbose", action="store_true", help="also list the scripts scanned and stylesheets with nothing to drop")
+    purge_parser.set_defaults(func=cmd_purge_css)
+
+    compact_parser = subparsers.add_parser("compact-css", help="merge duplicate rules and drop overridden declarations in place")
+    compact_parser.add_argument("paths", nargs="*", help="repository-relative stylesheets (default: css/custom-fixes.css)")
+    compact_parser.add_argument("--dry-run", action="store_true", help="report savings without writing")
+    compact_parser.add_argument("--diff", action="store_true", help="print a unified diff of every compacted file")
+    compact_parser.add_argument("--report", help="write the per-file sizes and changes to this JSON file")
+    compact_parser.add_argument("--verbose", action="store_true", help="list every merge and dropped declaration")
+    compact_parser.set_defaults(func=cmd_compact_css)
+
+    style_parser = subparsers.add_parser("style-classes", help="replace repeated style attributes with shared classes")
+    style_parser.add_argument("--min-uses", type=int, default=2, metavar="N",
+                              help="give values used at least N times a class (default: 2)")
+    style_parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1, help="worker processes for the page scan (default: CPU count)")
+    style_parser.add_argument("--dry-run", action="store_true", help="report the classes without writing")
+    style_parser.add_argument("--report", help="write the classes and per-page savings to this JSON file")
+    style_parser.add_argument("--verbose", action="store_true", help="list every class and its declarations")
+    style_parser.set_defaults(func=cmd_style_classes)
+
+    extract_parser = subparsers.add_parser("archive-extract", help="extract news archive posts to JSON and one page template")
+    extract_parser.add_argument("--model", default="news/page/2/index.html",
+                                help="archive page the template is made from (default: news/page/2/index.html)")
+    extract_parser.add_argument("--dry-run", action="store_true", help="report without writing")
+    extract_parser.add_argument("--report", help="write the extraction summary to this JSON file")
+    extract_parser.add_argument("--verbose", action="store_true", help="list every card that does not render back as scraped")
+    extract_parser.set_defaults(func=cmd_archive_extract)
+
+    render_parser = subparsers.add_parser("archive-render", help="rebuild the news archive pages from news/posts.json")
+    render_parser.add_argument("--dry-run", action="store_true", help="report the pages that would change without writing")
+    render_parser.add_argument("--report", help="write the rendered pages and sizes to this JSON file")
+    render_parser.add_argument("--verbose", action="store_true", help="more detail")
+    render_parser.set_defaults(func=cmd_archive_render)
+
+    minify_parser = subparsers.add_parser("minify-html", help="report the bytes minify-html saves per page, raw and gzipped")
+    minify_parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1, help="worker processes (default: CPU count)")
+    minify_parser.add_argument("--report", help="write per-page sizes to this JSON file")
+    minify_parser.add_argument("--verbose", action="store_true", help="list the savings of every page")
+    minify_parser.set_defaults(func=cmd_minify_html)
+
+    hoist_parser = subparsers.add_parser("hoist", help="move inline blocks repeated across pages into shared files")
+    hoist_parser.add_argument("--pages", "-k", type=int, default=2, metavar="K",
+                              help="hoist blocks found on more than K pages (default: 2)")
+    hoist_parser.add_argument("--min-bytes", type=int, default=1024, help="keep smaller blocks inline (default: 1024)")
+    hoist_parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1, help="worker processes for the page scan (default: CPU count)")
+    hoist_parser.add_argument("--dry-run", action="store_true", help="report the savings without writing")
+    hoist_parser.add_argument("--report", help="write the shared files and per-page bytes to this JSON file")
+    hoist_parser.add_argument("--verbose", action="store_true", help="list the savings of every page")
+    hoist_parser.set_defaults(func=cmd_hoist)
+
+    bundle_parser = subparsers.add_parser("bundle", help="merge co-occurring scripts and stylesheets into shared bundles")
+    bundle_parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1, help="worker processes for the page scan (default: CPU count)")
+    bundle_parser.add_argument("--dry-run", action="store_true", help="report the bundles without writing them")
+    bundle_parser.add_argument("--report", help="write the bundles and their members to this JSON file")
+    bundle_parser.add_argument("--verbose", action="store_true", help="list the members of every bundle")
+    bundle_parser.set_defaults(func=cmd_bundle)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
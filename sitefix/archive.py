@@ -0,0 +1,534 @@
+"""
+archive.py
+
+Rebuild the paginated news archive from post data and one template.
+
+The scraper saved every archive page - news/index.html, news/et_blog.html
+and news/page/N/{index,et_blog}.html - as a full 240 KB snapshot that
+differs from the others only in its six post cards, its pagination links
+and a body class. Extracting (python3 -m sitefix archive-extract) turns
+them into two files:
+
+- news/posts.json: one entry per post card (id, link, title, date,
+  categories, tags, post format, excerpt, thumbnail), newest first. Posts
+  found in the dated post directories (2021/, 2022/, 2025/) but on no
+  archive page are added from the post page itself, without a thumbnail.
+- news/archive.html.tmpl: the shell of one archive page (MODEL_PAGE), with
+  the cards, the pagination and the paged body classes replaced by
+  {{posts}}, {{pagination}} and {{paged}}, and every relative URL written
+  as {{prefix}} + its site path, so the same template serves news/ and
+  news/page/N/.
+
+Extraction renders the cards back and reports those that do not come out
+byte for byte as scraped. Rendering (python3 -m sitefix archive-render)
+writes every archive page from the two files, removes pages past the
+last one, and links the pages to each other by directory. A site-wide fix
+to the archive is then one edit to the template; the pipeline (run) still
+applies afterwards, as to any other page.
+
+The template keeps the scraped page whole, inline CSS included, so a
+rendered page is as large as the snapshot it replaces. Making it smaller
+is left to the pipeline: hoist-inline moves the shared <style> blocks
+into assets/hoisted/, as it does for every other page.
+"""
+
+import json
+import os
+import posixpath
+import re
+import time
+from datetime import date
+
+from . import bundle
+from . import engine
+from . import paths
+from . import stylesheet
+from .htmlstream import iter_chunks, tokenize
+
+DATA_PATH = "news/posts.json"
+DATA_VERSION = 1
+TEMPLATE_PATH = "news/archive.html.tmpl"
+MODEL_PAGE = "news/page/2/index.html"
+
+ARCHIVE_PAGE_RE = re.compile(r'^news/(?:page/(\d+)/)?(?:index|et_blog)\.html$')
+DATED_POST_RE = re.compile(r'^\d{4}/\d{2}/\d{2}/[^/]+/index\.html$')
+PLACEHOLDER_RE = re.compile(r'\{\{(prefix|paged|posts|pagination)\}\}')
+PAGED_CLASS_RE = re.compile(r'^(?:paged|paged-\d+|page-paged-\d+)$')
+
+URL_ATTRIBUTES = ("href", "src", "poster", "action", "data-src")
+# The category dropdown navigates to the selected option's value
+OPTION_URL_ATTRIBUTES = ("value",)
+SRCSET_ATTRIBUTES = ("srcset", "imagesrcset", "data-srcset")
+
+# Excerpts of posts taken from their own page: the post text cut back to a
+# word boundary within this many characters, as Divi's blog module does
+EXCERPT_LENGTH = 270
+
+CARD = (
+    '<article id="post-{id}" class="{classes}">\n\n'
+    '\t\t\t\t{image}\n'
+    '\t\t\t\t\t\t\t\t\t\t\t\t\t\t<h3 class="entry-title">\n'
+    '\t\t\t\t\t\t\t\t\t\t\t\t\t<a href="{link}">{title}</a>\n'
+    '\t\t\t\t\t\t\t\t\t\t\t</h3>\n'
+    '\t\t\t\t\n'
+    '\t\t\t\t\t<p class="post-meta"><span class="published">{date}</span> | {categories}</p>'
+    '<div class="post-content"><div class="post-content-inner">{excerpt}</div></div>\t\t\t\n'
+    '\t\t\t</article>'
+)
+CARD_SEPARATOR = "\n\t\t\t\t\n\t\t\t"
+IMAGE = (
+    '<div class="et_pb_image_container"><a href="{link}" class="entry-featured-image-url">'
+    '<img {loading}decoding="async" src="{src}" alt="{alt}" class="" srcset="{srcset}" sizes="{sizes}" '
+    'width="{width}" height="{height}"></a></div>'
+)
+
+
+def site_url(rel_path, url, absolute=False):
+    """
+    url, written in the page at rel_path, as a site path; unchanged if
+    external, or if site-absolute (/news/) and absolute is False
+    """
+    url = url.strip()
+    if not url or paths.is_external(url) or (url.startswith("/") and not absolute):
+        return url
+    path, query, fragment = paths.split_url(url)
+    if path.startswith("/"):
+        base, path = "", path[len(paths.REPO_NAME):] if path.startswith(paths.REPO_NAME) else path[1:]
+    else:
+        base = posixpath.dirname(rel_path)
+    joined = posixpath.normpath(posixpath.join(base, path)) if path else rel_path
+    if joined == ".." or joined.startswith("../"):
+        return url
+    joined = "" if joined == "." else joined
+    if path.endswith("/") and joined:
+        joined += "/"
+    return joined + query + fragment
+
+
+def page_url(prefix, url):
+    """A site path from site_url(), as written in a page with prefix"""
+    if not url or paths.is_external(url) or url.startswith("/"):
+        return url
+    return prefix + url
+
+
+def map_srcset(value, convert):
+    candidates = []
+    for candidate in value.split(","):
+        parts = candidate.split(None, 1)
+        if parts:
+            parts[0] = convert(parts[0])
+        candidates.append(" ".join(parts))
+    return ", ".join(candidates)
+
+
+def spans(content):
+    """[(start, end, token)] for every token of content"""
+    result = []
+    pos = 0
+    for token in tokenize(iter_chunks(content)):
+        result.append((pos, pos + len(token.raw), token))
+        pos += len(token.raw)
+    return result
+
+
+def closing(items, i):
+    """Index of the end tag closing the start tag at items[i]"""
+    tag = items[i][2].tag
+    depth = 0
+    for j in range(i, len(items)):
+        token = items[j][2]
+        if token.kind == "starttag" and token.tag == tag:
+            depth += 1
+        elif token.kind == "endtag" and token.tag == tag:
+            depth -= 1
+            if not depth:
+                return j
+    return len(items) - 1
+
+
+def inner(content, items, i):
+    """Source text between the start tag at items[i] and its end tag"""
+    return content[items[i][1]:items[closing(items, i)][0]]
+
+
+def parse_date(text):
+    """'Jul 6, 2021' -> '2021-07-06'"""
+    month, day, year = text.replace(",", " ").split()
+    months = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+    return date(int(year), months.index(month[:3].lower()) + 1, int(day)).isoformat()
+
+
+def format_date(iso):
+    value = date.fromisoformat(iso)
+    return f"{value:%b} {value.day}, {value.year}"
+
+
+def post_classes(classes):
+    """(format, category slugs, tags) from a post's WordPress classes"""
+    fmt = next((cls[len("format-"):] for cls in classes if cls.startswith("format-")), "standard")
+    categories = [cls[len("category-"):] for cls in classes if cls.startswith("category-")]
+    tags = [cls[len("tag-"):] for cls in classes if cls.startswith("tag-")]
+    return fmt, categories, tags
+
+
+def parse_card(content, items, start, end, rel_path):
+    """The post of the card items[start:end + 1] on the archive page at rel_path"""
+    article = items[start][2]
+    fmt, _, tags = post_classes(article.classes)
+    post = {"id": int(article.get("id", "post-0")[len("post-"):])}
+    categories = []
+    for i in range(start, end):
+        token = items[i][2]
+        if not token.is_start:
+            continue
+        if token.tag == "img" and "thumbnail" not in post:
+            post["thumbnail"] = {
+                "src": site_url(rel_path, token.get("src") or "", absolute=True),
+                "alt": token.get("alt") or "",
+                "srcset": map_srcset(token.get("srcset") or "", lambda url: site_url(rel_path, url, absolute=True)),
+                "sizes": token.get("sizes") or "",
+                "width": token.get("width") or "",
+                "height": token.get("height") or "",
+            }
+            if token.get("loading"):
+                post["thumbnail"]["loading"] = token.get("loading")
+        elif token.tag == "h3" and token.has_class("entry-title"):
+            link = next(j for j in range(i, end) if items[j][2].is_start and items[j][2].tag == "a")
+            post["link"] = site_url(rel_path, items[link][2].get("href") or "", absolute=True)
+            post["title"] = inner(content, items, link)
+        elif token.tag == "span" and token.has_class("published"):
+            post["date"] = parse_date(inner(content, items, i))
+        elif token.tag == "a" and "tag" in (token.get("rel") or "").split():
+            href = site_url(rel_path, token.get("href") or "", absolute=True)
+            categories.append([href.rstrip("/").rsplit("/", 1)[-1], inner(content, items, i)])
+        elif token.tag == "div" and token.has_class("post-content-inner"):
+            excerpt = inner(content, items, i)
+            if excerpt:
+                post["excerpt"] = excerpt
+    post["categories"] = categories
+    if fmt != "standard":
+        post["format"] = fmt
+    if tags:
+        post["tags"] = tags
+    return post
+
+
+def card_spans(items):
+    """[(start index, end index)] of the post cards among items"""
+    result = []
+    i = 0
+    while i < len(items):
+        token = items[i][2]
+        if token.kind == "starttag" and token.tag == "article" and token.has_class("et_pb_post"):
+            j = closing(items, i)
+            result.append((i, j))
+            i = j
+        i += 1
+    return result
+
+
+def render_card(post, index, prefix):
+    fmt = post.get("format", "standard")
+    thumbnail = post.get("thumbnail")
+    classes = ["et_pb_post", "clearfix"]
+    if not thumbnail and fmt == "standard":
+        classes.append("et_pb_no_thumb")
+    classes += [f"et_pb_blog_item_0_{index}", f"post-{post['id']}", "post", "type-post", "status-publish",
+                f"format-{fmt}"]
+    if thumbnail:
+        classes.append("has-post-thumbnail")
+    classes.append("hentry")
+    classes += [f"category-{slug}" for slug, _ in post["categories"]]
+    classes += [f"tag-{tag}" for tag in post.get("tags", ())]
+    if fmt != "standard":
+        classes.append(f"post_format-post-format-{fmt}")
+    link = bundle.escape(page_url(prefix, post["link"]))
+    image = ""
+    if thumbnail:
+        image = IMAGE.format(
+            link=link,
+            loading=f'loading="{bundle.escape(thumbnail["loading"])}" ' if thumbnail.get("loading") else "",
+            src=bundle.escape(page_url(prefix, thumbnail["src"])),
+            alt=bundle.escape(thumbnail["alt"]),
+            srcset=bundle.escape(map_srcset(thumbnail["srcset"], lambda url: page_url(prefix, url))),
+            sizes=bundle.escape(thumbnail["sizes"]),
+            width=thumbnail["width"],
+            height=thumbnail["height"],
+        )
+    categories = ", ".join(f'<a href="{bundle.escape(page_url(prefix, f"category/{slug}/"))}" rel="tag">{name}</a>'
+                           for slug, name in post["categories"])
+    return CARD.format(id=post["id"], classes=" ".join(classes), image=image, link=link, title=post["title"],
+                       date=format_date(post["date"]), categories=categories, excerpt=post.get("excerpt", ""))
+
+
+def page_dir(number):
+    return "news/" if number == 1 else f"news/page/{number}/"
+
+
+def page_files(number):
+    return [page_dir(number) + "index.html", page_dir(number) + "et_blog.html"]
+
+
+def render_pagination(number, pages, prefix):
+    lines = ['<div class="pagination clearfix">']
+    if number < pages:
+        lines.append(f'\t<div class="alignleft"><a href="{prefix}{page_dir(number + 1)}">« Older Entries</a></div>')
+    if number > 1:
+        lines.append(f'\t<div class="alignright"><a href="{prefix}{page_dir(number - 1)}">Next Entries »</a></div>')
+    lines.append("</div>")
+    return "\n".join(lines)
+
+
+def render_page(template, posts, number, pages, prefix):
+    values = {
+        "prefix": prefix,
+        "paged": f"paged paged-{number} page-paged-{number} " if number > 1 else "",
+        "posts": CARD_SEPARATOR.join(render_card(post, index, prefix) for index, post in enumerate(posts)),
+        "pagination": render_pagination(number, pages, prefix),
+    }
+    return PLACEHOLDER_RE.sub(lambda m: values[m.group(1)], template)
+
+
+def templated(rel_path, url):
+    """A relative url in the page at rel_path as {{prefix}} + its site path"""
+    site = site_url(rel_path, url)
+    return "{{prefix}}" + site if site != url.strip() else url
+
+
+def make_template(content, rel_path):
+    """The archive page content at rel_path as a template, or raise ValueError"""
+    if PLACEHOLDER_RE.search(content):
+        raise ValueError(f"{rel_path} already contains {{{{...}}}} placeholders")
+    items = spans(content)
+    cards = card_spans(items)
+    pagination = next((i for i, (_, _, token) in enumerate(items)
+                       if token.kind == "starttag" and token.tag == "div" and token.has_class("pagination")), None)
+    if not cards or pagination is None:
+        raise ValueError(f"{rel_path} has no post cards or no pagination")
+    replacements = [
+        (items[cards[0][0]][0], items[cards[-1][1]][1], "{{posts}}"),
+        (items[pagination][0], items[closing(items, pagination)][1], "{{pagination}}"),
+    ]
+    taken = [(start, end) for start, end, _ in replacements]
+    in_style = False
+    for start, end, token in items:
+        if any(low <= start < high for low, high in taken):
+            continue
+        if token.kind == "data" and in_style:
+            rebased = stylesheet.rebase_urls(token.raw, rel_path, "{{prefix}}")
+            if rebased != token.raw:
+                replacements.append((start, end, rebased))
+            continue
+        in_style = token.kind == "starttag" and token.tag == "style"
+        if not token.is_start:
+            continue
+        attrs = []
+        for name, value in token.attrs:
+            if value is not None and (name in URL_ATTRIBUTES
+                                      or (token.tag == "option" and name in OPTION_URL_ATTRIBUTES)):
+                value = templated(rel_path, value)
+            elif value is not None and name in SRCSET_ATTRIBUTES:
+                value = map_srcset(value, lambda url: templated(rel_path, url))
+            elif value is not None and name == "style":
+                value = stylesheet.rebase_urls(value, rel_path, "{{prefix}}")
+            elif value is not None and name == "class" and token.tag == "body":
+                value = "{{paged}}" + " ".join(cls for cls in value.split() if not PAGED_CLASS_RE.match(cls))
+            attrs.append((name, value))
+        if attrs != token.attrs:
+            token.attrs = attrs
+            token.modified = True
+            replacements.append((start, end, token.text()))
+    return bundle.replace_spans(content, replacements)
+
+
+def post_from_page(root, rel_path):
+    """The post of a dated post page, or None if it does not look like one"""
+    content = engine.read_page(os.path.join(root, rel_path))
+    items = spans(content)
+    post = {}
+    for i, (_, _, token) in enumerate(items):
+        if not token.is_start:
+            continue
+        if token.tag == "article" and token.has_class("et_pb_post") and "id" not in post:
+            fmt, categories, tags = post_classes(token.classes)
+            post["id"] = int((token.get("id") or "post-0")[len("post-"):])
+            post["link"] = posixpath.dirname(rel_path) + "/"
+            if fmt != "standard":
+                post["format"] = fmt
+            if tags:
+                post["tags"] = tags
+        elif token.tag == "h1" and token.has_class("entry-title") and "title" not in post:
+            post["title"] = inner(content, items, i)
+        elif token.tag == "span" and token.has_class("published") and "date" not in post:
+            post["date"] = parse_date(inner(content, items, i))
+        elif token.tag == "a" and "category" in (token.get("rel") or "").split():
+            href = site_url(rel_path, token.get("href") or "", absolute=True)
+            post.setdefault("categories", []).append([href.rstrip("/").rsplit("/", 1)[-1], inner(content, items, i)])
+        elif token.tag == "div" and token.has_class("entry-content") and "excerpt" not in post:
+            text = " ".join("".join(t.raw for _, _, t in items[i:closing(items, i)] if t.kind == "data").split())
+            if len(text) > EXCERPT_LENGTH:
+                text = text[:EXCERPT_LENGTH].rsplit(" ", 1)[0] + "..."
+            if text:
+                post["excerpt"] = f"<p>{text}</p>\n"
+    if not {"id", "title", "date"} <= set(post):
+        return None
+    post.setdefault("categories", [])
+    return post
+
+
+def archive_pages(root):
+    """{page number: [rel_path, ...]} of the archive pages on disk"""
+    pages = {}
+    for path in engine.iter_pages(os.path.join(root, "news")):
+        rel_path = engine.Page(root, path).rel_path
+        m = ARCHIVE_PAGE_RE.match(rel_path)
+        if m:
+            pages.setdefault(int(m.group(1) or 1), []).append(rel_path)
+    return dict(sorted(pages.items()))
+
+
+def load_data(root):
+    with open(os.path.join(root, DATA_PATH), "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("version") != DATA_VERSION:
+        raise ValueError(f"{DATA_PATH} has version {data.get('version')}, expected {DATA_VERSION}")
+    return data
+
+
+def size(text):
+    return len(text.encode("utf-8"))
+
+
+class ArchiveReport:
+    def __init__(self):
+        self.posts = 0
+        self.from_pages = []        # posts added from their own page
+        self.scraped_bytes = 0
+        self.data_bytes = 0
+        self.template_bytes = 0
+        self.cards = 0
+        self.mismatched = []        # (rel_path, post id)
+        self.pages = {}             # rel_path -> bytes written
+        self.written = []
+        self.removed = []
+        self.errors = []
+        self.seconds = 0.0
+
+    def print_summary(self, verbose=False):
+        print("=" * 60)
+        print(f"Posts: {self.posts}")
+        for link in self.from_pages:
+            print(f"  ✓ {link} added from its post page")
+        if self.cards:
+            print(f"Cards rendered back as scraped: {self.cards - len(self.mismatched)} of {self.cards}")
+            for rel_path, post_id in self.mismatched if verbose else self.mismatched[:10]:
+                print(f"  - post-{post_id} on {rel_path} differs")
+            if len(self.mismatched) > 10 and not verbose:
+                print(f"    ... {len(self.mismatched) - 10} more (--verbose lists them all)")
+        if self.scraped_bytes:
+            print(f"Archive pages: {self.scraped_bytes / 1024:.0f} KB scraped -> "
+                  f"{DATA_PATH} {self.data_bytes / 1024:.1f} KB + {TEMPLATE_PATH} {self.template_bytes / 1024:.1f} KB")
+        for rel_path in self.written:
+            print(f"  ✓ {rel_path} ({self.pages[rel_path] / 1024:.1f} KB)")
+        if self.pages and not self.written:
+            print(f"  - {len(self.pages)} pages already up to date")
+        for rel_path in self.removed:
+            print(f"  - {rel_path} removed")
+        for error in self.errors:
+            print(f"  ❌ {error}")
+        print(f"Time: {self.seconds * 1000:.1f} ms")
+        print("=" * 60)
+
+    def as_json(self):
+        return {"posts": self.posts, "from_pages": self.from_pages, "cards": self.cards,
+                "mismatched": [{"page": rel_path, "id": post_id} for rel_path, post_id in self.mismatched],
+                "pages": self.pages, "written": self.written, "removed": self.removed, "errors": self.errors}
+
+
+def extract(root, model=MODEL_PAGE, dry_run=False):
+    """Write news/posts.json and news/archive.html.tmpl from the scraped archive pages"""
+    report = ArchiveReport()
+    start = time.perf_counter()
+    posts = {}
+    per_page = 1
+    for number, rel_paths in archive_pages(root).items():
+        for rel_path in rel_paths:
+            content = engine.read_page(os.path.join(root, rel_path))
+            report.scraped_bytes += size(content)
+            items = spans(content)
+            cards = card_spans(items)
+            per_page = max(per_page, len(cards))
+            for index, (first, last) in enumerate(cards):
+                post = parse_card(content, items, first, last, rel_path)
+                posts.setdefault(post["id"], post)
+                report.cards += 1
+                if render_card(post, index, "../" * rel_path.count("/")) != content[items[first][0]:items[last][1]]:
+                    report.mismatched.append((rel_path, post["id"]))
+    posts = list(posts.values())
+
+    # Posts that only exist as a dated directory go in by date, after posts of the same day
+    known = {post["link"] for post in posts}
+    for path in engine.iter_pages(root):
+        rel_path = engine.Page(root, path).rel_path
+        if DATED_POST_RE.match(rel_path) and posixpath.dirname(rel_path) + "/" not in known:
+            post = post_from_page(root, rel_path)
+            if post is not None:
+                index = next((i for i, other in enumerate(posts) if other["date"] < post["date"]), len(posts))
+                posts.insert(index, post)
+                report.from_pages.append(post["link"])
+    report.posts = len(posts)
+
+    try:
+        template = make_template(engine.read_page(os.path.join(root, model)), model)
+    except (OSError, ValueError) as e:
+        report.errors.append(str(e))
+        report.seconds = time.perf_counter() - start
+        return report
+    text = json.dumps({"version": DATA_VERSION, "per_page": per_page, "posts": posts}, indent=1,
+                      ensure_ascii=False) + "\n"
+    report.data_bytes, report.template_bytes = size(text), size(template)
+    if not dry_run:
+        for rel_path, new in ((DATA_PATH, text), (TEMPLATE_PATH, template)):
+            path = os.path.join(root, rel_path)
+            if bundle.read_text(path) != new:
+                bundle.write_atomic(path, new)
+                report.written.append(rel_path)
+                report.pages[rel_path] = size(new)
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+def render(root, dry_run=False):
+    """Write every archive page from news/posts.json and news/archive.html.tmpl"""
+    report = ArchiveReport()
+    start = time.perf_counter()
+    try:
+        data = load_data(root)
+        with open(os.path.join(root, TEMPLATE_PATH), "r", encoding="utf-8", newline="") as f:
+            template = f.read()
+    except (OSError, ValueError) as e:
+        report.errors.append(f"{e} (run 'python3 -m sitefix archive-extract' first)")
+        report.seconds = time.perf_counter() - start
+        return report
+    posts, per_page = data["posts"], data["per_page"]
+    pages = max(1, -(-len(posts) // per_page))
+    report.posts = len(posts)
+    for number in range(1, pages + 1):
+        chunk = posts[(number - 1) * per_page:number * per_page]
+        for rel_path in page_files(number):
+            content = render_page(template, chunk, number, pages, "../" * rel_path.count("/"))
+            report.pages[rel_path] = size(content)
+            path = os.path.join(root, rel_path)
+            if bundle.read_text(path) != content:
+                report.written.append(rel_path)
+                if not dry_run:
+                    bundle.write_atomic(path, content)
+    for number, rel_paths in archive_pages(root).items():
+        if number > pages:
+            report.removed.extend(rel_paths)
+            if not dry_run:
+                for rel_path in rel_paths:
+                    os.remove(os.path.join(root, rel_path))
+    report.seconds = time.perf_counter() - start
+    return report
@@ -0,0 +1,73 @@
+"""
+bench_replacer.py
+
+Benchmark the compiled Replacer against the sequential str.replace loops
+it replaced, over every page in the site, and check both produce the same
+output.
+
+Usage (from the repository root):
+    python3 -m sitefix.bench_replacer [--repeat N]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from . import engine
+from . import transforms
+
+
+def loop_replace(content, table):
+    """The original approach: one full pass per table entry"""
+    for old, new in table.items():
+        content = content.replace(old, new)
+    return content
+
+
+def best_of(repeat, func, pages):
+    """Best wall time (seconds) of running func over all pages"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for content in pages:
+            func(content)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Replacer against str.replace loops")
+    parser.add_argument("--root", default=os.getcwd(), help="site root (default: current directory)")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case, best is reported")
+    args = parser.parse_args(argv)
+
+    pages = [engine.read_page(path) for path in engine.iter_pages(args.root)]
+    total_mb = sum(len(content) for content in pages) / 1e6
+    print(f"Pages: {len(pages)} ({total_mb:.1f} MB)")
+
+    cases = [
+        ("fix_paths_absolute", transforms.REPO_PATHS_REPLACER),
+        ("wp-content -> assets", transforms.WP_CONTENT_REPLACER),
+        ("srrn.net domains", transforms.domain_assets_replacer("../")),
+    ]
+
+    print("=" * 72)
+    print(f"{'table':<24}{'entries':>8}{'loop (ms)':>12}{'compiled (ms)':>15}{'speedup':>9}  same")
+    print("-" * 72)
+    mismatches = 0
+    for label, replacer in cases:
+        # Longest keys first so the loop agrees with leftmost-longest matching
+        table = dict(sorted(replacer.table.items(), key=lambda item: -len(item[0])))
+        same = all(loop_replace(content, table) == replacer.replace(content) for content in pages)
+        mismatches += not same
+        loop_s = best_of(args.repeat, lambda content: loop_replace(content, table), pages)
+        compiled_s = best_of(args.repeat, replacer.replace, pages)
+        print(f"{label:<24}{len(table):>8}{loop_s * 1000:>12.1f}{compiled_s * 1000:>15.1f}"
+              f"{loop_s / compiled_s:>8.1f}x  {'yes' if same else 'NO'}")
+    print("=" * 72)
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""
+bench_resize.py
+
+Benchmark the decode-once resize pipeline against the approach it
+replaced (reopen the source and run a full-resolution LANCZOS resize plus
+crop for every output size), over every original image in assets/uploads.
+
+Each raster in assets/uploads is resized to the WordPress sizes smaller
+than it (1280, 980 and 480 wide, plus the 150x150 thumbnail). Decode and
+resize are timed; encoding is identical for both and left out. Every
+measurement runs in a fresh worker process so peak RSS is per source.
+
+Usage (from the repository root):
+    python3 -m sitefix.bench_resize [--limit N] [--verbose]
+"""
+
+import argparse
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+from . import responsive
+
+WIDTHS = (1280, 980, 480)
+THUMBNAIL = (150, 150)
+RASTER_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def legacy_resize(img, width, height):
+    """The original resize: full-resolution LANCZOS to cover, then crop"""
+    source_ratio = img.width / img.height
+    target_ratio = width / height
+    if abs(source_ratio - target_ratio) < 0.01:
+        return img.resize((width, height), Image.Resampling.LANCZOS)
+    if source_ratio > target_ratio:
+        new_width = int(height * source_ratio)
+        resized = img.resize((new_width, height), Image.Resampling.LANCZOS)
+        left = (new_width - width) // 2
+        return resized.crop((left, 0, left + width, height))
+    new_height = int(width / source_ratio)
+    resized = img.resize((width, new_height), Image.Resampling.LANCZOS)
+    top = (new_height - height) // 2
+    return resized.crop((0, top, width, top + height))
+
+
+def legacy(path, sizes):
+    for width, height in sizes:
+        with Image.open(path) as img:
+            legacy_resize(img, width, height)
+
+
+def pipeline(path, sizes):
+    largest = max(sizes, key=lambda size: size[0] * size[1])
+    img, original_size = responsive.open_source(path, largest)
+    with img:
+        for _ in responsive.derive_sizes(img, sizes, original_size):
+            pass
+
+
+METHODS = {"legacy": legacy, "pipeline": pipeline}
+
+
+def measure(method, path, sizes):
+    """Worker: (seconds, peak RSS growth in MB) for one method on one source"""
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    METHODS[method](path, sizes)
+    seconds = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return seconds, (peak - before) / 1024
+
+
+def sizes_for(path):
+    """WordPress sizes smaller than the source"""
+    with Image.open(path) as img:
+        src_width, src_height = img.size
+    sizes = [(w, max(1, round(w * src_height / src_width))) for w in WIDTHS if w < src_width]
+    if src_width > THUMBNAIL[0] and src_height > THUMBNAIL[1]:
+        sizes.append(THUMBNAIL)
+    return (src_width, src_height), sizes
+
+
+def iter_sources(root):
+    """Raster images under assets/uploads"""
+    for dirpath, dirnames, filenames in os.walk(os.path.join(root, "assets", "uploads")):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.lower().endswith(RASTER_EXTENSIONS):
+                yield os.path.join(dirpath, filename)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the decode-once resize pipeline")
+    parser.add_argument("--root", default=os.getcwd(), help="site root (default: current directory)")
+    parser.add_argument("--limit", type=int, help="only the first N sources")
+    parser.add_argument("--verbose", action="store_true", help="print every source")
+    args = parser.parse_args(argv)
+
+    sources = []
+    for path in iter_sources(args.root):
+        try:
+            size, sizes = sizes_for(path)
+        except OSError:
+            continue
+        if sizes:
+            sources.append((path, size, sizes))
+    sources = sources[:args.limit] if args.limit else sources
+    print(f"Sources: {len(sources)} ({sum(len(s) for _, _, s in sources)} outputs)")
+
+    rows = []
+    with ProcessPoolExecutor(max_workers=1, max_tasks_per_child=1) as executor:
+        for path, size, sizes in sources:
+            legacy_s, legacy_mb = executor.submit(measure, "legacy", path, sizes).result()
+            pipe_s, pipe_mb = executor.submit(measure, "pipeline", path, sizes).result()
+            rows.append((os.path.relpath(path, args.root), size, legacy_s, legacy_mb, pipe_s, pipe_mb))
+
+    print("=" * 96)
+    print(f"{'source':<48}{'size':>11}{'legacy ms':>10}{'MB':>6}{'pipeline ms':>13}{'MB':>6}")
+    print("-" * 96)
+    # Heaviest sources first; all of them with --verbose
+    shown = sorted(rows, key=lambda row: -row[2])
+    for rel_path, (w, h), legacy_s, legacy_mb, pipe_s, pipe_mb in shown if args.verbose else shown[:15]:
+        name = rel_path if len(rel_path) <= 46 else "..." + rel_path[-43:]
+        print(f"{name:<48}{f'{w}x{h}':>11}{legacy_s * 1000:>10.0f}{legacy_mb:>6.0f}"
+              f"{pipe_s * 1000:>13.0f}{pipe_mb:>6.0f}")
+    print("-" * 96)
+    legacy_total = sum(row[2] for row in rows)
+    pipe_total = sum(row[4] for row in rows)
+    print(f"Total time: legacy {legacy_total:.2f} s, pipeline {pipe_total:.2f} s "
+          f"({legacy_total / pipe_total:.1f}x faster)" if pipe_total else "No sources")
+    if rows:
+        print(f"Peak RSS growth, max over sources: legacy {max(r[3] for r in rows):.0f} MB, "
+              f"pipeline {max(r[5] for r in rows):.0f} MB")
+        print(f"Peak RSS growth, mean: legacy {sum(r[3] for r in rows) / len(rows):.1f} MB, "
+              f"pipeline {sum(r[5] for r in rows) / len(rows):.1f} MB")
+    print("=" * 96)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,690 @@
+"""
+bundle.py
+
+Fewer, shared requests for the scraped WordPress scripts and stylesheets.
+
+Building (python3 -m sitefix bundle): every page is scanned for runs of
+local <script src> and <link rel="stylesheet"> tags that follow each
+other with nothing in between that could tell the difference - for
+scripts only whitespace, comments and <link>/<meta> tags, for stylesheets
+anything but a <style>, a <script> or a stylesheet that cannot be
+bundled. Within a run, neighbours are grouped by how often they load
+together: two files are joined when they sit next to each other on at
+least 80% of the pages loading either (JOIN_RATIO), so the calendar
+plugin's seven scripts become one bundle shared by every page, and Divi's
+scripts.min.js and jquery.fitvids.js another used wherever both load.
+Each group is minified (minify.py), concatenated in page order and
+written to assets/bundles/; what is left on a page - files used alone,
+or a bundle's members where they load in another order - stays as it is.
+Stylesheet url()s are rebased to the bundle's directory. The groups and
+the hash of every member are recorded in .sitefix/bundle-manifest.json.
+
+Scripts that depend on being their own <script> - a "use strict"
+prologue, document.currentScript or a lookup of their own tag - and
+stylesheets with @import, @charset or @namespace are never bundled.
+
+Rewriting (the bundle-assets transform): each run of tags that matches a
+bundle becomes one tag for the bundle. A bundle whose members changed
+since it was built, or that a later build dropped, is expanded back into
+the member tags, so pages never point at stale code.
+
+Deferring (the defer-scripts transform): a classic script is marked
+``defer`` when nothing after it in the page can depend on it having run:
+every later script is deferred too, is not JavaScript (JSON, speculation
+rules), is an inline block that only declares data (``var DIVI = {...}``)
+or only registers a DOMContentLoaded/load listener - which deferred
+scripts still run before, although listeners they add now run after it.
+Any other script later in the page - inline code calling jQuery(), a
+third-party script, a local one that uses document.write - keeps every
+script before it blocking.
+"""
+
+import hashlib
+import os
+import posixpath
+import re
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import quote
+
+from . import engine
+from . import fingerprint
+from . import minify
+from . import paths
+from . import state
+from . import stylesheet
+from .critical import CRITICAL_STYLE_RE, FALLBACK_RE, SWAP_ONLOAD_RE
+from .htmlstream import iter_chunks, tokenize
+from .transforms import transform
+
+MANIFEST_PATH = os.path.join(state.STATE_DIR, "bundle-manifest.json")
+MANIFEST_VERSION = 1
+
+BUNDLE_DIR = "assets/bundles"
+
+# Neighbours are bundled when they load together on this share of the
+# pages that load either; a page loading only one keeps its own tag
+JOIN_RATIO = 0.8
+
+JS_TYPES = {"", "text/javascript", "application/javascript", "text/ecmascript", "application/ecmascript"}
+
+# Scripts that find themselves through their own <script> tag
+SELF_LOCATING_RE = re.compile(r'currentScript|getElementsByTagName\(\s*["\']script["\']')
+DOCUMENT_WRITE_RE = re.compile(r'document\.write(?:ln)?\s*\(')
+SOURCE_MAP_RE = re.compile(r'^\s*//[#@] sourceMappingURL=.*$', re.MULTILINE)
+# At-rules that are only valid at the top of a stylesheet
+LEADING_AT_RULES = {"import", "charset", "namespace"}
+
+# Inline scripts that only register a listener deferred scripts run before
+LISTENER_EVENTS = {"'DOMContentLoaded'", '"DOMContentLoaded"', "'load'", '"load"'}
+DECLARATION_KEYWORDS = {"var", "let", "const"}
+LITERAL_KEYWORDS = {"true", "false", "null", "undefined"}
+
+# root -> manifest, loaded once per process
+_manifest_by_root = {}
+# (rel_path, hash) -> True if the file may be bundled / deferred
+_bundleable = {}
+_writes_document = {}
+
+
+class Ref:
+    """A mergeable <script src> or stylesheet <link> and where it sits in the page"""
+
+    __slots__ = ("kind", "rel_path", "start", "end", "token", "key")
+
+    def __init__(self, kind, rel_path, start, end, token, key):
+        self.kind = kind            # "js" or "css"
+        self.rel_path = rel_path
+        self.start = start
+        self.end = end
+        self.token = token
+        self.key = key              # tags in one run share it: defer flag or media
+
+    def __repr__(self):
+        return f"Ref({self.rel_path!r})"
+
+
+class Script:
+    """A <script> element: its tag, inline code and local file, if any"""
+
+    __slots__ = ("start", "end", "token", "code", "rel_path")
+
+    def __init__(self, start, end, token, code, rel_path):
+        self.start = start
+        self.end = end
+        self.token = token
+        self.code = code
+        self.rel_path = rel_path
+
+
+def load_manifest(root):
+    return state.load_json(os.path.join(root, MANIFEST_PATH), MANIFEST_VERSION)
+
+
+def save_manifest(root, bundles, retired):
+    state.save_json(os.path.join(root, MANIFEST_PATH),
+                    {"version": MANIFEST_VERSION, "bundles": bundles, "retired": retired})
+
+
+def get_manifest(root):
+    root = os.path.abspath(root)
+    if root not in _manifest_by_root:
+        manifest = load_manifest(root)
+        _manifest_by_root[root] = {"bundles": manifest.get("bundles", {}), "retired": manifest.get("retired", {})}
+    return _manifest_by_root[root]
+
+
+def is_current(entry, bundle, hashes):
+    return bundle in hashes and all(hashes.get(rel_path) == digest for rel_path, digest in entry["hashes"].items())
+
+
+def bundle_version(root):
+    """Transform version: changes whenever a bundle is built, dropped or goes stale"""
+    manifest = get_manifest(root)
+    hashes = fingerprint.get_hashes(root)
+    digest = hashlib.sha256()
+    for bundle, entry in sorted(manifest["bundles"].items()):
+        digest.update(f"{bundle}={' '.join(entry['members'])} {is_current(entry, bundle, hashes)}\n".encode("utf-8"))
+    for bundle in sorted(manifest["retired"]):
+        digest.update(f"{bundle} retired\n".encode("utf-8"))
+    return f"1-{digest.hexdigest()[:10]}"
+
+
+def script_ref(token, page, hashes, known=()):
+    """(rel_path, defer) if token is a local classic script that may be merged, else None"""
+    src = token.get("src")
+    if not src or (token.get("type") or "").lower() not in JS_TYPES:
+        return None
+    if any(token.has(name) for name in ("async", "nomodule", "integrity")):
+        return None
+    rel_path = paths.resolve(page.rel_path, src)
+    if not rel_path or not rel_path.endswith(".js") or (rel_path not in hashes and rel_path not in known):
+        return None
+    return rel_path, token.has("defer")
+
+
+def stylesheet_ref(token, page, hashes, known=()):
+    """(rel_path, media) if token is a local stylesheet link that may be merged, else None"""
+    if (token.get("rel") or "").lower() != "stylesheet" or token.has("integrity"):
+        return None
+    rel_path = paths.resolve(page.rel_path, token.get("href") or "")
+    if not rel_path or not rel_path.endswith(".css") or (rel_path not in hashes and rel_path not in known):
+        return None
+    media = token.get("media") or "all"
+    onload = token.get("onload")
+    if onload is not None:
+        swapped = SWAP_ONLOAD_RE.match(onload)
+        if not swapped:
+            return None
+        media = swapped.group(1)
+    elif media == "print":
+        return None
+    return rel_path, media
+
+
+def scan(content, page, hashes, known=()):
+    """
+    (runs, scripts): the runs of mergeable references in content, each a
+    [Ref] (single references included), and every <script> in order.
+    Paths in known (bundles) count as references even once deleted.
+    """
+    runs, scripts = [], []
+    js_run, css_run = [], []
+    skip_until = None           # closing tag of an element whose content is ignored
+    pending_script = None       # (start, token, [code]) while inside <script>
+    pos = 0
+
+    def flush(run):
+        if run:
+            runs.append(list(run))
+            run.clear()
+
+    for token in tokenize(iter_chunks(content)):
+        start = pos
+        pos += len(token.raw)
+        if pending_script is not None:
+            if token.kind == "endtag" and token.tag == "script":
+                script_start, script_token, code = pending_script
+                pending_script = None
+                src = script_token.get("src")
+                rel_path = paths.resolve(page.rel_path, src) if src else None
+                scripts.append(Script(script_start, pos, script_token, "".join(code), rel_path))
+                ref = script_ref(script_token, page, hashes, known) if not "".join(code).strip() else None
+                if ref is None:
+                    flush(js_run)
+                else:
+                    if js_run and js_run[-1].key != ref[1]:
+                        flush(js_run)
+                    js_run.append(Ref("js", ref[0], script_start, pos, script_token, ref[1]))
+            else:
+                pending_script[2].append(token.raw)
+            continue
+        if skip_until is not None:
+            if token.kind == "endtag" and token.tag == skip_until:
+                skip_until = None
+            continue
+        if token.kind == "comment" or (token.kind == "data" and not token.raw.strip()):
+            continue
+        if token.kind == "starttag" and token.tag == "script":
+            pending_script = (start, token, [])
+            flush(css_run)
+            continue
+        if token.is_start and token.tag == "link":
+            ref = stylesheet_ref(token, page, hashes, known)
+            if ref is not None:
+                if css_run and css_run[-1].key != ref[1]:
+                    flush(css_run)
+                css_run.append(Ref("css", ref[0], start, pos, token, ref[1]))
+            elif (token.get("rel") or "").lower() == "stylesheet":
+                flush(css_run)
+            continue
+        if token.is_start and token.tag == "meta":
+            continue
+        flush(js_run)
+        if token.kind == "starttag" and token.tag in ("style", "noscript", "template"):
+            skip_until = token.tag
+            if not token.has("data-critical-css"):
+                flush(css_run)
+        elif token.tag in ("head", "body"):
+            flush(css_run)
+    flush(js_run)
+    flush(css_run)
+    return runs, scripts
+
+
+def member_tags(kind, members, key, prefix):
+    """Plain tags loading members one by one, as they were before bundling"""
+    urls = [prefix + quote(rel_path) for rel_path in members]
+    if kind == "js":
+        defer = " defer" if key else ""
+        return "\n".join(f'<script src="{url}"{defer}></script>' for url in urls)
+    media = f' media="{escape(key)}"' if key != "all" else ""
+    return "\n".join(f'<link rel="stylesheet" href="{url}"{media}>' for url in urls)
+
+
+def escape(value):
+    return value.replace("&", "&amp;").replace('"', "&quot;")
+
+
+def replace_spans(content, replacements):
+    """content with each (start, end, text) span replaced"""
+    for start, end, text in sorted(replacements, reverse=True):
+        content = content[:start] + text + content[end:]
+    return content
+
+
+def gap_markup(content, refs):
+    """Markup between consecutive refs worth keeping: anything but whitespace and critical CSS"""
+    kept = []
+    for previous, ref in zip(refs, refs[1:]):
+        gap = FALLBACK_RE.sub("", CRITICAL_STYLE_RE.sub("", content[previous.end:ref.start])).strip()
+        if gap:
+            kept.append(gap)
+    return kept
+
+
+def expand(content, page, expandable, hashes):
+    """content with references to stale or dropped bundles replaced by their members"""
+    runs, _ = scan(content, page, hashes, expandable)
+    replacements = []
+    for run in runs:
+        for ref in run:
+            if ref.rel_path in expandable:
+                replacements.append((ref.start, ref.end,
+                                     member_tags(ref.kind, expandable[ref.rel_path], ref.key, page.prefix)))
+    if replacements:
+        page.note(f"{len(replacements)} stale bundle reference(s) expanded to their members")
+    return replace_spans(content, replacements)
+
+
+def merge(content, page, bundles, hashes):
+    """content with each run of bundled members replaced by one tag for the bundle"""
+    by_first = defaultdict(list)
+    for bundle, members in bundles.items():
+        by_first[members[0]].append((bundle, members))
+    runs, _ = scan(content, page, hashes)
+    replacements = []
+    merged = 0
+    for run in runs:
+        rel_paths = [ref.rel_path for ref in run]
+        i = 0
+        while i < len(run):
+            for bundle, members in sorted(by_first.get(rel_paths[i], ()), key=lambda item: -len(item[1])):
+                if rel_paths[i:i + len(members)] == members:
+                    refs = run[i:i + len(members)]
+                    tag = member_tags(refs[0].kind, [bundle], refs[0].key, page.prefix)
+                    replacements.append((refs[0].start, refs[-1].end,
+                                         "\n".join([tag] + gap_markup(content, refs))))
+                    merged += len(members)
+                    i += len(members) - 1
+                    break
+            i += 1
+    if replacements:
+        page.note(f"{merged} references merged into {len(replacements)} bundle(s)")
+    return replace_spans(content, replacements)
+
+
+@transform("bundle-assets", version=bundle_version)
+def bundle_assets(content, page):
+    """Load co-occurring local scripts and stylesheets as shared bundles"""
+    manifest = get_manifest(page.root)
+    if not manifest["bundles"] and not manifest["retired"]:
+        return content
+    hashes = fingerprint.get_hashes(page.root)
+    current = {bundle: entry["members"] for bundle, entry in manifest["bundles"].items()
+               if is_current(entry, bundle, hashes)}
+    expandable = dict(manifest["retired"])
+    expandable.update((bundle, entry["members"]) for bundle, entry in manifest["bundles"].items()
+                      if bundle not in current)
+    if expandable:
+        content = expand(content, page, expandable, hashes)
+    if current:
+        content = merge(content, page, current, hashes)
+    return content
+
+
+# ---------------------------------------------------------------------------
+# defer-scripts
+# ---------------------------------------------------------------------------
+
+def significant_tokens(code):
+    return [value for kind, value in minify.tokenize_js(code) if kind == "token"]
+
+
+def matching_close(tokens, i):
+    """Index of the token closing the bracket at tokens[i]"""
+    depth = 0
+    for j in range(i, len(tokens)):
+        if tokens[j] in ("(", "[", "{"):
+            depth += 1
+        elif tokens[j] in (")", "]", "}"):
+            depth -= 1
+            if depth == 0:
+                return j
+    return len(tokens)
+
+
+def is_listener_only(tokens):
+    """True for document/window.addEventListener('DOMContentLoaded'|'load', ...) and nothing else"""
+    if len(tokens) < 6 or tokens[0] not in ("document", "window") or tokens[1:4] != [".", "addEventListener", "("]:
+        return False
+    if tokens[4] not in LISTENER_EVENTS:
+        return False
+    return all(token == ";" for token in tokens[matching_close(tokens, 3) + 1:])
+
+
+def is_data_only(tokens):
+    """True if the code only declares variables initialised with literals"""
+    depth = 0
+    for i, token in enumerate(tokens):
+        if token in ("{", "["):
+            depth += 1
+        elif token in ("}", "]"):
+            depth -= 1
+        elif token in DECLARATION_KEYWORDS or token in LITERAL_KEYWORDS:
+            continue
+        elif token[0] in "\"'" or token[0].isdigit() or token in (",", ":", ";", "=", "-"):
+            continue
+        elif minify.is_ident_char(token[0]):
+            previous = tokens[i - 1] if i else ""
+            declared = previous in DECLARATION_KEYWORDS or (previous in (",", ";") and depth == 0)
+            key = depth > 0 and i + 1 < len(tokens) and tokens[i + 1] == ":"
+            if not (declared or key):
+                return False
+        else:
+            return False
+    return True
+
+
+def writes_document(root, rel_path, digest):
+    key = (rel_path, digest)
+    if key not in _writes_document:
+        with open(os.path.join(root, rel_path), "r", encoding="utf-8", errors="replace") as f:
+            _writes_document[key] = bool(DOCUMENT_WRITE_RE.search(f.read()))
+    return _writes_document[key]
+
+
+def script_role(script, root, hashes):
+    """
+    "candidate" for a blocking script defer would suit, "neutral" for one
+    that later deferred scripts cannot affect, "barrier" for one that may
+    depend on every classic script before it.
+    """
+    token = script.token
+    if (token.get("type") or "").lower() not in JS_TYPES:
+        return "neutral"
+    if token.get("src"):
+        if token.has("async"):
+            # Runs whenever it arrives - until now always after every script before it
+            return "barrier"
+        if token.has("defer"):
+            return "neutral"
+        if script.rel_path is None:
+            return "barrier"
+        if script.rel_path not in hashes:
+            # Missing from the site: it fails to load and defines nothing
+            return "neutral"
+        if writes_document(root, script.rel_path, hashes[script.rel_path]):
+            return "barrier"
+        return "candidate"
+    tokens = significant_tokens(script.code)
+    if is_data_only(tokens) or is_listener_only(tokens):
+        return "neutral"
+    return "barrier"
+
+
+def defer_version(root):
+    """Transform version: bundle-assets may have added scripts to look at"""
+    return f"1-{bundle_version(root)}"
+
+
+@transform("defer-scripts", version=defer_version)
+def defer_scripts(content, page):
+    """Mark blocking local scripts defer when no later script depends on them"""
+    if "<script" not in content:
+        return content
+    hashes = fingerprint.get_hashes(page.root)
+    _, scripts = scan(content, page, hashes)
+    candidates = []
+    for script in scripts:
+        role = script_role(script, page.root, hashes)
+        if role == "candidate":
+            candidates.append(script)
+        elif role == "barrier":
+            candidates = []
+    replacements = []
+    for script in candidates:
+        script.token.set("defer", None)
+        replacements.append((script.start, script.start + len(script.token.raw), script.token.text()))
+    if replacements:
+        page.note(f"{len(replacements)} scripts deferred")
+    return replace_spans(content, replacements)
+
+
+# ---------------------------------------------------------------------------
+# Building
+# ---------------------------------------------------------------------------
+
+def scan_page(root, path, expandable):
+    """
+    (rel_path, [(kind, [member rel_paths])] per run, bundles referenced):
+    a page's runs with bundles expanded to their members
+    """
+    page = engine.Page(root, path)
+    hashes = fingerprint.get_hashes(root)
+    runs, _ = scan(engine.read_page(path), page, hashes, expandable)
+    result = []
+    referenced = set()
+    for run in runs:
+        members = []
+        for ref in run:
+            if ref.rel_path in expandable:
+                referenced.add(ref.rel_path)
+            members.extend(expandable.get(ref.rel_path, [ref.rel_path]))
+        result.append((run[0].kind, members))
+    return page.rel_path, result, referenced
+
+
+def is_bundleable(root, rel_path, digest):
+    """False for files that must stay a tag of their own"""
+    key = (rel_path, digest)
+    if key not in _bundleable:
+        with open(os.path.join(root, rel_path), "r", encoding="utf-8", errors="replace") as f:
+            text = f.read()
+        if rel_path.endswith(".js"):
+            tokens = significant_tokens(text[:4096])
+            strict = bool(tokens) and tokens[0] in ('"use strict"', "'use strict'")
+            _bundleable[key] = not strict and not SELF_LOCATING_RE.search(text)
+        else:
+            _bundleable[key] = not any(isinstance(rule, stylesheet.AtRule) and rule.name in LEADING_AT_RULES
+                                       for rule in stylesheet.parse(text))
+    return _bundleable[key]
+
+
+def segments(members, joined):
+    """members cut into maximal segments of joined neighbours"""
+    result = [[members[0]]] if members else []
+    for previous, member in zip(members, members[1:]):
+        if (previous, member) in joined and member not in result[-1]:
+            result[-1].append(member)
+        else:
+            result.append([member])
+    return [tuple(segment) for segment in result]
+
+
+def group(page_runs, bundleable, ratio=JOIN_RATIO):
+    """
+    {members tuple: pages using it}: neighbours in a run are joined when
+    they sit next to each other on at least ratio of the pages loading
+    either of them, and a chain of joined files is kept when it appears
+    whole on ratio of the pages loading any of its members - otherwise
+    it is cut at its weakest link and tried again. Pages where a kept
+    chain appears only in part load those files on their own.
+    """
+    pages_of = defaultdict(set)
+    adjacent = defaultdict(set)
+    for rel_path, runs in page_runs.items():
+        for _, members in runs:
+            for member in members:
+                pages_of[member].add(rel_path)
+            for pair in zip(members, members[1:]):
+                adjacent[pair].add(rel_path)
+
+    def strength(pair):
+        return len(adjacent[pair]) / max(len(pages_of[pair[0]]), len(pages_of[pair[1]]))
+
+    joined = {pair for pair in adjacent
+              if bundleable(pair[0]) and bundleable(pair[1]) and strength(pair) >= ratio}
+    while True:
+        pages_of_segment = defaultdict(set)
+        for rel_path, runs in page_runs.items():
+            for _, members in runs:
+                for segment in segments(members, joined):
+                    if len(segment) > 1:
+                        pages_of_segment[segment].add(rel_path)
+        strong, weak = {}, []
+        for segment, pages in pages_of_segment.items():
+            if len(pages) >= ratio * max(len(pages_of[member]) for member in segment):
+                strong[segment] = pages
+            else:
+                weak.append(segment)
+        # Links an accepted chain relies on stay, even if a rarer chain has them too
+        needed = {pair for segment in strong for pair in zip(segment, segment[1:])}
+        cut = {min((pair for pair in zip(segment, segment[1:]) if pair not in needed), key=strength, default=None)
+               for segment in weak} - {None}
+        if not cut:
+            return strong
+        joined -= cut
+
+
+def bundle_name(members):
+    digest = hashlib.sha256("\n".join(members).encode("utf-8")).hexdigest()[:12]
+    return f"{BUNDLE_DIR}/bundle-{digest}{posixpath.splitext(members[0])[1]}"
+
+
+def bundle_text(root, bundle, members):
+    """Minified, concatenated content of members for the file bundle"""
+    parts = []
+    for rel_path in members:
+        with open(os.path.join(root, rel_path), "r", encoding="utf-8", errors="replace") as f:
+            text = f.read()
+        if bundle.endswith(".js"):
+            # A leading ";" ends whatever statement the previous member left open
+            text = SOURCE_MAP_RE.sub("", text) if ".min." in rel_path else minify.minify_js(text)
+            parts.append(";" + text.strip() + "\n")
+        else:
+            up = "../" * bundle.count("/")
+            parts.append(minify.minify_css(stylesheet.rebase_urls(text, rel_path, up)))
+    return "".join(parts)
+
+
+def read_text(path):
+    """Contents of path, or None if it does not exist"""
+    try:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def write_atomic(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class BuildReport:
+    def __init__(self):
+        self.pages = 0
+        self.requests_before = 0
+        self.requests_after = 0
+        self.bundles = []       # (bundle, members, pages, bytes before, bytes after)
+        self.removed = []
+        self.seconds = 0.0
+
+    def print_summary(self, verbose=False):
+        shared = [row for row in self.bundles if row[2] > 1]
+        print("=" * 60)
+        print(f"Pages scanned: {self.pages}")
+        print(f"Bundles: {len(self.bundles)} ({len(shared)} shared by several pages, "
+              f"{len(self.bundles) - len(shared)} page-only)")
+        for bundle, members, pages, before, after in sorted(self.bundles, key=lambda row: (-row[2], row[0])):
+            print(f"  ✓ {bundle}: {len(members)} files on {pages} page(s), "
+                  f"{before / 1024:.1f} KB -> {after / 1024:.1f} KB")
+            if verbose:
+                for rel_path in members:
+                    print(f"      {rel_path}")
+        for bundle in self.removed:
+            print(f"  - {bundle} removed")
+        if self.pages:
+            print(f"Script/stylesheet requests per page: {self.requests_before / self.pages:.1f} -> "
+                  f"{self.requests_after / self.pages:.1f}")
+        print(f"Time: {self.seconds:.1f} s")
+        print("=" * 60)
+
+    def as_json(self):
+        return {"bundles": {bundle: {"members": members, "pages": pages, "before": before, "after": after}
+                            for bundle, members, pages, before, after in self.bundles}}
+
+
+def build(root, jobs=1, dry_run=False):
+    """Group co-occurring scripts and stylesheets, write the bundles and the manifest"""
+    report = BuildReport()
+    start = time.perf_counter()
+    manifest = load_manifest(root)
+    old_bundles = manifest.get("bundles", {})
+    expandable = dict(manifest.get("retired", {}))
+    expandable.update((bundle, entry["members"]) for bundle, entry in old_bundles.items())
+    hashes = fingerprint.get_hashes(root)
+
+    pages = list(engine.iter_pages(root))
+    if jobs > 1 and len(pages) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(scan_page, [root] * len(pages), pages, [expandable] * len(pages),
+                                        chunksize=8))
+    else:
+        results = [scan_page(root, path, expandable) for path in pages]
+    page_runs = {rel_path: [(kind, [m for m in members if m in hashes]) for kind, members in runs]
+                 for rel_path, runs, _ in results}
+    referenced = set().union(*(bundles for _, _, bundles in results))
+    report.pages = len(page_runs)
+
+    groups = group(page_runs, lambda rel_path: is_bundleable(root, rel_path, hashes[rel_path]))
+    bundles = {}
+    for members, group_pages in groups.items():
+        bundle = bundle_name(members)
+        text = bundle_text(root, bundle, members)
+        before = sum(os.path.getsize(os.path.join(root, rel_path)) for rel_path in members)
+        report.bundles.append((bundle, list(members), len(group_pages), before, len(text.encode("utf-8"))))
+        bundles[bundle] = {"members": list(members), "hashes": {m: hashes[m] for m in members},
+                           "pages": len(group_pages)}
+        if not dry_run and read_text(os.path.join(root, bundle)) != text:
+            write_atomic(os.path.join(root, bundle), text)
+
+    for runs in page_runs.values():
+        for _, members in runs:
+            report.requests_before += len(members)
+            report.requests_after += len(members) - sum(len(m) - 1 for m in groups if _contains(members, m))
+
+    retired = {bundle: members for bundle, members in expandable.items() if bundle not in bundles}
+    for bundle in retired:
+        path = os.path.join(root, bundle)
+        if os.path.exists(path):
+            report.removed.append(bundle)
+            if not dry_run:
+                os.remove(path)
+    if not dry_run:
+        # Pages still pointing at a dropped bundle need its members until the next run
+        save_manifest(root, bundles, {bundle: members for bundle, members in retired.items()
+                                      if bundle in referenced})
+        _manifest_by_root.pop(os.path.abspath(root), None)
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+def _contains(members, segment):
+    n = len(segment)
+    return any(tuple(members[i:i + n]) == segment for i in range(len(members) - n + 1))
@@ -0,0 +1,545 @@
+"""
+compact.py
+
+Compact a stylesheet that only ever grows by appending, such as
+css/custom-fixes.css, into the smallest one that styles every element the
+same way.
+
+Two rules with the same selector list (order and whitespace aside) apply
+to exactly the same elements with the same specificity, so:
+
+- A declaration is dropped when a later declaration of the same rule, or
+  of a later rule with the same selectors in the same block, sets the
+  same property (or a shorthand covering it, ``margin`` over
+  ``margin-left``) at least as importantly. Browsers that might not
+  understand the later value keep their fallback: nothing is dropped in
+  favour of a value with a vendor prefix, a function other than a handful
+  supported everywhere (rgb(), url(), translate(), ...) or a viewport /
+  container unit such as dvh, unless both values are the same.
+- Two such rules are merged into one, at the position of the later rule
+  when no rule in between sets a property related to the earlier rule's
+  declarations, else at the position of the earlier one when nothing in
+  between touches the later rule's. If both would cross a related
+  declaration they stay apart, since moving either could change which
+  declaration wins on elements the rule in between also matches.
+
+Rules left without declarations are removed. Rules inside @media and
+@supports are compacted within their block; @font-face, @keyframes and
+other at-rules are left alone. Comments are kept: a comment directly
+above a rule travels with it when it is merged and stays in its place
+when it is removed, one followed by a blank line (a section heading)
+never moves, and a comment after a declaration is dropped together with
+the declaration. The file is rewritten, one declaration per
+line, only when something was merged or dropped.
+"""
+
+import difflib
+import os
+import re
+import time
+
+from . import minify
+from . import stylesheet
+from .cssmatch import split_top_level
+
+# Comments become "@<mark>N<mark>;" statements where a rule or declaration
+# may start, so the parser keeps them in order, and are dropped from
+# selectors and values. A heading is a comment followed by a blank line,
+# a trailing one shares the line of the declaration before it.
+LEADING = "\x01"
+HEADING = "\x02"
+INLINE = "\x03"
+TRAILING = "\x04"
+
+COMMENT_RE = re.compile(r'"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\'|(/\*.*?\*/)', re.DOTALL)
+BLANK_LINE_RE = re.compile(r'[ \t\r]*\n[ \t\r]*\n|\s*\Z')
+COMMENT_STATEMENT_RE = re.compile(r'@([\x01\x02\x04])(\d+)\1;?')
+INLINE_RE = re.compile(r'\x03(\d+)\x03')
+IMPORTANT_RE = re.compile(r'\s*!\s*important\s*$', re.IGNORECASE)
+
+VENDOR_PREFIX_RE = re.compile(r'^-(?:webkit|moz|ms|o)-')
+VENDOR_VALUE_RE = re.compile(r'(?<![\w-])-(?:webkit|moz|ms|o)-')
+STRING_OR_URL_RE = re.compile(r'"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'|url\([^)]*\)', re.IGNORECASE)
+FUNCTION_RE = re.compile(r'([-\w]+)\(')
+NEW_UNIT_RE = re.compile(r'\d(?:[dsl]v(?:h|w|i|b|min|max)|cq(?:w|h|i|b|min|max))\b', re.IGNORECASE)
+
+# Functions every browser the site supports understands, so a value using
+# them never needs an earlier fallback
+SAFE_FUNCTIONS = {
+    "rgb", "rgba", "hsl", "hsla", "url", "attr", "counter", "format", "local",
+    "translate", "translatex", "translatey", "translate3d", "rotate", "scale", "matrix",
+    "cubic-bezier", "steps",
+}
+
+
+def _sides(template):
+    return {template.format(side) for side in ("top", "right", "bottom", "left")}
+
+
+def _expand(shorthands):
+    """Close the shorthand -> longhands map over nested shorthands (border -> border-top -> ...)"""
+    expanded = {}
+    for name in shorthands:
+        seen = set()
+        todo = list(shorthands[name])
+        while todo:
+            longhand = todo.pop()
+            if longhand not in seen:
+                seen.add(longhand)
+                todo.extend(shorthands.get(longhand, ()))
+        expanded[name] = seen
+    return expanded
+
+
+LONGHANDS = _expand({
+    "margin": _sides("margin-{}"),
+    "padding": _sides("padding-{}"),
+    "inset": _sides("{}"),
+    "border": _sides("border-{}") | {"border-width", "border-style", "border-color", "border-image"},
+    **{f"border-{side}": {f"border-{side}-width", f"border-{side}-style", f"border-{side}-color"}
+       for side in ("top", "right", "bottom", "left")},
+    "border-width": _sides("border-{}-width"),
+    "border-style": _sides("border-{}-style"),
+    "border-color": _sides("border-{}-color"),
+    "border-radius": {"border-top-left-radius", "border-top-right-radius",
+                      "border-bottom-right-radius", "border-bottom-left-radius"},
+    "border-image": {"border-image-source", "border-image-slice", "border-image-width",
+                     "border-image-outset", "border-image-repeat"},
+    "background": {"background-color", "background-image", "background-position", "background-size",
+                   "background-repeat", "background-attachment", "background-origin", "background-clip",
+                   "background-position-x", "background-position-y"},
+    "background-position": {"background-position-x", "background-position-y"},
+    "font": {"font-style", "font-variant", "font-weight", "font-stretch", "font-size",
+             "line-height", "font-family"},
+    "outline": {"outline-width", "outline-style", "outline-color"},
+    "overflow": {"overflow-x", "overflow-y"},
+    "flex": {"flex-grow", "flex-shrink", "flex-basis"},
+    "flex-flow": {"flex-direction", "flex-wrap"},
+    "gap": {"row-gap", "column-gap"},
+    "place-content": {"align-content", "justify-content"},
+    "place-items": {"align-items", "justify-items"},
+    "place-self": {"align-self", "justify-self"},
+    "list-style": {"list-style-type", "list-style-position", "list-style-image"},
+    "text-decoration": {"text-decoration-line", "text-decoration-style", "text-decoration-color"},
+    "transition": {"transition-property", "transition-duration", "transition-timing-function",
+                   "transition-delay"},
+    "animation": {"animation-name", "animation-duration", "animation-timing-function", "animation-delay",
+                  "animation-iteration-count", "animation-direction", "animation-fill-mode",
+                  "animation-play-state"},
+})
+
+
+class Declaration:
+    """One property: value [!important] pair; name is None for text that is not one"""
+
+    __slots__ = ("name", "value", "important", "comments", "trailing")
+
+    def __init__(self, name, value, important=False, comments=()):
+        self.name = name
+        self.value = value
+        self.important = important
+        self.comments = list(comments)
+        self.trailing = None          # comment on the same line
+
+    def text(self):
+        if self.name is None:
+            return f"{self.value};"
+        return f"{self.name}: {self.value}{' !important' if self.important else ''};"
+
+    def __repr__(self):
+        return f"Declaration({self.text()!r})"
+
+
+class Comment:
+    """A comment that stays in place (a section heading)"""
+
+    __slots__ = ("text",)
+
+    def __init__(self, text):
+        self.text = text
+
+
+class StyleRule:
+    """A style rule with its declarations parsed; comments are the ones directly above it"""
+
+    __slots__ = ("selector", "declarations", "comments", "inner")
+
+    def __init__(self, selector, declarations, comments=(), inner=()):
+        self.selector = selector
+        self.declarations = declarations
+        self.comments = list(comments)
+        self.inner = list(inner)      # comments before the first declaration
+
+    @property
+    def key(self):
+        return selector_key(self.selector)
+
+
+class AtBlock:
+    """An at-rule; items is the compacted child list of a group rule, None otherwise"""
+
+    __slots__ = ("rule", "items", "comments")
+
+    def __init__(self, rule, items=None, comments=()):
+        self.rule = rule
+        self.items = items
+        self.comments = list(comments)
+
+
+def selector_key(selector):
+    """The selector list as a set, so order and whitespace do not matter"""
+    return frozenset(stylesheet.WHITESPACE_RE.sub(" ", part).strip() for part in split_top_level(selector))
+
+
+def protect_comments(text):
+    """(text with comments replaced by placeholders, [comment text])"""
+    comments = []
+    out = []
+    pos = 0
+    boundary = True         # a rule or declaration may start here
+    same_line = False       # ... and the line so far ends a declaration
+    for m in COMMENT_RE.finditer(text):
+        before = text[pos:m.start()]
+        out.append(before)
+        if before.strip():
+            stripped = before.rstrip()
+            boundary = stripped[-1] in "{};"
+            same_line = stripped[-1] == ";" and "\n" not in before[len(stripped):]
+        elif "\n" in before:
+            same_line = False
+        if m.group(1) is None:
+            out.append(m.group(0))
+            boundary = False
+        else:
+            comments.append(m.group(1))
+            n = len(comments) - 1
+            if boundary:
+                if same_line:
+                    mark = TRAILING
+                else:
+                    mark = HEADING if BLANK_LINE_RE.match(text, m.end()) else LEADING
+                out.append(f"@{mark}{n}{mark};")
+            else:
+                out.append(f"{INLINE}{n}{INLINE}")
+        pos = m.end()
+    out.append(text[pos:])
+    return "".join(out), comments
+
+
+def restore_comments(text, comments):
+    """text with its comment placeholders turned back into the comments"""
+    text = COMMENT_STATEMENT_RE.sub(lambda m: comments[int(m.group(2))], text)
+    return INLINE_RE.sub(lambda m: comments[int(m.group(1))], text)
+
+
+def strip_placeholders(text):
+    return stylesheet.WHITESPACE_RE.sub(" ", INLINE_RE.sub(" ", COMMENT_STATEMENT_RE.sub(" ", text))).strip()
+
+
+def parse_declarations(text, comments):
+    """([Declaration], [comments before the first one])"""
+    declarations = []
+    inner = []
+    for part in split_top_level(text, ";"):
+        part = part.strip()
+        if not part:
+            continue
+        m = COMMENT_STATEMENT_RE.fullmatch(part + ";")
+        if m:
+            comment = comments[int(m.group(2))]
+            if not declarations:
+                inner.append(comment)
+            elif m.group(1) == TRAILING and declarations[-1].trailing is None:
+                declarations[-1].trailing = comment
+            else:
+                declarations[-1].comments.append(comment)
+            continue
+        found = [comments[int(n)] for n in INLINE_RE.findall(part)]
+        part = INLINE_RE.sub(" ", part).strip()
+        name, colon, value = part.partition(":")
+        name = name.strip()
+        if not colon or not name or " " in name:
+            declarations.append(Declaration(None, part, comments=found))
+            continue
+        value = value.strip()
+        important = bool(IMPORTANT_RE.search(value))
+        declarations.append(Declaration(name if name.startswith("--") else name.lower(),
+                                        IMPORTANT_RE.sub("", value), important, found))
+    return declarations, inner
+
+
+def _items(rules, comments):
+    items = []
+    pending = []            # comments waiting for the rule below them
+    for rule in rules:
+        if isinstance(rule, stylesheet.AtRule) and rule.name[:1] in (LEADING, HEADING, TRAILING):
+            text = comments[int(rule.name[1:-1])]
+            if rule.name[0] == HEADING:
+                items.extend(Comment(comment) for comment in pending)
+                items.append(Comment(text))
+                pending = []
+            else:
+                pending.append(text)
+            continue
+        if isinstance(rule, stylesheet.Rule):
+            declarations, inner = parse_declarations(rule.declarations, comments)
+            items.append(StyleRule(strip_placeholders(rule.selector), declarations, pending, inner))
+        elif rule.rules is not None:
+            group = stylesheet.AtRule(rule.name, strip_placeholders(rule.prelude), rules=[])
+            items.append(AtBlock(group, _items(rule.rules, comments), pending))
+        else:
+            block = None if rule.block is None else restore_comments(rule.block, comments)
+            items.append(AtBlock(stylesheet.AtRule(rule.name, strip_placeholders(rule.prelude), block=block),
+                                 comments=pending))
+        pending = []
+    items.extend(Comment(comment) for comment in pending)
+    return items
+
+
+def parse(text):
+    """[Comment | StyleRule | AtBlock] for the stylesheet text"""
+    protected, comments = protect_comments(text)
+    return _items(stylesheet.parse(protected), comments)
+
+
+def _render_declarations(declarations, inner, indent):
+    lines = [f"{indent}{comment}" for comment in inner]
+    for declaration in declarations:
+        trailing = f" {declaration.trailing}" if declaration.trailing else ""
+        lines.append(f"{indent}{declaration.text()}{trailing}")
+        lines.extend(f"{indent}{comment}" for comment in declaration.comments)
+    return lines
+
+
+def render(items, indent=""):
+    """Stylesheet text for items: one selector and one declaration per line"""
+    blocks = []
+    for item in items:
+        if isinstance(item, Comment):
+            blocks.append(f"{indent}{item.text}")
+            continue
+        lines = [f"{indent}{comment}" for comment in item.comments]
+        if isinstance(item, StyleRule):
+            selectors = [part.strip() for part in split_top_level(item.selector)]
+            lines.append(indent + f",\n{indent}".join(selectors) + " {")
+            lines.extend(_render_declarations(item.declarations, item.inner, indent + "    "))
+            lines.append(f"{indent}}}")
+        else:
+            rule = item.rule
+            head = f"{indent}@{rule.name} {rule.prelude}" if rule.prelude else f"{indent}@{rule.name}"
+            if item.items is not None:
+                lines.append(f"{head} {{")
+                lines.append(render(item.items, indent + "    ").rstrip("\n"))
+                lines.append(f"{indent}}}")
+            elif rule.block is None:
+                lines.append(f"{head};")
+            elif "{" in rule.block:
+                lines.append(f"{head} {{\n{indent}    {rule.block}\n{indent}}}")
+            else:
+                protected, comments = protect_comments(rule.block)
+                lines.append(f"{head} {{")
+                lines.extend(_render_declarations(*parse_declarations(protected, comments), indent + "    "))
+                lines.append(f"{indent}}}")
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks) + "\n"
+
+
+def unprefixed(name):
+    return VENDOR_PREFIX_RE.sub("", name)
+
+
+def coverage(name):
+    """Every property a declaration of name sets"""
+    name = unprefixed(name)
+    return {name} | LONGHANDS.get(name, set())
+
+
+def related(first, second):
+    """True if the order of declarations of first and second can matter"""
+    if first is None or second is None or "all" in (first, second):
+        return True
+    return bool(coverage(first) & coverage(second))
+
+
+def needs_fallback(value):
+    """True if some browser may not understand value and use an earlier declaration instead"""
+    plain = STRING_OR_URL_RE.sub("", value)
+    if VENDOR_VALUE_RE.search(plain) or NEW_UNIT_RE.search(plain):
+        return True
+    return any(name.lower() not in SAFE_FUNCTIONS for name in FUNCTION_RE.findall(plain))
+
+
+def overrides(later, earlier):
+    """True if later always wins over earlier on an element both apply to"""
+    if later.name is None or earlier.name is None:
+        return False
+    if earlier.important and not later.important:
+        return False
+    if later.name != earlier.name and earlier.name not in LONGHANDS.get(later.name, ()):
+        return False
+    if later.name == earlier.name and later.value == earlier.value:
+        return True
+    return not (needs_fallback(later.value) or needs_fallback(earlier.value))
+
+
+def drop_overridden(declarations, later, log, selector):
+    """declarations without the ones a declaration in later overrides"""
+    kept = []
+    for i, declaration in enumerate(declarations):
+        following = later if later is not None else declarations[i + 1:]
+        if any(overrides(other, declaration) for other in following):
+            log.append(f"{short(selector)}: dropped overridden {declaration.text()}")
+        else:
+            kept.append(declaration)
+    return kept
+
+
+def declared(items):
+    """Names of every property the style rules in items set, nested blocks included"""
+    names = []
+    for item in items:
+        if isinstance(item, StyleRule):
+            names.extend(declaration.name for declaration in item.declarations)
+        elif isinstance(item, AtBlock) and item.items is not None:
+            names.extend(declared(item.items))
+    return names
+
+
+def crosses(declarations, between):
+    """True if moving declarations past the rules between could change what wins"""
+    names = declared(between)
+    return any(related(declaration.name, name) for declaration in declarations for name in names)
+
+
+def short(selector, width=60):
+    selector = stylesheet.WHITESPACE_RE.sub(" ", selector)
+    return selector if len(selector) <= width else selector[:width - 3] + "..."
+
+
+def _merge_once(items, log):
+    """Drop or merge one earlier rule into a later one with the same selectors; True if done"""
+    last = {}
+    for j, item in enumerate(items):
+        if not isinstance(item, StyleRule):
+            continue
+        i = last.get(item.key)
+        last[item.key] = j
+        if i is None:
+            continue
+        earlier = items[i]
+        remaining = drop_overridden(earlier.declarations, item.declarations, log, earlier.selector)
+        if len(remaining) != len(earlier.declarations):
+            earlier.declarations = remaining
+        between = items[i + 1:j]
+        if not earlier.declarations and not earlier.inner:
+            items[i:i + 1] = [Comment(comment) for comment in earlier.comments]
+            log.append(f"{short(earlier.selector)}: removed, every declaration is set again below")
+            return True
+        if not crosses(earlier.declarations, between):
+            item.declarations[:0] = earlier.declarations
+            item.comments[:0] = earlier.comments
+            item.inner[:0] = earlier.inner
+            del items[i]
+            log.append(f"{short(item.selector)}: merged into the later rule")
+            return True
+        if not crosses(item.declarations, between):
+            earlier.declarations.extend(item.declarations)
+            earlier.comments.extend(item.comments)
+            earlier.inner.extend(item.inner)
+            del items[j]
+            log.append(f"{short(item.selector)}: merged into the earlier rule")
+            return True
+    return False
+
+
+def compact_items(items, log):
+    """Compact items in place; log gets one line per change"""
+    for item in items:
+        if isinstance(item, AtBlock) and item.items is not None:
+            compact_items(item.items, log)
+    for item in items:
+        if isinstance(item, StyleRule):
+            item.declarations = drop_overridden(item.declarations, None, log, item.selector)
+    while _merge_once(items, log):
+        pass
+    for i in range(len(items) - 1, -1, -1):
+        item = items[i]
+        if isinstance(item, StyleRule) and not item.declarations:
+            log.append(f"{short(item.selector)}: removed, no declarations")
+            del items[i]
+        elif isinstance(item, AtBlock) and item.items is not None and \
+                not any(isinstance(child, (StyleRule, AtBlock)) for child in item.items):
+            log.append(f"@{item.rule.name} {item.rule.prelude}: removed, no rules")
+            del items[i]
+    return items
+
+
+def size(text):
+    return len(text.encode("utf-8"))
+
+
+def compact_file(root, rel_path, dry_run=False):
+    """(before bytes, after bytes, minified before, minified after, changes, unified diff)"""
+    path = os.path.join(root, rel_path)
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        text = f.read()
+    log = []
+    items = compact_items(parse(text), log)
+    if not log:
+        minified = size(minify.minify_css(text))
+        return size(text), size(text), minified, minified, log, []
+    compacted = render(items)
+    diff = list(difflib.unified_diff(render(parse(text)).splitlines(), compacted.splitlines(),
+                                     f"a/{rel_path}", f"b/{rel_path}", lineterm=""))
+    if not dry_run:
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+            f.write(compacted)
+        os.replace(tmp_path, path)
+    return (size(text), size(compacted), size(minify.minify_css(text)), size(minify.minify_css(compacted)),
+            log, diff)
+
+
+class CompactReport:
+    def __init__(self):
+        self.files = []         # (rel_path, before, after, minified before, minified after, changes, diff)
+        self.errors = []
+        self.seconds = 0.0
+
+    def print_summary(self, verbose=False, diff=False):
+        print("=" * 60)
+        for rel_path, before, after, min_before, min_after, changes, lines in self.files:
+            if not changes:
+                print(f"  ✓ {rel_path}: {before / 1024:.1f} KB, nothing to compact")
+                continue
+            print(f"  ✓ {rel_path}: {before / 1024:.1f} KB -> {after / 1024:.1f} KB "
+                  f"(minified {min_before / 1024:.1f} KB -> {min_after / 1024:.1f} KB, "
+                  f"{min_before - min_after} bytes removed), {len(changes)} changes")
+            if verbose:
+                for change in changes:
+                    print(f"    {change}")
+            if diff:
+                for line in lines:
+                    print(line)
+        for rel_path, error in self.errors:
+            print(f"  ❌ {rel_path}: {error}")
+        print(f"Time: {self.seconds:.1f} s")
+        print("=" * 60)
+
+    def as_json(self):
+        return {"files": {rel_path: {"before": before, "after": after, "minified_before": min_before,
+                                     "minified_after": min_after, "changes": changes}
+                          for rel_path, before, after, min_before, min_after, changes, _ in self.files}}
+
+
+def compact(root, rel_paths, dry_run=False):
+    """Compact every stylesheet in rel_paths"""
+    report = CompactReport()
+    start = time.perf_counter()
+    for rel_path in rel_paths:
+        try:
+            report.files.append((rel_path, *compact_file(root, rel_path, dry_run)))
+        except (OSError, UnicodeDecodeError) as e:
+            report.errors.append((rel_path, str(e)))
+    report.seconds = time.perf_counter() - start
+    return report
@@ -0,0 +1,360 @@
+"""
+critical.py
+
+Critical CSS: inline what the first screen needs, load the rest later.
+
+For every page the critical-css transform takes the local stylesheets
+linked from <head> and the above-the-fold part of the DOM - the same zone
+lcp-priority uses (the Divi theme-builder header and the first content
+section), plus every ancestor up to <html>. Each style rule whose selector
+matches one of those elements (cssmatch.py, with :hover and other
+state-dependent pseudo-classes treated as not matching) is kept, along
+with the @font-face and @keyframes rules the kept declarations refer to.
+
+Each stylesheet link is then replaced by
+
+    <style data-critical-css>...its critical rules...</style>
+    <link rel="stylesheet" href="..." media="print" onload="this.media='all';this.onload=null">
+    <noscript data-critical-css><link rel="stylesheet" href="..."></noscript>
+
+so the page renders from the inline subset and the full file is fetched
+without blocking; the cascade order between sheets and inline <style>
+blocks is the same as before. Relative url()s are rebased to the page.
+
+Results are cached per page template: pages with the same stylesheets and
+the same above-the-fold structure (ignoring per-page content such as
+src, href, alt or body classes like postid-123) share one entry in
+.sitefix/critical-css.json, so the ~90 news and post pages that share a
+layout are matched once. New templates are only saved after a run that
+writes, by the main process. Stylesheets on other hosts (Google Fonts, cdnjs)
+cannot be read here and are left alone, as are links already loaded
+asynchronously and pages without an above-the-fold zone.
+"""
+
+import hashlib
+import os
+import re
+
+from . import fingerprint
+from . import paths
+from . import state
+from . import stylesheet
+from .cssmatch import Document, Matcher, SelectorError, parse_selector_list
+from .htmlstream import tokenize
+from .imgattrs import ABOVE_THE_FOLD
+from .transforms import transform
+
+CACHE_PATH = os.path.join(state.STATE_DIR, "critical-css.json")
+CACHE_VERSION = 1
+
+# Stands for page.prefix in cached CSS; url()s are rebased per page
+ROOT_PLACEHOLDER = "{{root}}"
+
+LINK_RE = re.compile(r'<link\b[^>]*>', re.IGNORECASE)
+CRITICAL_STYLE_RE = re.compile(r'<style data-critical-css>.*?</style>\s*', re.DOTALL)
+FALLBACK_RE = re.compile(r'\s*<noscript data-critical-css>.*?</noscript>', re.DOTALL)
+SWAP_ONLOAD_RE = re.compile(r"^this\.media='([^']*)';this\.onload=null$")
+FONT_FAMILY_RE = re.compile(r'font-family\s*:\s*([^;]+)', re.IGNORECASE)
+
+# Classes and ids that differ between pages of one template
+VARYING_CLASS_RE = re.compile(r'-\d+$|^(?:category|tag|author)-')
+# Attributes that carry page content rather than structure
+CONTENT_ATTRS = {
+    "src", "srcset", "sizes", "href", "alt", "title", "width", "height", "style",
+    "content", "value", "datetime", "aria-label", "loading", "decoding", "fetchpriority",
+}
+
+# (root) -> {template key: entry}
+_cache_by_root = {}
+# (rel_path, hash) -> parsed stylesheet
+_sheets = {}
+# selector text -> [Selector], or None if it cannot be evaluated
+_selectors = {}
+
+
+def load_cache(root, hashes):
+    """Saved templates whose stylesheets are all unchanged"""
+    templates = state.load_json(os.path.join(root, CACHE_PATH), CACHE_VERSION).get("templates", {})
+    return {key: entry for key, entry in templates.items()
+            if all(hashes.get(rel_path) == digest for rel_path, digest in entry["sheets"])}
+
+
+def save_cache(root, templates):
+    state.save_json(os.path.join(root, CACHE_PATH), {"version": CACHE_VERSION, "templates": templates})
+
+
+def save_templates(root, computed):
+    """Add the templates computed during a run to the saved cache; critical-css' save hook"""
+    if computed:
+        saved = load_cache(root, fingerprint.get_hashes(root))
+        saved.update(computed)
+        save_cache(root, saved)
+
+
+def get_templates(root):
+    root = os.path.abspath(root)
+    if root not in _cache_by_root:
+        _cache_by_root[root] = load_cache(root, fingerprint.get_hashes(root))
+    return _cache_by_root[root]
+
+
+def critical_version(root):
+    """Transform version: changes whenever a stylesheet changes"""
+    hashes = fingerprint.get_hashes(root)
+    digest = hashlib.sha256()
+    for rel_path in sorted(hashes):
+        if rel_path.endswith(".css"):
+            digest.update(f"{rel_path}={hashes[rel_path]}\n".encode("utf-8"))
+    return f"1-{digest.hexdigest()[:10]}"
+
+
+def stylesheet_links(head, page, hashes):
+    """
+    [(match, token, rel_path, media)] for the render-blocking local
+    stylesheets in head, and those this transform already made async
+    (media is then the one they switch to).
+    """
+    links = []
+    for m in LINK_RE.finditer(head):
+        token = next(tokenize([m.group(0)]))
+        if (token.get("rel") or "").lower() != "stylesheet":
+            continue
+        rel_path = paths.resolve(page.rel_path, token.get("href") or "")
+        if not rel_path or rel_path not in hashes:
+            continue
+        onload = token.get("onload")
+        media = token.get("media") or "all"
+        if onload is not None:
+            swapped = SWAP_ONLOAD_RE.match(onload)
+            if not swapped:
+                continue
+            media = swapped.group(1)
+        elif media == "print":
+            continue
+        links.append((m, token, rel_path, media))
+    return links
+
+
+def fold_elements(doc):
+    """Above-the-fold elements, their descendants and ancestors, in document order"""
+    zones = [element for element in doc.elements if element.classes.intersection(ABOVE_THE_FOLD)]
+    fold = set()
+    for zone in zones:
+        fold.update(zone.ancestors())
+        pending = [zone]
+        while pending:
+            element = pending.pop()
+            if element not in fold:
+                fold.add(element)
+                pending.extend(element.children)
+    return [element for element in doc.elements if element in fold] if zones else []
+
+
+def describe(element):
+    if element is None:
+        return ""
+    classes = sorted(cls for cls in element.classes if not VARYING_CLASS_RE.search(cls))
+    id_ = element.id if element.id and not VARYING_CLASS_RE.search(element.id) else ""
+    return f"{element.tag}#{id_}.{'.'.join(classes)}"
+
+
+def signature(fold):
+    """
+    Structure of the fold that selectors can see, without per-page content.
+    A set of distinct element descriptions, so pages that only repeat an
+    element more or fewer times (ten blog cards instead of nine) match.
+    """
+    lines = set()
+    for element in fold:
+        depth = sum(1 for _ in element.ancestors())
+        attrs = sorted(f"{name}={value}" for name, value in element.attrs.items()
+                       if name not in CONTENT_ATTRS and name not in ("class", "id"))
+        last = element.parent is None or element.index == len(element.parent.children) - 1
+        lines.add(f"{depth} {element.index} {last} {describe(element.parent)} > {describe(element)} "
+                  f"{' '.join(attrs)} {element.has_text}")
+    return "\n".join(sorted(lines))
+
+
+def template_key(sheets, fold):
+    digest = hashlib.sha256()
+    for rel_path, file_hash, media in sheets:
+        digest.update(f"{rel_path}={file_hash} {media}\n".encode("utf-8"))
+    digest.update(signature(fold).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def load_sheet(root, rel_path, file_hash):
+    key = (rel_path, file_hash)
+    if key not in _sheets:
+        with open(os.path.join(root, rel_path), "r", encoding="utf-8", errors="replace") as f:
+            _sheets[key] = stylesheet.parse(f.read())
+    return _sheets[key]
+
+
+def selectors_of(rule):
+    if rule.selector not in _selectors:
+        try:
+            _selectors[rule.selector] = parse_selector_list(rule.selector)
+        except SelectorError:
+            _selectors[rule.selector] = None
+    return _selectors[rule.selector]
+
+
+class FoldIndex:
+    """Fold elements by id, class and tag, to test only plausible subjects"""
+
+    def __init__(self, fold):
+        self.all = fold
+        self.by_id, self.by_class, self.by_tag = {}, {}, {}
+        for element in fold:
+            if element.id:
+                self.by_id.setdefault(element.id, []).append(element)
+            for cls in element.classes:
+                self.by_class.setdefault(cls, []).append(element)
+            self.by_tag.setdefault(element.tag, []).append(element)
+
+    def candidates(self, selector):
+        subject = selector.subject
+        if subject.ids:
+            return self.by_id.get(subject.ids[0], ())
+        if subject.classes:
+            return min((self.by_class.get(cls, ()) for cls in subject.classes), key=len)
+        if subject.tag:
+            return self.by_tag.get(subject.tag, ())
+        return self.all
+
+
+def select(rules, index, matcher):
+    """
+    The rules needed above the fold. Unevaluable selectors are kept, to be
+    safe; every @font-face and @keyframes rule is kept for prune_unused().
+    """
+    kept = []
+    for rule in rules:
+        if isinstance(rule, stylesheet.Rule):
+            selectors = selectors_of(rule)
+            if selectors is None or any(matcher.matches(selector, element)
+                                        for selector in selectors
+                                        for element in index.candidates(selector)):
+                kept.append(rule)
+        elif rule.rules is not None:
+            if rule.name in ("media", "supports", "layer", "container") and rule.prelude.lower() != "print":
+                children = select(rule.rules, index, matcher)
+                if children:
+                    kept.append(stylesheet.AtRule(rule.name, rule.prelude, rules=children))
+        elif rule.name == "font-face" or rule.name.endswith("keyframes"):
+            kept.append(rule)
+    return kept
+
+
+def declarations_text(rules):
+    """Lower-cased declarations of the style rules in rules, for reference checks"""
+    parts = []
+    for rule in rules:
+        if isinstance(rule, stylesheet.Rule):
+            parts.append(rule.declarations.lower())
+        elif rule.rules is not None:
+            parts.append(declarations_text(rule.rules))
+    return "\n".join(parts)
+
+
+def prune_unused(rules, used):
+    """Drop @font-face/@keyframes rules that nothing in used refers to"""
+    kept = []
+    for rule in rules:
+        if isinstance(rule, stylesheet.Rule):
+            kept.append(rule)
+        elif rule.rules is not None:
+            children = prune_unused(rule.rules, used)
+            if any(isinstance(child, stylesheet.Rule) or child.rules for child in children):
+                kept.append(stylesheet.AtRule(rule.name, rule.prelude, rules=children))
+        elif rule.name == "font-face":
+            family = FONT_FAMILY_RE.search(rule.block)
+            if family and family.group(1).strip().strip("'\"").lower() in used:
+                kept.append(rule)
+        elif re.search(rf"(?<![\w-]){re.escape(rule.prelude.strip().lower())}(?![\w-])", used):
+            kept.append(rule)
+    return kept
+
+
+def compute(root, sheets, fold):
+    """Critical CSS text for each of sheets, url()s rebased to ROOT_PLACEHOLDER"""
+    index = FoldIndex(fold)
+    matcher = Matcher(dynamic=False)
+    selected = [select(load_sheet(root, rel_path, file_hash), index, matcher)
+                for rel_path, file_hash, _ in sheets]
+    used = "\n".join(declarations_text(rules) for rules in selected)
+    css = []
+    for (rel_path, _, media), rules in zip(sheets, selected):
+        text = stylesheet.serialize(prune_unused(rules, used))
+        text = stylesheet.rebase_urls(text, rel_path, ROOT_PLACEHOLDER)
+        if text and media not in ("all", ""):
+            text = f"@media {media}{{{text}}}"
+        css.append(text)
+    return css
+
+
+def escape(value):
+    return value.replace("&", "&amp;").replace('"', "&quot;")
+
+
+def layout_free(head):
+    """head without the whitespace around critical-css blocks, which minify-html may collapse"""
+    head = CRITICAL_STYLE_RE.sub(lambda m: m.group(0).rstrip(), head)
+    return FALLBACK_RE.sub(lambda m: m.group(0).lstrip(), head)
+
+
+def async_link(token, media, css, prefix):
+    """Inline critical CSS, the link loading the full sheet async, and its fallback"""
+    onload = f"this.media='{media}';this.onload=null"
+    if token.get("media") != "print" or token.get("onload") != onload:
+        token.set("media", "print")
+        token.set("onload", onload)
+    fallback = f'<link rel="stylesheet" href="{escape(token.get("href"))}"'
+    if media != "all":
+        fallback += f' media="{escape(media)}"'
+    style = f"<style data-critical-css>{css.replace(ROOT_PLACEHOLDER, prefix)}</style>\n\t" if css else ""
+    return f"{style}{token.text()}\n\t<noscript data-critical-css>{fallback}></noscript>"
+
+
+@transform("critical-css", version=critical_version, save=save_templates)
+def critical_css(content, page):
+    """Inline each template's above-the-fold CSS and load full stylesheets async"""
+    end = content.find("</head>")
+    if end < 0 or "stylesheet" not in content[:end]:
+        return content
+    hashes = fingerprint.get_hashes(page.root)
+    head = FALLBACK_RE.sub("", CRITICAL_STYLE_RE.sub("", content[:end]))
+    links = stylesheet_links(head, page, hashes)
+    if not links:
+        return content
+    fold = fold_elements(Document.parse(content))
+    if not fold:
+        return content
+
+    sheets = [(rel_path, hashes[rel_path], media) for _, _, rel_path, media in links]
+    key = template_key(sheets, fold)
+    templates = get_templates(page.root)
+    if key not in templates:
+        templates[key] = {"sheets": [[rel_path, file_hash] for rel_path, file_hash, _ in sheets],
+                          "page": page.rel_path, "css": compute(page.root, sheets, fold)}
+        page.remember(key, templates[key])
+        page.note(f"critical CSS computed for template {key}")
+
+    parts = []
+    pos = 0
+    for (m, token, _, media), css in zip(links, templates[key]["css"]):
+        parts.append(head[pos:m.start()])
+        parts.append(async_link(token, media, css, page.prefix))
+        pos = m.end()
+    parts.append(head[pos:])
+    new_head = "".join(parts)
+    if layout_free(new_head) == layout_free(content[:end]):
+        # Already done: keep the layout minify-html left
+        return content
+    new_content = new_head + content[end:]
+    if new_content != content:
+        inlined = sum(len(css) for css in templates[key]["css"])
+        page.note(f"{len(links)} stylesheets loaded async, {inlined / 1024:.1f} KB critical CSS inlined "
+                  f"(template {key})")
+    return new_content
@@ -0,0 +1,543 @@
+"""
+cssmatch.py
+
+CSS selector matching against a static DOM built from htmlstream tokens.
+
+    doc = Document.parse(content)
+    selectors = parse_selector_list(".et_pb_menu li > a:not(.button)")
+    matched = [el for el in doc.elements if Matcher().matches_any(selectors, el)]
+
+Supported: type, universal, #id, .class and [attr] (=, ~=, |=, ^=, $=,
+*=, with the i flag) selectors; the descendant, child, next-sibling and
+subsequent-sibling combinators; :not(), :is(), :where(), :matches(),
+:root, :empty, :first/last/only-child, :first/last/only-of-type,
+:nth(-last)-child() (with "of S") and :nth(-last)-of-type(). :has() is approximated
+from the safe side: it matches if any element after the anchor, or inside
+it, matches the argument on its own. Pseudo-elements (::before,
+:after, ::-webkit-scrollbar, ...) are ignored: a rule for an element's
+pseudo-element is needed exactly when the element matches.
+
+Pseudo-classes that depend on interaction or state (:hover, :focus,
+:checked, vendor-prefixed ones, ...) cannot be decided statically; a
+Matcher is told what to assume for them. Anything else - a namespace or a
+syntax error - raises SelectorError, and callers decide how
+cautious to be.
+"""
+
+import re
+
+from .htmlstream import VOID_ELEMENTS, tokenize, iter_chunks
+
+# Pseudo-elements that CSS2 allowed with a single colon
+LEGACY_PSEUDO_ELEMENTS = {"before", "after", "first-line", "first-letter"}
+
+STRUCTURAL_PSEUDO_CLASSES = {
+    "root", "empty", "first-child", "last-child", "only-child",
+    "first-of-type", "last-of-type", "only-of-type",
+}
+NTH_PSEUDO_CLASSES = {"nth-child", "nth-last-child", "nth-of-type", "nth-last-of-type"}
+LOGICAL_PSEUDO_CLASSES = {"not", "is", "where", "matches", "-webkit-any", "-moz-any"}
+DYNAMIC_PSEUDO_CLASSES = {
+    "hover", "focus", "active", "visited", "link", "any-link", "target", "focus-within",
+    "focus-visible", "checked", "disabled", "enabled", "indeterminate", "default",
+    "required", "optional", "valid", "invalid", "in-range", "out-of-range", "read-only",
+    "read-write", "placeholder-shown", "autofill", "fullscreen", "defined", "lang", "dir",
+    "playing", "paused", "open", "modal", "popover-open", "user-invalid", "user-valid",
+}
+
+NTH_RE = re.compile(r"^\s*(?:(odd)|(even)|([+-]?\d*)n\s*(?:([+-])\s*(\d+))?|([+-]?\d+))\s*$", re.IGNORECASE)
+ATTR_RE = re.compile(
+    r'^\s*([\w-]+|\*?\|[\w-]+)\s*(?:([~|^$*]?=)\s*(?:"((?:[^"\\]|\\.)*)"|\'((?:[^\'\\]|\\.)*)\'|([^\s\]]+))'
+    r'\s*([iIsS])?)?\s*$')
+OF_RE = re.compile(r"(?<=[\dnd\s])of(?=[\s.#\[:*\w])", re.IGNORECASE)
+ESCAPE_RE = re.compile(r"\\([0-9a-fA-F]{1,6}\s?|.)", re.DOTALL)
+
+
+class SelectorError(ValueError):
+    """A selector this module cannot evaluate"""
+
+
+class Compound:
+    """A compound selector: tag plus simple selectors, all on one element"""
+
+    __slots__ = ("tag", "ids", "classes", "attrs", "pseudos")
+
+    def __init__(self):
+        self.tag = None         # lower-case name, or None for any
+        self.ids = []
+        self.classes = []
+        self.attrs = []         # [(name, op or None, value, ignore_case)]
+        self.pseudos = []       # [(name, argument)]; see parse_pseudo
+
+    def __repr__(self):
+        return f"Compound({self.tag!r}, {self.ids!r}, {self.classes!r})"
+
+
+class Selector:
+    """A complex selector: [(combinator, Compound)], combinator None for the first"""
+
+    __slots__ = ("text", "parts")
+
+    def __init__(self, text, parts):
+        self.text = text
+        self.parts = parts
+
+    @property
+    def subject(self):
+        """The rightmost compound, the one describing the matched element"""
+        return self.parts[-1][1]
+
+    def compounds(self):
+        """Every Compound in the selector, including inside :not()/:is()"""
+        for _, compound in self.parts:
+            yield compound
+            for name, argument in compound.pseudos:
+                if name in LOGICAL_PSEUDO_CLASSES:
+                    for selector in argument:
+                        yield from selector.compounds()
+                elif name == "has":
+                    for _, selector in argument:
+                        yield from selector.compounds()
+
+    def __repr__(self):
+        return f"Selector({self.text!r})"
+
+
+def unescape(ident):
+    def replace(m):
+        value = m.group(1)
+        if len(value.strip()) > 1 or value[0] in "0123456789abcdefABCDEF":
+            try:
+                return chr(int(value.strip(), 16))
+            except (ValueError, OverflowError):
+                return "\ufffd"
+        return value
+    return ESCAPE_RE.sub(replace, ident) if "\\" in ident else ident
+
+
+def split_top_level(text, separator=","):
+    """Split text on separator outside brackets, parentheses and strings"""
+    parts = []
+    depth = 0
+    start = 0
+    pos = 0
+    while pos < len(text):
+        char = text[pos]
+        if char == "\\":
+            pos += 2
+            continue
+        if char in "\"'":
+            end = text.find(char, pos + 1)
+            pos = len(text) if end < 0 else end + 1
+            continue
+        if char in "([":
+            depth += 1
+        elif char in ")]":
+            depth -= 1
+        elif char == separator and depth == 0:
+            parts.append(text[start:pos])
+            start = pos + 1
+        pos += 1
+    parts.append(text[start:])
+    return parts
+
+
+def _ident_end(text, pos):
+    while pos < len(text):
+        char = text[pos]
+        if char == "\\":
+            pos += 2
+        elif char.isalnum() or char in "-_" or ord(char) > 127:
+            pos += 1
+        else:
+            break
+    return min(pos, len(text))
+
+
+def _group_end(text, pos, opener, closer):
+    """Index of the closer matching the opener at pos - 1"""
+    depth = 1
+    while pos < len(text):
+        char = text[pos]
+        if char == "\\":
+            pos += 2
+            continue
+        if char in "\"'":
+            end = text.find(char, pos + 1)
+            pos = len(text) if end < 0 else end + 1
+            continue
+        if char == opener:
+            depth += 1
+        elif char == closer:
+            depth -= 1
+            if depth == 0:
+                return pos
+        pos += 1
+    raise SelectorError(f"unbalanced {opener} in {text!r}")
+
+
+def parse_nth(argument):
+    """(a, b) for an An+B argument"""
+    m = NTH_RE.match(argument)
+    if not m:
+        raise SelectorError(f"bad An+B {argument!r}")
+    odd, even, a, sign, b, number = m.groups()
+    if odd:
+        return 2, 1
+    if even:
+        return 2, 0
+    if number is not None:
+        return 0, int(number)
+    step = {"": 1, "+": 1, "-": -1}[a] if a in ("", "+", "-") else int(a)
+    offset = int(b) * (-1 if sign == "-" else 1) if b else 0
+    return step, offset
+
+
+def parse_pseudo(name, argument):
+    """(name, parsed argument) for one pseudo-class"""
+    if (name in LOGICAL_PSEUDO_CLASSES or name in NTH_PSEUDO_CLASSES or name == "has") and not argument:
+        raise SelectorError(f":{name} needs an argument")
+    if name in LOGICAL_PSEUDO_CLASSES:
+        return name, parse_selector_list(argument)
+    if name == "has":
+        return name, [(part.strip()[0] if part.strip()[:1] in "+~" else " ",
+                       parse_selector(part.strip().lstrip(">+~")))
+                      for part in split_top_level(argument)]
+    if name in NTH_PSEUDO_CLASSES:
+        m = OF_RE.search(argument)
+        nth, selectors = (argument[:m.start()], argument[m.end():]) if m else (argument, None)
+        a, b = parse_nth(nth)
+        if selectors is not None and name.endswith("-child"):
+            return name, (a, b, parse_selector_list(selectors))
+        if selectors is not None:
+            raise SelectorError(f":{name}() takes no selector list")
+        return name, (a, b, None)
+    if name in STRUCTURAL_PSEUDO_CLASSES or name in DYNAMIC_PSEUDO_CLASSES or name.startswith("-"):
+        return name, argument
+    raise SelectorError(f"unsupported pseudo-class :{name}")
+
+
+def parse_compound(text, pos):
+    """(Compound, position after it); skips pseudo-elements"""
+    compound = Compound()
+    start = pos
+    if pos < len(text) and text[pos] == "*":
+        pos += 1
+        if pos < len(text) and text[pos] == "|":
+            raise SelectorError("namespaces are not supported")
+    elif pos < len(text) and (text[pos].isalpha() or text[pos] in "_\\" or ord(text[pos]) > 127):
+        end = _ident_end(text, pos)
+        if end < len(text) and text[end] == "|":
+            raise SelectorError("namespaces are not supported")
+        compound.tag = unescape(text[pos:end]).lower()
+        pos = end
+
+    while pos < len(text):
+        char = text[pos]
+        if char == "#":
+            end = _ident_end(text, pos + 1)
+            if end == pos + 1:
+                raise SelectorError(f"empty id in {text!r}")
+            compound.ids.append(unescape(text[pos + 1:end]))
+            pos = end
+        elif char == ".":
+            end = _ident_end(text, pos + 1)
+            if end == pos + 1:
+                raise SelectorError(f"empty class in {text!r}")
+            compound.classes.append(unescape(text[pos + 1:end]))
+            pos = end
+        elif char == "[":
+            end = _group_end(text, pos + 1, "[", "]")
+            m = ATTR_RE.match(text[pos + 1:end])
+            if not m or "|" in m.group(1):
+                raise SelectorError(f"bad attribute selector in {text!r}")
+            name, op, double, single, bare, flag = m.groups()
+            value = next((v for v in (double, single, bare) if v is not None), None)
+            compound.attrs.append((name.lower(), op, unescape(value) if value is not None else None,
+                                   (flag or "").lower() == "i"))
+            pos = end + 1
+        elif char == ":":
+            element = text.startswith("::", pos)
+            pos += 2 if element else 1
+            end = _ident_end(text, pos)
+            name = unescape(text[pos:end]).lower()
+            if not name:
+                raise SelectorError(f"empty pseudo-class in {text!r}")
+            argument = None
+            if end < len(text) and text[end] == "(":
+                close = _group_end(text, end + 1, "(", ")")
+                argument = text[end + 1:close].strip()
+                end = close + 1
+            pos = end
+            if element or name in LEGACY_PSEUDO_ELEMENTS:
+                continue
+            compound.pseudos.append(parse_pseudo(name, argument))
+        else:
+            break
+    if pos == start:
+        raise SelectorError(f"expected a selector at {text[start:start + 20]!r}")
+    return compound, pos
+
+
+def parse_selector(text):
+    """Selector for one complex selector"""
+    text = text.strip()
+    if not text:
+        raise SelectorError("empty selector")
+    parts = []
+    combinator = None
+    pos = 0
+    while pos < len(text):
+        char = text[pos]
+        if char.isspace():
+            pos += 1
+            if parts and combinator is None:
+                combinator = " "
+            continue
+        if char in ">+~":
+            if not parts:
+                raise SelectorError(f"leading combinator in {text!r}")
+            combinator = char
+            pos += 1
+            continue
+        if parts and combinator is None:
+            raise SelectorError(f"unexpected {char!r} in {text!r}")
+        compound, pos = parse_compound(text, pos)
+        parts.append((combinator, compound))
+        combinator = None
+    if combinator not in (None, " ") or not parts:
+        raise SelectorError(f"dangling combinator in {text!r}")
+    return Selector(text, parts)
+
+
+def parse_selector_list(text):
+    """[Selector] for a comma-separated selector list; SelectorError if any fails"""
+    return [parse_selector(part) for part in split_top_level(text)]
+
+
+class Element:
+    """An element of a parsed page"""
+
+    __slots__ = ("tag", "attrs", "id", "classes", "parent", "children", "index", "has_text")
+
+    def __init__(self, tag, attrs, parent):
+        self.tag = tag
+        self.attrs = {}
+        for name, value in attrs:
+            self.attrs[name] = value if value is not None else ""
+        self.id = self.attrs.get("id")
+        self.classes = frozenset(self.attrs.get("class", "").split())
+        self.parent = parent
+        self.children = []
+        self.index = len(parent.children) if parent is not None else 0
+        self.has_text = False
+
+    def ancestors(self):
+        element = self.parent
+        while element is not None:
+            yield element
+            element = element.parent
+
+    def previous_siblings(self):
+        """Preceding element siblings, nearest first"""
+        if self.parent is None:
+            return
+        siblings = self.parent.children
+        for index in range(self.index - 1, -1, -1):
+            yield siblings[index]
+
+    def __repr__(self):
+        return f"Element({self.tag!r}, {self.id!r}, {sorted(self.classes)!r})"
+
+
+class Document:
+    """Element tree of a page, in document order"""
+
+    # Contents are text, not elements, for a browser running scripts
+    OPAQUE = {"noscript", "template"}
+
+    def __init__(self):
+        self.root = None
+        self.elements = []
+
+    @classmethod
+    def parse(cls, content):
+        doc = cls()
+        stack = []
+        opaque = 0
+        for token in tokenize(iter_chunks(content)):
+            if token.kind == "data":
+                if stack and not opaque and token.raw.strip():
+                    stack[-1].has_text = True
+                continue
+            if token.kind == "endtag":
+                if opaque:
+                    if token.tag in cls.OPAQUE:
+                        opaque -= 1
+                    continue
+                for index in range(len(stack) - 1, -1, -1):
+                    if stack[index].tag == token.tag:
+                        del stack[index:]
+                        break
+                continue
+            if not token.is_start:
+                continue
+            if opaque:
+                if token.tag in cls.OPAQUE and token.kind == "starttag":
+                    opaque += 1
+                continue
+            parent = stack[-1] if stack else None
+            element = Element(token.tag, token.attrs, parent)
+            if parent is not None:
+                parent.children.append(element)
+            elif doc.root is None:
+                doc.root = element
+            else:
+                continue
+            doc.elements.append(element)
+            if token.tag in cls.OPAQUE and token.kind == "starttag":
+                opaque = 1
+            elif token.kind == "starttag" and token.tag not in VOID_ELEMENTS:
+                stack.append(element)
+        return doc
+
+    def find(self, cls):
+        """Elements with class cls, in document order"""
+        return [element for element in self.elements if cls in element.classes]
+
+
+def _attr_matches(element, name, op, expected, ignore_case):
+    value = element.attrs.get(name)
+    if value is None:
+        return False
+    if op is None:
+        return True
+    if ignore_case:
+        value, expected = value.lower(), expected.lower()
+    if op == "=":
+        return value == expected
+    if op == "~=":
+        return expected in value.split()
+    if op == "|=":
+        return value == expected or value.startswith(expected + "-")
+    if not expected:
+        return False
+    if op == "^=":
+        return value.startswith(expected)
+    if op == "$=":
+        return value.endswith(expected)
+    return expected in value
+
+
+def _descendants(element):
+    pending = list(reversed(element.children))
+    while pending:
+        child = pending.pop()
+        yield child
+        pending.extend(reversed(child.children))
+
+
+def _related(element, scope):
+    """Elements a :has() argument is tested against: descendants, or (for + ~) later siblings"""
+    if scope == " ":
+        yield from _descendants(element)
+        return
+    siblings = element.parent.children[element.index + 1:] if element.parent is not None else []
+    for sibling in siblings[:1] if scope == "+" else siblings:
+        yield sibling
+        yield from _descendants(sibling)
+
+
+def _nth(position, a, b):
+    """True if position (1-based) is a*n + b for some n >= 0"""
+    if a == 0:
+        return position == b
+    n, remainder = divmod(position - b, a)
+    return remainder == 0 and n >= 0
+
+
+class Matcher:
+    """
+    Selector matching with a fixed answer for state-dependent pseudo-classes:
+    dynamic=False treats :hover and friends as never matching (what is on
+    screen before any interaction), dynamic=True as possibly matching (what
+    could ever apply).
+    """
+
+    def __init__(self, dynamic=False):
+        self.dynamic = dynamic
+
+    def matches(self, selector, element):
+        return self._match_from(selector.parts, len(selector.parts) - 1, element)
+
+    def matches_any(self, selectors, element):
+        return any(self.matches(selector, element) for selector in selectors)
+
+    def _match_from(self, parts, i, element):
+        combinator, compound = parts[i]
+        if not self.matches_compound(compound, element):
+            return False
+        if i == 0:
+            return True
+        if combinator == " ":
+            return any(self._match_from(parts, i - 1, ancestor) for ancestor in element.ancestors())
+        if combinator == ">":
+            return element.parent is not None and self._match_from(parts, i - 1, element.parent)
+        if combinator == "+":
+            previous = next(element.previous_siblings(), None)
+            return previous is not None and self._match_from(parts, i - 1, previous)
+        return any(self._match_from(parts, i - 1, sibling) for sibling in element.previous_siblings())
+
+    def matches_compound(self, compound, element):
+        if compound.tag is not None and compound.tag != element.tag:
+            return False
+        for id_ in compound.ids:
+            if element.id != id_:
+                return False
+        for cls in compound.classes:
+            if cls not in element.classes:
+                return False
+        for name, op, value, ignore_case in compound.attrs:
+            if not _attr_matches(element, name, op, value, ignore_case):
+                return False
+        for name, argument in compound.pseudos:
+            if not self._pseudo(name, argument, element):
+                return False
+        return True
+
+    def _pseudo(self, name, argument, element):
+        if name == "not":
+            return not self.matches_any(argument, element)
+        if name in LOGICAL_PSEUDO_CLASSES:
+            return self.matches_any(argument, element)
+        if name == "has":
+            return any(self.matches(selector, other)
+                       for scope, selector in argument for other in _related(element, scope))
+        if name in NTH_PSEUDO_CLASSES or name in STRUCTURAL_PSEUDO_CLASSES:
+            return self._structural(name, argument, element)
+        return self.dynamic
+
+    def _structural(self, name, argument, element):
+        parent = element.parent
+        if name == "root":
+            return parent is None
+        if name == "empty":
+            return not element.children and not element.has_text
+        siblings = parent.children if parent is not None else [element]
+        index = siblings.index(element) if parent is None else element.index
+        of = argument[2] if argument else None
+        if name.endswith("of-type") or of:
+            if of and not self.matches_any(of, element):
+                return False
+            siblings = [sibling for sibling in siblings
+                        if (sibling.tag == element.tag if not of else self.matches_any(of, sibling))]
+            index = siblings.index(element)
+        position, from_end = index + 1, len(siblings) - index
+        if name in ("first-child", "first-of-type"):
+            return position == 1
+        if name in ("last-child", "last-of-type"):
+            return from_end == 1
+        if name in ("only-child", "only-of-type"):
+            return len(siblings) == 1
+        a, b, _ = argument
+        return _nth(from_end if "last" in name else position, a, b)
@@ -0,0 +1,286 @@
+"""
+engine.py
+
+Single-pass rewrite engine.
+
+Each page is read once, every selected transform runs over the in-memory
+string in order, and the page is written back once - only if the result
+differs from what was read. Time spent in each transform is accumulated
+across the run so slow fixes are easy to spot.
+
+Transforms can also record findings on a page with page.note(); they are
+collected per page into the run report (and, with --report, a JSON file).
+
+Runs are incremental: the build manifest (see state.py) lets pages that
+are untouched since the last run be skipped after a single stat, and only
+transforms whose version changed are re-applied to unchanged pages -
+together with every transform after the first one that changes it. A
+page a run rewrites keeps in the manifest only the transforms that ran on
+it, so after run --only the others are applied on the next run.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from . import state
+from . import transforms as transforms_module
+from .paths import SKIP_DIRS
+
+# Modules below register additional transforms on import
+from . import bundle  # noqa: F401
+from . import critical  # noqa: F401
+from . import fingerprint  # noqa: F401
+from . import hoist  # noqa: F401
+from . import htmlmin  # noqa: F401
+from . import imgattrs  # noqa: F401
+from . import styleclasses  # noqa: F401
+from . import thirdparty  # noqa: F401
+from . import webp  # noqa: F401
+
+
+def iter_pages(root):
+    """Yield the path of every HTML page under root, in a stable order"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS)
+        for filename in sorted(filenames):
+            if filename.lower().endswith(".html"):
+                yield os.path.join(dirpath, filename)
+
+
+class Page:
+    """An HTML page and its position relative to the site root"""
+
+    def __init__(self, root, path):
+        self.root = root
+        self.path = path
+        self.rel_path = os.path.relpath(path, root).replace(os.sep, "/")
+        # "" for root pages, "../" per directory level otherwise
+        self.prefix = "../" * self.rel_path.count("/")
+        # Name of the transform currently running, for note() and remember()
+        self.transform = None
+        self.notes = []
+        self.updates = []
+
+    def note(self, message):
+        """Record a finding about this page against the running transform"""
+        self.notes.append((self.transform, message))
+
+    def remember(self, key, value):
+        """Record state for the running transform's save hook (see transforms.Transform)"""
+        self.updates.append((self.transform, key, value))
+
+    def __repr__(self):
+        return f"Page({self.rel_path!r})"
+
+
+def read_page(path):
+    """Read a page without newline translation so bytes round-trip"""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return f.read()
+
+
+def write_page(path, content):
+    """Write a page without newline translation"""
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write(content)
+
+
+class PageResult:
+    """Outcome of processing one page; picklable so workers can return it"""
+
+    def __init__(self, rel_path):
+        self.rel_path = rel_path
+        self.skipped = False
+        self.written = False
+        self.entry = None
+        self.error = None
+        self.seconds = {}
+        self.changed = []
+        self.io_seconds = 0.0
+        self.notes = []
+        self.updates = []
+
+
+class RunReport:
+    """Counts and per-transform timings for one engine run"""
+
+    def __init__(self, transforms):
+        self.names = [t.name for t in transforms]
+        self.seconds = {name: 0.0 for name in self.names}
+        self.pages_changed = {name: 0 for name in self.names}
+        self.pages_scanned = 0
+        self.pages_skipped = 0
+        self.written = []
+        self.errors = []
+        self.notes = []         # (rel_path, transform, message)
+        self.io_seconds = 0.0
+        self.total_seconds = 0.0
+        self.jobs = 1
+
+    def add(self, result):
+        """Fold one PageResult into the totals"""
+        self.pages_scanned += 1
+        self.io_seconds += result.io_seconds
+        for name, seconds in result.seconds.items():
+            self.seconds[name] += seconds
+        for name in result.changed:
+            self.pages_changed[name] += 1
+        if result.skipped:
+            self.pages_skipped += 1
+        if result.written:
+            self.written.append(result.rel_path)
+        if result.error:
+            self.errors.append((result.rel_path, result.error))
+        for name, message in result.notes:
+            self.notes.append((result.rel_path, name, message))
+
+    def print_summary(self, verbose=False):
+        """Print the per-transform timing table and totals"""
+        print("=" * 60)
+        print(f"{'transform':<28}{'pages changed':>14}{'time (ms)':>14}")
+        print("-" * 60)
+        for name in self.names:
+            print(f"{name:<28}{self.pages_changed[name]:>14}{self.seconds[name] * 1000:>14.1f}")
+        print("-" * 60)
+        print(f"Pages scanned: {self.pages_scanned}")
+        print(f"Pages skipped (unchanged): {self.pages_skipped}")
+        print(f"Pages written: {len(self.written)}")
+        print(f"Read/write time: {self.io_seconds * 1000:.1f} ms")
+        print(f"Total time: {self.total_seconds * 1000:.1f} ms ({self.jobs} job{'s' if self.jobs != 1 else ''})")
+        if self.notes:
+            print(f"Notes: {len(self.notes)} on {len({note[0] for note in self.notes})} pages")
+            if verbose:
+                for rel_path, name, message in self.notes:
+                    print(f"  {rel_path} [{name}]: {message}")
+        if self.errors:
+            print(f"Errors: {len(self.errors)}")
+            for rel_path, message in self.errors:
+                print(f"  {rel_path}: {message}")
+        print("=" * 60)
+
+    def notes_by_page(self):
+        """{rel_path: [{"transform": name, "message": message}, ...]}"""
+        pages = {}
+        for rel_path, name, message in self.notes:
+            pages.setdefault(rel_path, []).append({"transform": name, "message": message})
+        return pages
+
+
+def process_page(root, path, transforms, versions, entry, dry_run, incremental):
+    """Read, transform and (if changed) write one page; returns a PageResult"""
+    page = Page(root, path)
+    result = PageResult(page.rel_path)
+    try:
+        st = os.stat(path)
+        if incremental and state.is_fresh(entry, st, versions):
+            result.skipped = True
+            return result
+
+        start = time.perf_counter()
+        original = read_page(path)
+        result.io_seconds += time.perf_counter() - start
+
+        if incremental:
+            pending, unchanged = state.pending(entry, original, versions)
+        else:
+            pending, unchanged = list(versions), False
+
+        content = original
+        ran = []
+        for t in transforms:
+            # A transform after one that changed the page sees new input
+            if t.name not in pending and not result.changed:
+                continue
+            page.transform = t.name
+            ran.append(t.name)
+            start = time.perf_counter()
+            new_content = t(content, page)
+            result.seconds[t.name] = time.perf_counter() - start
+            if new_content != content:
+                result.changed.append(t.name)
+                content = new_content
+
+        result.notes = page.notes
+        result.updates = page.updates
+        if content != original:
+            if not dry_run:
+                start = time.perf_counter()
+                write_page(path, content)
+                result.io_seconds += time.perf_counter() - start
+                st = os.stat(path)
+            result.written = True
+        if not dry_run:
+            if content == original:
+                result.entry = state.make_entry(entry, st, content, versions, carry_over=unchanged)
+            else:
+                # Transforms skipped before the first change, and any outside
+                # this run, never saw the new content
+                result.entry = state.make_entry(entry, st, content, {name: versions[name] for name in ran},
+                                                carry_over=False)
+    except (OSError, UnicodeDecodeError) as e:
+        result.error = str(e)
+    return result
+
+
+def process_chunk(root, chunk, transforms, versions, dry_run, incremental):
+    """Worker entry point: process a list of (path, entry) work units in order"""
+    return [
+        process_page(root, path, transforms, versions, entry, dry_run, incremental)
+        for path, entry in chunk
+    ]
+
+
+def chunked(items, jobs):
+    """Split items into contiguous chunks, about four per worker"""
+    size = max(1, -(-len(items) // (jobs * 4)))
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def run(root, names=None, dry_run=False, verbose=False, incremental=True, jobs=1):
+    """
+    Apply the named transforms (default pipeline if None) to every page.
+    With incremental=False every page is read and every transform re-run.
+    With jobs > 1 pages are processed in chunks on a process pool; results
+    are merged in page order so the report is identical for any job count.
+    """
+    transforms = transforms_module.get_transforms(names or transforms_module.DEFAULT_PIPELINE)
+    report = RunReport(transforms)
+    report.jobs = jobs
+    run_start = time.perf_counter()
+
+    # Computed once here so workers never race to build shared state
+    versions = {t.name: t.version_for(root) for t in transforms}
+    manifest = state.BuildManifest(root)
+    work = [(path, manifest.get(Page(root, path).rel_path)) for path in iter_pages(root)]
+
+    if jobs > 1 and len(work) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [
+                executor.submit(process_chunk, root, chunk, transforms, versions, dry_run, incremental)
+                for chunk in chunked(work, jobs)
+            ]
+            results = [result for future in futures for result in future.result()]
+    else:
+        results = process_chunk(root, work, transforms, versions, dry_run, incremental)
+
+    for result in results:
+        report.add(result)
+        if result.entry:
+            manifest.set(result.rel_path, result.entry)
+        if verbose and result.written:
+            print(f"{'Would update' if dry_run else 'Updated'}: {result.rel_path}")
+
+    if not dry_run:
+        # State transforms kept is saved here, once, never from a worker
+        updates = {}
+        for result in results:
+            for name, key, value in result.updates:
+                updates.setdefault(name, {})[key] = value
+        for t in transforms:
+            if t.save:
+                t.save(root, updates.get(t.name, {}))
+        manifest.prune([result.rel_path for result in results])
+        manifest.save()
+    report.total_seconds = time.perf_counter() - run_start
+    return report
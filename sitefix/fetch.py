@@ -0,0 +1,289 @@
+"""
+fetch.py
+
+Concurrent, conditional downloader for recovering assets.
+
+- Bounded concurrency over one pooled keep-alive session
+- Revalidation of files already on disk with If-None-Match /
+  If-Modified-Since, using validators remembered in .sitefix/fetch-meta.json
+- Retries with exponential backoff on connection errors, 429 and 5xx
+  (honouring Retry-After, up to max_retry_after seconds)
+- Git LFS pointer stubs on disk are never revalidated: the stub's mtime
+  says nothing about the real file, so it is always downloaded again
+- Atomic writes: bodies stream to a temp file next to the target, which is
+  renamed into place only once complete
+- Optional httpcache.HTTPCache: fresh cached bodies are copied into place
+  without a request, stale ones are revalidated against the origin
+- Optional RateLimiter shared by all workers, for hosts that throttle
+"""
+
+import email.utils
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import state
+
+META_PATH = os.path.join(state.STATE_DIR, "fetch-meta.json")
+META_VERSION = 1
+
+USER_AGENT = "Mozilla/5.0 (compatible; sitefix asset recovery)"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Longest Retry-After honoured; a server asking for more is retried after this
+MAX_RETRY_AFTER = 60
+
+LFS_POINTER = b"version https://git-lfs.github.com/spec/"
+
+
+class RateLimiter:
+    """Thread-safe token bucket: at most rate requests per second, bursts of burst"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Block until a request may be made"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+
+class FetchResult:
+    """Outcome of one download"""
+
+    def __init__(self, url, dest):
+        self.url = url
+        self.dest = dest
+        self.status = "failed"      # downloaded, cached, not-modified, failed
+        self.http_status = None
+        self.bytes = 0
+        self.attempts = 0
+        self.error = None
+
+    def __repr__(self):
+        return f"FetchResult({self.url!r}, {self.status!r})"
+
+
+def load_meta(root):
+    """{rel_path: {url, etag, last_modified}} for previously downloaded files"""
+    return state.load_json(os.path.join(root, META_PATH), META_VERSION).get("files", {})
+
+
+def http_date(timestamp):
+    return email.utils.formatdate(timestamp, usegmt=True)
+
+
+def parse_http_date(value):
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after_seconds(value):
+    """Seconds a Retry-After header (delay or HTTP date) asks for, or None"""
+    value = (value or "").strip()
+    if value.isdigit():
+        return int(value)
+    when = parse_http_date(value)
+    return max(0.0, when - time.time()) if when is not None else None
+
+
+def is_lfs_stub(path):
+    """True if path is a Git LFS pointer file rather than the real content"""
+    try:
+        if os.path.getsize(path) > 1024:
+            return False
+        with open(path, "rb") as f:
+            return f.read(len(LFS_POINTER)) == LFS_POINTER
+    except OSError:
+        return False
+
+
+class Downloader:
+    """Download many URLs concurrently over a shared connection pool"""
+
+    def __init__(self, root, concurrency=8, retries=3, backoff=0.5, timeout=10, cache=None,
+                 limiter=None, max_retry_after=MAX_RETRY_AFTER):
+        self.root = root
+        self.cache = cache
+        self.limiter = limiter
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.max_retry_after = max_retry_after
+
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.meta_path = os.path.join(root, META_PATH)
+        self.meta = load_meta(root)
+        self._lock = threading.Lock()
+
+    def _key(self, dest):
+        return os.path.relpath(dest, self.root).replace(os.sep, "/")
+
+    def conditional_headers(self, dest):
+        """Validators for a file already on disk (none for an LFS stub)"""
+        if not os.path.exists(dest) or is_lfs_stub(dest):
+            return {}
+        headers = {}
+        with self._lock:
+            meta = self.meta.get(self._key(dest), {})
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        headers["If-Modified-Since"] = meta.get("last_modified") or http_date(os.path.getmtime(dest))
+        return headers
+
+    def _get(self, url, headers, result):
+        """GET with retries; returns the response or None"""
+        for attempt in range(self.retries + 1):
+            result.attempts = attempt + 1
+            delay = self.backoff * (2 ** attempt)
+            if self.limiter:
+                self.limiter.wait()
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout, stream=True)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                result.error = str(e)
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    return response
+                result.error = f"HTTP {response.status_code}"
+                retry_after = retry_after_seconds(response.headers.get("Retry-After"))
+                if retry_after is not None:
+                    delay = max(delay, min(retry_after, self.max_retry_after))
+                response.close()
+            if attempt < self.retries:
+                time.sleep(delay)
+        return None
+
+    def _write(self, response, dest):
+        """Stream a response body to dest atomically; returns (bytes, sha256)"""
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp_path = f"{dest}.part-{os.getpid()}-{threading.get_ident()}"
+        written = 0
+        digest = hashlib.sha256()
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=1 << 16):
+                    f.write(chunk)
+                    digest.update(chunk)
+                    written += len(chunk)
+            os.replace(tmp_path, dest)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return written, digest.hexdigest()
+
+    def _from_cache(self, entry, dest, result):
+        """Serve a cached body; dest is only rewritten if it differs"""
+        with self._lock:
+            meta = self.meta.get(self._key(dest), {})
+        if os.path.exists(dest) and meta.get("hash") == entry["body"]:
+            result.status = "not-modified"
+        else:
+            self.cache.copy_to(entry, dest)
+            self._remember(url=result.url, dest=dest, headers=entry["headers"], digest=entry["body"])
+            result.status = "cached"
+            result.bytes = entry["size"]
+        result.error = None
+        return result
+
+    def _remember(self, url, dest, headers, digest):
+        with self._lock:
+            self.meta[self._key(dest)] = {
+                "url": url,
+                "etag": headers.get("ETag"),
+                "last_modified": headers.get("Last-Modified"),
+                "hash": digest,
+            }
+
+    def fetch(self, url, dest, revalidate=True):
+        """Download url to dest, or revalidate dest if it already exists"""
+        result = FetchResult(url, dest)
+        entry = self.cache.lookup("GET", url) if self.cache else None
+        if entry and entry["status"] != 200:
+            entry = None
+        if entry and self.cache.is_fresh(entry):
+            self.cache.touch(entry)
+            return self._from_cache(entry, dest, result)
+
+        headers = {}
+        if revalidate:
+            # Revalidate what is on disk, or else what is in the cache
+            headers = self.conditional_headers(dest) or (self.cache.validators(entry) if entry else {})
+        response = self._get(url, headers, result)
+        if response is None:
+            return result
+
+        with response:
+            result.http_status = response.status_code
+            if response.status_code == 304:
+                if entry:
+                    self.cache.touch(entry, refreshed=True)
+                    if not os.path.exists(dest):
+                        return self._from_cache(entry, dest, result)
+                result.status = "not-modified"
+                result.error = None
+                return result
+            if response.status_code != 200:
+                result.error = f"HTTP {response.status_code}"
+                return result
+            try:
+                result.bytes, digest = self._write(response, dest)
+            except (OSError, requests.RequestException) as e:
+                result.error = str(e)
+                return result
+
+            if self.cache:
+                self.cache.store_file("GET", url, 200, response.headers, dest, digest)
+            mtime = parse_http_date(response.headers.get("Last-Modified"))
+            if mtime is not None:
+                os.utime(dest, (mtime, mtime))
+            self._remember(url, dest, response.headers, digest)
+        result.status = "downloaded"
+        result.error = None
+        return result
+
+    def fetch_all(self, jobs, revalidate=True):
+        """Fetch [(url, dest), ...] concurrently; results are in input order"""
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            return list(executor.map(lambda job: self.fetch(job[0], job[1], revalidate), jobs))
+
+    def save(self):
+        """Persist remembered validators (and the cache index)"""
+        with self._lock:
+            state.save_json(self.meta_path, {"version": META_VERSION, "files": self.meta})
+        if self.cache:
+            self.cache.save()
+
+    def close(self):
+        self.save()
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
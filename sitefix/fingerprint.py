@@ -0,0 +1,152 @@
+"""
+fingerprint.py
+
+Content-hash fingerprinting for local CSS, JS and image assets.
+
+Every asset is hashed once and recorded in .sitefix/asset-manifest.json
+together with its size and mtime, so later runs only re-hash files that
+were actually touched. The ``fingerprint-assets`` transform then rewrites
+each local reference to ``file.ext?v=<hash>``. A page is only rewritten
+when one of the assets it references changed - editing
+css/custom-fixes.css no longer means hand-bumping ``?v=finalNN`` across
+every page.
+"""
+
+import hashlib
+import os
+import re
+
+from . import paths
+from . import state
+from .paths import SKIP_DIRS
+from .transforms import transform
+
+MANIFEST_PATH = os.path.join(state.STATE_DIR, "asset-manifest.json")
+MANIFEST_VERSION = 1
+HASH_LENGTH = 10
+
+ASSET_EXTENSIONS = {
+    ".css", ".js",
+    ".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp", ".ico",
+}
+
+URL_ATTR_RE = re.compile(r'(\s(?:src|href)=)(["\'])([^"\']*)\2', re.IGNORECASE)
+SRCSET_ATTR_RE = re.compile(r'(\s(?:image)?srcset=)(["\'])([^"\']*)\2', re.IGNORECASE)
+
+# root -> {rel_path: hash}, built once per process
+_hashes_by_root = {}
+# root -> manifest entries get_hashes() built but has not saved
+_unsaved_by_root = {}
+
+
+def hash_file(path):
+    """Short sha256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def iter_assets(root):
+    """Yield (abs_path, rel_path) for every fingerprintable asset under root"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS)
+        for filename in sorted(filenames):
+            if os.path.splitext(filename)[1].lower() in ASSET_EXTENSIONS:
+                path = os.path.join(dirpath, filename)
+                yield path, os.path.relpath(path, root).replace(os.sep, "/")
+
+
+def load_manifest(root):
+    """Return the saved manifest entries, or {} if missing or outdated"""
+    return state.load_json(os.path.join(root, MANIFEST_PATH), MANIFEST_VERSION).get("assets", {})
+
+
+def save_manifest(root, assets):
+    """Atomically write the manifest"""
+    state.save_json(os.path.join(root, MANIFEST_PATH), {"version": MANIFEST_VERSION, "assets": assets})
+
+
+def build_manifest(root):
+    """
+    Hash every asset under root, reusing saved hashes for files whose size
+    and mtime are unchanged. Returns (assets, changed, hashed) where changed
+    lists assets that are new or whose hash differs from the saved manifest.
+    """
+    previous = load_manifest(root)
+    assets = {}
+    changed = []
+    hashed = 0
+    for path, rel_path in iter_assets(root):
+        st = os.stat(path)
+        old = previous.get(rel_path)
+        if old and old["size"] == st.st_size and old["mtime_ns"] == st.st_mtime_ns:
+            assets[rel_path] = old
+            continue
+        digest = hash_file(path)
+        hashed += 1
+        assets[rel_path] = {"hash": digest, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        if not old or old["hash"] != digest:
+            changed.append(rel_path)
+    return assets, changed, hashed
+
+
+def get_hashes(root):
+    """{rel_path: hash} for root, building the manifest on first use (see save_hashes())"""
+    root = os.path.abspath(root)
+    if root not in _hashes_by_root:
+        assets, changed, hashed = build_manifest(root)
+        if hashed or len(assets) != len(load_manifest(root)):
+            _unsaved_by_root[root] = assets
+        _hashes_by_root[root] = {rel: entry["hash"] for rel, entry in assets.items()}
+    return _hashes_by_root[root]
+
+
+def save_hashes(root, updates=None):
+    """Save the manifest get_hashes() built, if it re-hashed anything; fingerprint-assets' save hook"""
+    assets = _unsaved_by_root.pop(os.path.abspath(root), None)
+    if assets is not None:
+        save_manifest(root, assets)
+
+
+def fingerprint_url(url, page, hashes):
+    """Return url with ?v=<hash> if it resolves to a known asset, else url"""
+    rel_path = paths.resolve(page.rel_path, url)
+    digest = hashes.get(rel_path) if rel_path else None
+    if not digest:
+        return url
+    path, _, fragment = paths.split_url(url)
+    return f"{path}?v={digest}{fragment}"
+
+
+def hashes_version(root):
+    """
+    Transform version for fingerprint-assets: changes whenever any asset
+    hash changes, so the build manifest re-checks pages after an asset edit.
+    """
+    hashes = get_hashes(root)
+    digest = hashlib.sha256()
+    for rel_path in sorted(hashes):
+        digest.update(f"{rel_path}={hashes[rel_path]}\n".encode("utf-8"))
+    return f"2-{digest.hexdigest()[:HASH_LENGTH]}"
+
+
+@transform("fingerprint-assets", version=hashes_version, save=save_hashes)
+def fingerprint_assets(content, page):
+    """Version local CSS/JS/image references with ?v=<content hash>"""
+    hashes = get_hashes(page.root)
+
+    def replace_url(m):
+        url = fingerprint_url(m.group(3), page, hashes)
+        return f"{m.group(1)}{m.group(2)}{url}{m.group(2)}"
+
+    def replace_srcset(m):
+        candidates = paths.parse_srcset(m.group(3))
+        updated = [(fingerprint_url(url, page, hashes), descriptor) for url, descriptor in candidates]
+        if updated == candidates:
+            return m.group(0)
+        return f"{m.group(1)}{m.group(2)}{paths.format_srcset(updated)}{m.group(2)}"
+
+    content = URL_ATTR_RE.sub(replace_url, content)
+    return SRCSET_ATTR_RE.sub(replace_srcset, content)
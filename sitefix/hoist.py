@@ -0,0 +1,282 @@
+"""
+hoist.py
+
+Move inline <style> and <script> blocks that many pages repeat into
+shared, cacheable files.
+
+Building (python3 -m sitefix hoist): every inline block of every page is
+hashed. A block found on more than SHARED_PAGES pages, and at least
+MIN_BYTES long, is written to assets/hoisted/<hash>.css|js - Divi's
+100 KB divi-dynamic-critical-inline-css, the WordPress global-styles
+block, the mejsL10n/DIVI/mecdata settings scripts. Blocks unique to a
+page, or too small to be worth a request, stay inline. Relative url()s in
+a style block are rebased to the new file first, so the same block on
+pages at different depths still hashes the same; a block with url()s
+that cannot be rebased (``url(#filter)``, paths leaving the site), an
+@import, or a script that looks itself up (document.currentScript) is
+never moved. The hoisted files are recorded in
+.sitefix/hoist-manifest.json.
+
+Rewriting (the hoist-inline transform): each block whose hash is in the
+manifest becomes a <link rel="stylesheet"> or <script src> in its place,
+keeping its id, media and other attributes, so the cascade and the
+execution order stay the same. A file stays in the manifest as long as a
+page or a bundle still refers to it, even if the block has become rare.
+"""
+
+import hashlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import quote
+
+from . import bundle
+from . import engine
+from . import paths
+from . import state
+from . import stylesheet
+from .htmlstream import iter_chunks, tokenize
+from .transforms import transform
+
+MANIFEST_PATH = os.path.join(state.STATE_DIR, "hoist-manifest.json")
+MANIFEST_VERSION = 1
+
+HOIST_DIR = "assets/hoisted"
+
+# Hoisted when found on more than this many pages...
+SHARED_PAGES = 2
+# ... and at least this long: a smaller block costs more as a request
+MIN_BYTES = 1024
+
+CSS_TYPES = {"", "text/css"}
+
+# root -> {hoisted rel_path: entry}, loaded once per process
+_manifest_by_root = {}
+
+
+def load_manifest(root):
+    return state.load_json(os.path.join(root, MANIFEST_PATH), MANIFEST_VERSION).get("files", {})
+
+
+def save_manifest(root, files):
+    state.save_json(os.path.join(root, MANIFEST_PATH), {"version": MANIFEST_VERSION, "files": files})
+
+
+def get_manifest(root):
+    root = os.path.abspath(root)
+    if root not in _manifest_by_root:
+        _manifest_by_root[root] = load_manifest(root)
+    return _manifest_by_root[root]
+
+
+def hoist_version(root):
+    """Transform version: changes whenever a file is hoisted or dropped"""
+    digest = hashlib.sha256("\n".join(sorted(get_manifest(root))).encode("utf-8"))
+    return f"1-{digest.hexdigest()[:10]}"
+
+
+def inline_blocks(content):
+    """Yield (kind, start, end, token, body) for each inline <style>/<script> outside <noscript>/<template>"""
+    pos = 0
+    skip_until = None
+    pending = None          # (kind, start, token, [body]) while inside the block
+    for token in tokenize(iter_chunks(content)):
+        start = pos
+        pos += len(token.raw)
+        if pending is not None:
+            if token.kind == "endtag" and token.tag == pending[2].tag:
+                kind, block_start, block_token, body = pending
+                pending = None
+                yield kind, block_start, pos, block_token, "".join(body)
+            else:
+                pending[3].append(token.raw)
+            continue
+        if skip_until is not None:
+            if token.kind == "endtag" and token.tag == skip_until:
+                skip_until = None
+            continue
+        if token.kind != "starttag":
+            continue
+        if token.tag in ("noscript", "template"):
+            skip_until = token.tag
+        elif token.tag == "style":
+            pending = ("css", start, token, [])
+        elif token.tag == "script" and not token.has("src"):
+            pending = ("js", start, token, [])
+
+
+def hoisted_text(kind, token, body, rel_path):
+    """Contents of the shared file for an inline block of the page at rel_path, or None if it must stay"""
+    if not body.strip():
+        return None
+    if kind == "js":
+        if (token.get("type") or "").lower() not in bundle.JS_TYPES or bundle.SELF_LOCATING_RE.search(body):
+            return None
+        return body
+    if token.has("data-critical-css") or (token.get("type") or "").lower() not in CSS_TYPES:
+        return None
+    if "@import" in body.lower():
+        return None
+    for m in stylesheet.URL_RE.finditer(body):
+        url = m.group(2).strip()
+        if url and not url.startswith("/") and (url.startswith("#") or not paths.is_external(url)) \
+                and paths.resolve(rel_path, url) is None:
+            return None
+    # Relative to the page, as prefix + site path: from HOIST_DIR that is ../../
+    return stylesheet.rebase_urls(body, rel_path, "../" * (HOIST_DIR.count("/") + 1))
+
+
+def hoisted_name(kind, text):
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+    return f"{HOIST_DIR}/{digest}.{kind}"
+
+
+def hoisted_tag(kind, token, name, prefix):
+    """The tag loading name with the inline block's other attributes"""
+    url = prefix + quote(name)
+    if kind == "css":
+        attrs = [("rel", "stylesheet"), ("href", url)]
+        attrs += [(key, value) for key, value in token.attrs if key not in ("rel", "href", "type")]
+    else:
+        attrs = [("src", url)] + [(key, value) for key, value in token.attrs if key != "src"]
+    text = "".join(f" {key}" if value is None else f' {key}="{bundle.escape(value)}"' for key, value in attrs)
+    return f"<link{text}>" if kind == "css" else f"<script{text}></script>"
+
+
+@transform("hoist-inline", version=hoist_version)
+def hoist_inline(content, page):
+    """Load inline blocks that many pages repeat from shared files"""
+    manifest = get_manifest(page.root)
+    if not manifest:
+        return content
+    replacements = []
+    for kind, start, end, token, body in inline_blocks(content):
+        text = hoisted_text(kind, token, body, page.rel_path)
+        if text is None:
+            continue
+        name = hoisted_name(kind, text)
+        if name in manifest:
+            replacements.append((start, end, hoisted_tag(kind, token, name, page.prefix)))
+    if replacements:
+        page.note(f"{len(replacements)} inline block(s) loaded from {HOIST_DIR}")
+    return bundle.replace_spans(content, replacements)
+
+
+def size(text):
+    return len(text.encode("utf-8"))
+
+
+def scan_page(root, path):
+    """
+    (rel_path, page bytes, [(hoisted rel_path, bytes saved)], {hoisted rel_path: text},
+    hoisted files the page already loads)
+    """
+    page = engine.Page(root, path)
+    content = engine.read_page(path)
+    blocks, texts = [], {}
+    for kind, start, end, token, body in inline_blocks(content):
+        text = hoisted_text(kind, token, body, page.rel_path)
+        if text is None:
+            continue
+        name = hoisted_name(kind, text)
+        blocks.append((name, size(content[start:end]) - size(hoisted_tag(kind, token, name, page.prefix))))
+        texts[name] = text
+    loaded = set()
+    for token in tokenize(iter_chunks(content)):
+        url = token.get("href") if token.tag == "link" else token.get("src") if token.tag == "script" else None
+        if token.is_start and url:
+            rel_path = paths.resolve(page.rel_path, url)
+            if rel_path and rel_path.startswith(HOIST_DIR + "/"):
+                loaded.add(rel_path)
+    return page.rel_path, size(content), blocks, texts, loaded
+
+
+class HoistReport:
+    def __init__(self):
+        self.pages = {}         # rel_path -> (bytes before, bytes after)
+        self.files = []         # (hoisted rel_path, pages, bytes)
+        self.removed = []
+        self.seconds = 0.0
+
+    def print_summary(self, verbose=False):
+        before = sum(old for old, _ in self.pages.values())
+        after = sum(new for _, new in self.pages.values())
+        print("=" * 60)
+        print(f"Pages scanned: {len(self.pages)}")
+        print(f"Shared blocks: {len(self.files)} ({sum(row[2] for row in self.files) / 1024:.1f} KB, "
+              f"each downloaded once)")
+        for name, pages, length in sorted(self.files, key=lambda row: -row[1] * row[2]):
+            print(f"  ✓ {name}: {length / 1024:.1f} KB on {pages} page(s)")
+        for name in self.removed:
+            print(f"  - {name} removed")
+        changed = sorted(((rel_path, old, new) for rel_path, (old, new) in self.pages.items() if old != new),
+                         key=lambda row: row[2] - row[1])
+        for rel_path, old, new in changed if verbose else changed[:10]:
+            print(f"    {rel_path}: {old / 1024:.1f} KB -> {new / 1024:.1f} KB")
+        if len(changed) > 10 and not verbose:
+            print(f"    ... {len(changed) - 10} more pages (--verbose lists them all)")
+        if before:
+            print(f"Page HTML: {before / 1e6:.2f} MB -> {after / 1e6:.2f} MB "
+                  f"({(before - after) / 1e6:.2f} MB, {(1 - after / before) * 100:.0f}% less per full crawl)")
+        print(f"Time: {self.seconds:.1f} s")
+        print("=" * 60)
+
+    def as_json(self):
+        return {"files": {name: {"pages": pages, "bytes": length} for name, pages, length in self.files},
+                "pages": {rel_path: {"before": old, "after": new} for rel_path, (old, new) in self.pages.items()}}
+
+
+def build(root, jobs=1, shared_pages=SHARED_PAGES, min_bytes=MIN_BYTES, dry_run=False):
+    """Find the inline blocks worth sharing, write them and the manifest"""
+    report = HoistReport()
+    start = time.perf_counter()
+    previous = load_manifest(root)
+    pages = list(engine.iter_pages(root))
+    if jobs > 1 and len(pages) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(scan_page, [root] * len(pages), pages, chunksize=8))
+    else:
+        results = [scan_page(root, path) for path in pages]
+
+    texts = {}
+    users = {}              # hoisted rel_path -> pages with the block or a reference to its file
+    for rel_path, _, blocks, page_texts, loaded in results:
+        texts.update(page_texts)
+        for name, _ in blocks:
+            users.setdefault(name, set()).add(rel_path)
+        for name in loaded:
+            users.setdefault(name, set()).add(rel_path)
+    # Files still loaded, by a page or from inside a bundle, are kept
+    referenced = set().union(*(loaded for *_, loaded in results))
+    for entry in bundle.load_manifest(root).get("bundles", {}).values():
+        referenced.update(member for member in entry["members"] if member.startswith(HOIST_DIR + "/"))
+
+    files = {}
+    for name, names_pages in users.items():
+        text = texts.get(name)
+        if name in referenced and name in previous:
+            files[name] = dict(previous[name], pages=len(names_pages))
+        elif text is not None and len(names_pages) > shared_pages and size(text) >= min_bytes:
+            files[name] = {"pages": len(names_pages), "bytes": size(text)}
+        else:
+            continue
+        report.files.append((name, len(names_pages), files[name]["bytes"]))
+        path = os.path.join(root, name)
+        if text is not None and not dry_run and not os.path.exists(path):
+            bundle.write_atomic(path, text)
+
+    for rel_path, page_size, blocks, _, _ in results:
+        saved = sum(saving for name, saving in blocks if name in files)
+        report.pages[rel_path] = (page_size, page_size - saved)
+
+    for name in sorted(set(previous) - set(files)):
+        path = os.path.join(root, name)
+        if os.path.exists(path):
+            report.removed.append(name)
+            if not dry_run:
+                os.remove(path)
+    if not dry_run:
+        save_manifest(root, files)
+        _manifest_by_root.pop(os.path.abspath(root), None)
+    report.seconds = time.perf_counter() - start
+    return report
@@ -0,0 +1,297 @@
+"""
+htmlmin.py
+
+Conservative HTML minification on top of htmlstream's tokenizer.
+
+minify_html() re-joins a page's tokens with less in between:
+
+- runs of whitespace in text collapse to one space, or to one newline if
+  they contained one (so text styled white-space: pre-line renders the
+  same); never inside <pre>, <textarea>, <script>, <style> or the other
+  raw-text elements;
+- comments are dropped, except conditional comments (<!--[if IE]>) and
+  the markers other transforms look for (MARKER_COMMENTS);
+- start tags are re-serialized with single spaces: attributes that only
+  restate the default (``<script type="text/javascript">``,
+  ``<form method="get">``) are dropped, ``async="async"`` becomes
+  ``async``, and values that need no quotes lose them. URL attributes and
+  the attributes of <link>, <meta>, <script>, <style> and <iframe> keep
+  their quotes, since fingerprint-assets, lcp-priority and critical-css
+  find those with regular expressions. <svg> and <math> are copied
+  verbatim: their tag and attribute names are case-sensitive.
+
+Before the result is used, both versions are tokenized again and compared
+(equivalent()): same elements, same attributes with the same values, same
+text up to whitespace, same kept comments. A page that does not compare
+equal is left as it is.
+
+The minify-html transform applies this to every page as the last step of
+the pipeline; python3 -m sitefix minify-html reports the savings, raw and
+gzipped, without writing.
+"""
+
+import gzip
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from . import engine
+from .htmlstream import iter_chunks, tokenize
+from .transforms import transform
+
+# Text kept byte for byte, up to the matching end tag
+RAW_ELEMENTS = {"pre", "textarea", "script", "style", "listing", "xmp", "plaintext"}
+FOREIGN_ELEMENTS = {"svg", "math"}
+
+# Comments other transforms search for (transforms.DONATE_BLOCK_RE, thirdparty.GTM_BLOCK_RE)
+MARKER_COMMENTS = {
+    "Custom Donate Button Injection",
+    "Google Tag Manager", "End Google Tag Manager",
+    "Google Tag Manager (deferred)", "End Google Tag Manager (deferred)",
+}
+
+# (tag, attribute) -> values (lower-case) that mean the same as leaving it out
+DEFAULT_ATTRIBUTES = {
+    ("script", "type"): {"text/javascript"},
+    ("script", "language"): {"javascript"},
+    ("style", "type"): {"text/css"},
+    ("link", "type"): {"text/css"},         # rel="stylesheet" only
+    ("form", "method"): {"get"},
+}
+
+BOOLEAN_ATTRIBUTES = {
+    "allowfullscreen", "async", "autofocus", "autoplay", "checked", "controls", "default", "defer",
+    "disabled", "formnovalidate", "hidden", "inert", "ismap", "itemscope", "loop", "multiple", "muted",
+    "nomodule", "novalidate", "open", "playsinline", "readonly", "required", "reversed", "selected",
+}
+
+URL_ATTRIBUTES = {"href", "src", "srcset", "imagesrcset", "action", "formaction", "poster", "data", "cite"}
+QUOTED_TAGS = {"link", "meta", "script", "style", "iframe", "base"}
+
+WHITESPACE_RE = re.compile(r'[ \t\n\r\f]+')
+UNQUOTED_RE = re.compile(r'[^\s"\'=<>`&]+')
+AMBIGUOUS_AMPERSAND_RE = re.compile(r'&(?=[A-Za-z0-9#])')
+
+GZIP_LEVEL = 6
+
+
+def is_kept_comment(raw):
+    text = raw[4:-3] if raw.startswith("<!--") and raw.endswith("-->") else raw
+    return text.lstrip().startswith(("[if", "<![endif]")) or text.strip() in MARKER_COMMENTS
+
+
+def attributes(token):
+    """The start tag's attributes with defaults dropped and boolean values emptied"""
+    result = []
+    for name, value in token.attrs:
+        if value is not None and value.lower() in DEFAULT_ATTRIBUTES.get((token.tag, name), ()) \
+                and (token.tag != "link" or (token.get("rel") or "").lower() == "stylesheet"):
+            continue
+        if value is not None and (value == "" or (name in BOOLEAN_ATTRIBUTES and value.lower() == name)):
+            value = None
+        result.append((name, value))
+    return result
+
+
+def start_tag(token):
+    parts = [token.tag]
+    for name, value in attributes(token):
+        if value is None:
+            parts.append(name)
+        elif UNQUOTED_RE.fullmatch(value) and name not in URL_ATTRIBUTES and token.tag not in QUOTED_TAGS:
+            parts.append(f"{name}={value}")
+        else:
+            value = AMBIGUOUS_AMPERSAND_RE.sub("&amp;", value)
+            if '"' in value and "'" not in value:
+                parts.append(f"{name}='{value}'")
+            else:
+                parts.append(f'{name}="{value.replace(chr(34), "&quot;")}"')
+    return "<" + " ".join(parts) + ">"
+
+
+def walk(content):
+    """
+    Yield (token, context) for every token: context is "raw" inside raw-text
+    elements, "foreign" inside <svg>/<math>, otherwise "html"
+    """
+    raw_tag = foreign_tag = None
+    depth = 0
+    for token in tokenize(iter_chunks(content)):
+        if raw_tag is not None:
+            if token.kind == "endtag" and token.tag == raw_tag:
+                depth -= 1
+                if not depth:
+                    raw_tag = None
+                    yield token, "html"
+                    continue
+            elif token.kind == "starttag" and token.tag == raw_tag:
+                depth += 1
+            yield token, "raw"
+        elif foreign_tag is not None:
+            if token.kind == "endtag" and token.tag == foreign_tag:
+                depth -= 1
+                if not depth:
+                    foreign_tag = None
+            elif token.kind == "starttag" and token.tag == foreign_tag:
+                depth += 1
+            yield token, "foreign"
+        elif token.kind == "starttag" and token.tag in FOREIGN_ELEMENTS:
+            foreign_tag, depth = token.tag, 1
+            yield token, "foreign"
+        else:
+            if token.kind == "starttag" and token.tag in RAW_ELEMENTS:
+                raw_tag, depth = token.tag, 1
+            yield token, "html"
+
+
+def collapse(text, newlines=True):
+    if newlines:
+        return WHITESPACE_RE.sub(lambda m: "\n" if "\n" in m.group(0) or "\r" in m.group(0) else " ", text)
+    return WHITESPACE_RE.sub(" ", text)
+
+
+def minify_html(content):
+    """content with whitespace, comments and redundant attribute syntax removed (unverified)"""
+    out = []
+    text = []
+    for token, context in walk(content):
+        if context == "html" and token.kind == "data":
+            text.append(token.raw)
+            continue
+        if context == "html" and token.kind == "comment" and not is_kept_comment(token.raw):
+            continue
+        if text:
+            out.append(collapse("".join(text)))
+            text = []
+        if context != "html":
+            out.append(token.raw)
+        elif token.is_start:
+            out.append(start_tag(token))
+        elif token.kind == "endtag":
+            out.append(f"</{token.tag}>")
+        else:
+            out.append(token.raw)
+    if text:
+        out.append(collapse("".join(text)))
+    return "".join(out)
+
+
+def signature(content):
+    """What a browser builds from content, up to whitespace in text and dropped comments"""
+    items = []
+    text = []
+    for token, context in walk(content):
+        if context == "html" and token.kind == "data":
+            text.append(token.raw)
+            continue
+        if context == "html" and token.kind == "comment" and not is_kept_comment(token.raw):
+            continue
+        if text:
+            items.append(("data", collapse("".join(text), newlines=False)))
+            text = []
+        if context != "html":
+            items.append((token.kind, token.raw))
+        elif token.is_start:
+            # <br/> and <br>, <div/> and <div> are the same to a browser
+            items.append(("starttag", token.tag, tuple(attributes(token))))
+        elif token.kind == "endtag":
+            items.append(("endtag", token.tag))
+        else:
+            items.append((token.kind, token.raw))
+    if text:
+        items.append(("data", collapse("".join(text), newlines=False)))
+    return items
+
+
+def equivalent(original, minified):
+    """True if minified tokenizes to the same elements, attributes and text as original"""
+    return signature(original) == signature(minified)
+
+
+def minify(content):
+    """(minified content, None), or (content, reason) when the result cannot be verified"""
+    minified = minify_html(content)
+    if minified == content:
+        return content, None
+    if not equivalent(content, minified):
+        return content, "minified page does not tokenize to the same elements and text"
+    return minified, None
+
+
+@transform("minify-html")
+def minify_page(content, page):
+    """Collapse whitespace, drop comments and redundant attribute syntax"""
+    minified, problem = minify(content)
+    if problem:
+        page.note(f"not minified: {problem}")
+    elif minified != content:
+        before, after = len(content.encode("utf-8")), len(minified.encode("utf-8"))
+        page.note(f"minified {before / 1024:.1f} KB -> {after / 1024:.1f} KB")
+    return minified
+
+
+def gzipped_size(data):
+    return len(gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0))
+
+
+def measure_page(root, path):
+    """(rel_path, bytes, gzip bytes, minified bytes, minified gzip bytes, problem) of one page"""
+    page = engine.Page(root, path)
+    content = engine.read_page(path)
+    minified, problem = minify(content)
+    before, after = content.encode("utf-8"), minified.encode("utf-8")
+    return page.rel_path, len(before), gzipped_size(before), len(after), gzipped_size(after), problem
+
+
+class MinifyReport:
+    def __init__(self):
+        self.pages = []         # (rel_path, bytes, gzip, minified, minified gzip)
+        self.failed = []        # (rel_path, problem)
+        self.seconds = 0.0
+
+    def print_summary(self, verbose=False):
+        print("=" * 60)
+        print(f"Pages scanned: {len(self.pages) + len(self.failed)}")
+        changed = sorted((row for row in self.pages if row[3] != row[1]), key=lambda row: row[3] - row[1])
+        print(f"Pages that would shrink: {len(changed)}")
+        for rel_path, size, zipped, new_size, new_zipped in changed if verbose else changed[:10]:
+            print(f"  ✓ {rel_path}: {size / 1024:.1f} KB -> {new_size / 1024:.1f} KB, "
+                  f"gzip {zipped / 1024:.1f} KB -> {new_zipped / 1024:.1f} KB")
+        if len(changed) > 10 and not verbose:
+            print(f"    ... {len(changed) - 10} more pages (--verbose lists them all)")
+        for rel_path, problem in self.failed:
+            print(f"  - {rel_path} left as is: {problem}")
+        size = sum(row[1] for row in self.pages)
+        zipped = sum(row[2] for row in self.pages)
+        new_size = sum(row[3] for row in self.pages)
+        new_zipped = sum(row[4] for row in self.pages)
+        if size:
+            print(f"Page HTML: {size / 1e6:.2f} MB -> {new_size / 1e6:.2f} MB ({(1 - new_size / size) * 100:.0f}% less)")
+            print(f"Gzipped:   {zipped / 1e6:.2f} MB -> {new_zipped / 1e6:.2f} MB "
+                  f"({(1 - new_zipped / zipped) * 100:.0f}% less)")
+        print(f"Time: {self.seconds:.1f} s")
+        print("=" * 60)
+
+    def as_json(self):
+        pages = {rel_path: {"bytes": size, "gzip": zipped, "minified": new_size, "minified_gzip": new_zipped}
+                 for rel_path, size, zipped, new_size, new_zipped in self.pages}
+        return {"pages": pages, "failed": dict(self.failed)}
+
+
+def measure(root, jobs=1):
+    """Minify every page in memory and report the sizes"""
+    report = MinifyReport()
+    start = time.perf_counter()
+    pages = list(engine.iter_pages(root))
+    if jobs > 1 and len(pages) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(measure_page, [root] * len(pages), pages, chunksize=8))
+    else:
+        results = [measure_page(root, path) for path in pages]
+    for rel_path, size, zipped, new_size, new_zipped, problem in results:
+        if problem:
+            report.failed.append((rel_path, problem))
+        else:
+            report.pages.append((rel_path, size, zipped, new_size, new_zipped))
+    report.seconds = time.perf_counter() - start
+    return report
@@ -0,0 +1,318 @@
+"""
+htmlstream.py
+
+Streaming, tag-aware HTML rewriting on top of html.parser.
+
+The tokenizer turns HTML into a stream of Tokens that keep their exact
+source text, so untouched markup round-trips byte for byte and only
+modified start tags are re-serialized. The Rewriter makes one forward pass
+over that stream, keeps a stack of open elements, and calls rules that
+match an element by tag, class and ancestor:
+
+    rewriter = Rewriter()
+    rewriter.hold("div", cls="et_pb_image_0")
+
+    @rewriter.rule("img", inside=Match("div", cls="et_pb_image_0"))
+    def unhide(token, ctx):
+        ctx.ancestor("div", cls="et_pb_image_0").set("style", "opacity: 1;")
+
+    content = rewriter.rewrite(content)
+
+Output is flushed as soon as it is final. Only elements matched by a rule
+registered with hold=True (and the descendants of such an element) are
+buffered, so a descendant rule can still modify the ancestor's start tag;
+memory is bounded by the size of the largest held element rather than the
+page.
+"""
+
+from html.parser import HTMLParser
+
+# Elements that never have an end tag and so never go on the stack
+VOID_ELEMENTS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "param", "source", "track", "wbr",
+}
+
+CHUNK_SIZE = 1 << 16
+
+
+class Token:
+    """One piece of markup and the exact source text it came from"""
+
+    __slots__ = ("kind", "tag", "attrs", "raw", "modified")
+
+    def __init__(self, kind, tag=None, attrs=None, raw=None):
+        self.kind = kind            # starttag, startendtag, endtag, data, comment, decl, pi
+        self.tag = tag
+        self.attrs = attrs          # [(name, value), ...] for start tags
+        self.raw = raw
+        self.modified = False
+
+    @property
+    def is_start(self):
+        return self.kind in ("starttag", "startendtag")
+
+    def get(self, name, default=None):
+        """Value of attribute name (last one wins, like browsers)"""
+        for key, value in reversed(self.attrs or ()):
+            if key == name:
+                return value
+        return default
+
+    def has(self, name):
+        return any(key == name for key, _ in self.attrs or ())
+
+    def set(self, name, value):
+        """Set attribute name (value None for a bare boolean attribute)"""
+        attrs = [(key, old) for key, old in self.attrs if key != name]
+        attrs.append((name, value))
+        self.attrs = attrs
+        self.modified = True
+
+    def remove(self, name):
+        if self.has(name):
+            self.attrs = [(key, value) for key, value in self.attrs if key != name]
+            self.modified = True
+
+    @property
+    def classes(self):
+        return (self.get("class") or "").split()
+
+    def has_class(self, cls):
+        return cls in self.classes
+
+    def text(self):
+        """Source text if untouched, otherwise the re-serialized tag"""
+        if not self.modified:
+            return self.raw
+        parts = [self.tag]
+        for name, value in self.attrs:
+            if value is None:
+                parts.append(name)
+            else:
+                escaped = value.replace("&", "&amp;").replace('"', "&quot;")
+                parts.append(f'{name}="{escaped}"')
+        end = " />" if self.kind == "startendtag" else ">"
+        return "<" + " ".join(parts) + end
+
+    def __repr__(self):
+        return f"Token({self.kind!r}, {self.tag!r})"
+
+
+class Tokenizer(HTMLParser):
+    """HTMLParser that records every event as a Token with its raw text"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self._pending = []
+        self._ready = []
+
+    # Every consumed span of input passes through updatepos(i, j) right
+    # after the handler(s) for it ran, which is where raw text is attached.
+    def updatepos(self, i, j):
+        if i < j:
+            raw = self.rawdata[i:j]
+            if not self._pending:
+                self._ready.append(Token("data", raw=raw))
+            else:
+                self._pending[0].raw = raw
+                for token in self._pending[1:]:
+                    token.raw = ""
+                self._ready.extend(self._pending)
+        self._pending = []
+        return j
+
+    def handle_starttag(self, tag, attrs):
+        self._pending.append(Token("starttag", tag, attrs))
+
+    def handle_startendtag(self, tag, attrs):
+        self._pending.append(Token("startendtag", tag, attrs))
+
+    def handle_endtag(self, tag):
+        self._pending.append(Token("endtag", tag))
+
+    def handle_data(self, data):
+        self._pending.append(Token("data"))
+
+    def handle_entityref(self, name):
+        self._pending.append(Token("data"))
+
+    def handle_charref(self, name):
+        self._pending.append(Token("data"))
+
+    def handle_comment(self, data):
+        self._pending.append(Token("comment"))
+
+    def handle_decl(self, decl):
+        self._pending.append(Token("decl"))
+
+    def unknown_decl(self, data):
+        self._pending.append(Token("decl"))
+
+    def handle_pi(self, data):
+        self._pending.append(Token("pi"))
+
+    def take(self):
+        """Tokens completed so far"""
+        ready, self._ready = self._ready, []
+        return ready
+
+    def finish(self):
+        """Flush buffered input, including an unterminated raw-text element"""
+        self.close()
+        if self.rawdata:
+            self._ready.append(Token("data", raw=self.rawdata))
+            self.rawdata = ""
+        return self.take()
+
+
+def tokenize(chunks):
+    """Yield Tokens for an iterable of text chunks, a chunk at a time"""
+    tokenizer = Tokenizer()
+    for chunk in chunks:
+        tokenizer.feed(chunk)
+        yield from tokenizer.take()
+    yield from tokenizer.finish()
+
+
+def iter_chunks(text, size=CHUNK_SIZE):
+    for start in range(0, len(text), size):
+        yield text[start:start + size]
+
+
+class Match:
+    """Element selector: tag name, required classes and attribute test"""
+
+    def __init__(self, tag=None, cls=None, attr=None):
+        self.tag = tag
+        self.cls = cls.split() if isinstance(cls, str) else list(cls or ())
+        self.attr = attr or {}      # {name: value, or callable(value) -> bool}
+
+    def matches(self, token):
+        if self.tag and token.tag != self.tag:
+            return False
+        if self.cls:
+            classes = token.classes
+            if not all(c in classes for c in self.cls):
+                return False
+        for name, expected in self.attr.items():
+            value = token.get(name)
+            if callable(expected):
+                if value is None or not expected(value):
+                    return False
+            elif value != expected:
+                return False
+        return True
+
+
+class Element:
+    """An open element on the stack"""
+
+    __slots__ = ("token", "held", "last_child")
+
+    def __init__(self, token, held):
+        self.token = token
+        self.held = held
+        self.last_child = None      # start Token of the previous child element
+
+
+class Context:
+    """What a rule callback can see: the ancestor stack and the previous sibling"""
+
+    def __init__(self, stack, previous_sibling):
+        self.stack = stack
+        self.previous_sibling = previous_sibling
+
+    def ancestor(self, tag=None, cls=None, attr=None):
+        """Start Token of the nearest ancestor matching, or None"""
+        match = Match(tag, cls, attr)
+        for element in reversed(self.stack):
+            if match.matches(element.token):
+                return element.token
+        return None
+
+
+class Rule:
+    def __init__(self, callback, match, inside=None, hold=False):
+        self.callback = callback
+        self.match = match
+        self.inside = inside
+        self.hold = hold
+
+
+class Rewriter:
+    """One-pass rewriter applying rules to start tags as they stream past"""
+
+    def __init__(self):
+        self.rules = []
+
+    def rule(self, tag=None, cls=None, attr=None, inside=None, hold=False):
+        """
+        Decorator registering callback(token, ctx) for matching start tags.
+        The callback may modify token in place and returns None, or returns
+        a string emitted instead of the token (use token.text() to keep it).
+        inside is a Match that some ancestor must satisfy. hold=True buffers
+        the matched element until its end tag so descendant rules can still
+        modify its start tag.
+        """
+        def register(callback):
+            self.rules.append(Rule(callback, Match(tag, cls, attr), inside, hold))
+            return callback
+        return register
+
+    def hold(self, tag=None, cls=None, attr=None):
+        """Buffer matching elements so descendant rules can edit their start tag"""
+        self.rules.append(Rule(lambda token, ctx: None, Match(tag, cls, attr), hold=True))
+
+    def _within(self, rule, stack):
+        return any(rule.inside.matches(element.token) for element in stack)
+
+    def rewrite_stream(self, chunks):
+        """Yield output text for an iterable of input chunks"""
+        stack = []
+        held = []           # tokens/strings waiting for their held element to close
+        for token in tokenize(chunks):
+            out = token
+            if token.is_start:
+                parent = stack[-1] if stack else None
+                ctx = Context(stack, parent.last_child if parent else None)
+                hold = False
+                for rule in self.rules:
+                    if not rule.match.matches(token):
+                        continue
+                    if rule.inside is not None and not self._within(rule, stack):
+                        continue
+                    hold = hold or rule.hold
+                    result = rule.callback(token, ctx)
+                    if result is not None:
+                        out = result
+                if parent:
+                    parent.last_child = token
+                if token.kind == "starttag" and token.tag not in VOID_ELEMENTS:
+                    stack.append(Element(token, hold or bool(stack and stack[-1].held)))
+            elif token.kind == "endtag":
+                for index in range(len(stack) - 1, -1, -1):
+                    if stack[index].token.tag == token.tag:
+                        del stack[index:]
+                        break
+
+            if held or (stack and stack[-1].held):
+                held.append(out)
+                if not any(element.held for element in stack):
+                    yield "".join(item if isinstance(item, str) else item.text() for item in held)
+                    held = []
+            else:
+                yield out if isinstance(out, str) else out.text()
+        if held:
+            yield "".join(item if isinstance(item, str) else item.text() for item in held)
+
+    def rewrite(self, text):
+        """Rewrite a whole document held in memory"""
+        return "".join(self.rewrite_stream(iter_chunks(text)))
+
+    def rewrite_file(self, src_path, dst_path):
+        """Stream src_path to dst_path through the rules, chunk by chunk"""
+        with open(src_path, "r", encoding="utf-8", newline="") as src, \
+                open(dst_path, "w", encoding="utf-8", newline="") as dst:
+            for text in self.rewrite_stream(iter(lambda: src.read(CHUNK_SIZE), "")):
+                dst.write(text)
@@ -0,0 +1,271 @@
+"""
+httpcache.py
+
+Persistent on-disk HTTP response cache shared by the network scripts.
+
+Layout under .sitefix/http-cache/:
+
+    index.json              method + URL (+ request options) -> status,
+                            headers, validators, body hash,
+                            stored/accessed times
+    objects/ab/abcdef...    response bodies, named by their sha256, so
+                            identical bodies are stored once
+
+Request options that change the answer - allow_redirects=False, request
+headers, params, a body - are part of an entry's key, so the same URL
+asked for in two ways is cached twice. A lookup younger than its TTL is answered from disk without touching the
+network. An older entry is revalidated with If-None-Match /
+If-Modified-Since when it has validators; a 304 only refreshes its stored
+time. When the bodies exceed max_bytes, the least recently used entries
+are evicted (and objects no longer referenced are deleted) on save().
+
+    cache = HTTPCache(os.getcwd())
+    response = cache.request(session, "GET", url, ttl=3600)
+    response.status_code, response.from_cache, response.json()
+    cache.save()
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+from . import state
+
+CACHE_DIR = os.path.join(state.STATE_DIR, "http-cache")
+INDEX_VERSION = 2
+
+DEFAULT_TTL = 24 * 3600
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Statuses worth remembering; everything else always goes to the network
+CACHEABLE_STATUSES = {200, 203, 204, 300, 301, 404, 410}
+# Response headers kept with an entry
+KEPT_HEADERS = ("Content-Type", "Content-Length", "ETag", "Last-Modified", "Location")
+# Request options that do not change the response, left out of the key
+TRANSPARENT_OPTIONS = {"timeout", "stream", "verify", "cert", "proxies"}
+# Options at requests' own default are the same as leaving them out
+DEFAULT_OPTIONS = {"allow_redirects": True}
+
+
+def entry_key(method, url, options=None):
+    """Index key for a request: method, URL and any options that change the answer"""
+    key = f"{method.upper()} {url}"
+    varying = {name: value for name, value in (options or {}).items()
+               if name not in TRANSPARENT_OPTIONS and value not in (None, {}) and value != DEFAULT_OPTIONS.get(name)}
+    if varying:
+        key += " " + json.dumps(varying, sort_keys=True, default=str)
+    return key
+
+
+class CachedResponse:
+    """The parts of a requests.Response the scripts use"""
+
+    def __init__(self, url, status_code, headers, content, from_cache):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.from_cache = from_cache
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class HTTPCache:
+    """Content-addressed response cache with TTLs and LRU size bound"""
+
+    def __init__(self, root, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES, path=None):
+        self.dir = path or os.path.join(root, CACHE_DIR)
+        self.index_path = os.path.join(self.dir, "index.json")
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.entries = state.load_json(self.index_path, INDEX_VERSION).get("entries", {})
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    # -- entries -------------------------------------------------------
+
+    def object_path(self, digest):
+        return os.path.join(self.dir, "objects", digest[:2], digest)
+
+    def lookup(self, method, url, options=None):
+        """Entry for method + url (+ options) whose body is still on disk, or None"""
+        with self._lock:
+            entry = self.entries.get(entry_key(method, url, options))
+        if entry and entry["body"] and not os.path.exists(self.object_path(entry["body"])):
+            return None
+        return entry
+
+    def is_fresh(self, entry, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        return entry is not None and time.time() - entry["stored"] < ttl
+
+    def validators(self, entry):
+        """Conditional request headers for an entry"""
+        headers = {}
+        if entry and entry["status"] == 200:
+            if entry["headers"].get("ETag"):
+                headers["If-None-Match"] = entry["headers"]["ETag"]
+            if entry["headers"].get("Last-Modified"):
+                headers["If-Modified-Since"] = entry["headers"]["Last-Modified"]
+        return headers
+
+    def touch(self, entry, refreshed=False):
+        """Mark an entry used (and re-stored, after a 304)"""
+        now = time.time()
+        with self._lock:
+            entry["accessed"] = now
+            if refreshed:
+                entry["stored"] = now
+
+    def read(self, entry):
+        if not entry["body"]:
+            return b""
+        with open(self.object_path(entry["body"]), "rb") as f:
+            return f.read()
+
+    def copy_to(self, entry, dest):
+        """Write an entry's body to dest atomically"""
+        tmp_path = f"{dest}.part-{os.getpid()}-{threading.get_ident()}"
+        os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+        try:
+            shutil.copyfile(self.object_path(entry["body"]), tmp_path)
+            os.replace(tmp_path, dest)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _put(self, method, url, status, headers, digest, size, options=None):
+        now = time.time()
+        entry = {
+            "url": url,
+            "status": status,
+            "headers": {name: headers[name] for name in KEPT_HEADERS if headers.get(name)},
+            "body": digest,
+            "size": size,
+            "stored": now,
+            "accessed": now,
+        }
+        with self._lock:
+            self.entries[entry_key(method, url, options)] = entry
+        return entry
+
+    def store_bytes(self, method, url, status, headers, content, options=None):
+        """Cache an in-memory response body"""
+        if status not in CACHEABLE_STATUSES or "no-store" in headers.get("Cache-Control", ""):
+            return None
+        digest = hashlib.sha256(content).hexdigest() if content else None
+        if digest:
+            path = self.object_path(digest)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(content)
+                os.replace(tmp_path, path)
+        return self._put(method, url, status, headers, digest, len(content), options)
+
+    def store_file(self, method, url, status, headers, src_path, digest, options=None):
+        """Cache a body already written to src_path (its sha256 is digest)"""
+        if status not in CACHEABLE_STATUSES or "no-store" in headers.get("Cache-Control", ""):
+            return None
+        path = self.object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+            shutil.copyfile(src_path, tmp_path)
+            os.replace(tmp_path, path)
+        return self._put(method, url, status, headers, digest, os.path.getsize(path), options)
+
+    # -- requests ------------------------------------------------------
+
+    def request(self, session, method, url, ttl=None, **kwargs):
+        """
+        session.request(method, url, **kwargs) through the cache. Returns a
+        CachedResponse; network errors propagate like requests' own.
+        """
+        options = dict(kwargs)
+        entry = self.lookup(method, url, options)
+        if self.is_fresh(entry, ttl):
+            self.touch(entry)
+            self.hits += 1
+            return CachedResponse(url, entry["status"], dict(entry["headers"]), self.read(entry), True)
+
+        headers = dict(kwargs.pop("headers", None) or {})
+        headers.update(self.validators(entry))
+        response = session.request(method, url, headers=headers, **kwargs)
+        if response.status_code == 304 and entry:
+            self.touch(entry, refreshed=True)
+            self.revalidated += 1
+            return CachedResponse(url, entry["status"], dict(entry["headers"]), self.read(entry), True)
+
+        self.misses += 1
+        self.store_bytes(method, url, response.status_code, response.headers, response.content, options)
+        return CachedResponse(url, response.status_code, dict(response.headers), response.content, False)
+
+    def get(self, session, url, ttl=None, **kwargs):
+        return self.request(session, "GET", url, ttl, **kwargs)
+
+    def head(self, session, url, ttl=None, **kwargs):
+        return self.request(session, "HEAD", url, ttl, **kwargs)
+
+    # -- persistence ---------------------------------------------------
+
+    def total_bytes(self):
+        sizes = {}
+        for entry in self.entries.values():
+            if entry["body"]:
+                sizes[entry["body"]] = entry["size"]
+        return sum(sizes.values())
+
+    def evict(self):
+        """Drop least recently used entries until bodies fit in max_bytes"""
+        evicted = 0
+        with self._lock:
+            by_age = sorted(self.entries, key=lambda key: self.entries[key]["accessed"])
+            total = self.total_bytes()
+            for key in by_age:
+                if total <= self.max_bytes:
+                    break
+                digest = self.entries.pop(key)["body"]
+                evicted += 1
+                if digest and not any(e["body"] == digest for e in self.entries.values()):
+                    total -= self._remove_object(digest)
+        return evicted
+
+    def _remove_object(self, digest):
+        path = self.object_path(digest)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return 0
+        return size
+
+    def save(self):
+        """Evict down to the size bound and write the index"""
+        self.evict()
+        with self._lock:
+            state.save_json(self.index_path, {"version": INDEX_VERSION, "entries": self.entries})
+
+    def clear(self):
+        with self._lock:
+            self.entries = {}
+        shutil.rmtree(os.path.join(self.dir, "objects"), ignore_errors=True)
+        self.save()
+
+    def stats(self):
+        return f"{self.hits} cached, {self.revalidated} revalidated, {self.misses} fetched"
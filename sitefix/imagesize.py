@@ -0,0 +1,113 @@
+"""
+imagesize.py
+
+Image dimensions from file headers only - no decoding, no Pillow.
+
+Reads at most the first few KB of a PNG, GIF, WebP or SVG (and walks the
+segment headers of a JPEG up to its SOF marker). Results are memoized per
+(path, size, mtime), so every page referencing the same image costs one
+header read per process.
+"""
+
+import os
+import re
+import struct
+
+HEADER_BYTES = 4096
+SVG_LENGTH_RE = re.compile(r'^\s*([\d.]+)\s*(px)?\s*$')
+
+# (path, size, mtime_ns) -> (width, height) or None
+_cache = {}
+
+
+def _png(head):
+    if head[12:16] == b"IHDR":
+        return struct.unpack(">II", head[16:24])
+    return None
+
+
+def _gif(head):
+    return struct.unpack("<HH", head[6:10])
+
+
+def _webp(head):
+    chunk = head[12:16]
+    if chunk == b"VP8 " and head[23:26] == b"\x9d\x01\x2a":
+        width, height = struct.unpack("<HH", head[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L" and head[20:21] == b"\x2f":
+        bits = int.from_bytes(head[21:25], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X":
+        return int.from_bytes(head[24:27], "little") + 1, int.from_bytes(head[27:30], "little") + 1
+    return None
+
+
+def _jpeg(f):
+    """Walk marker segments to the first SOFn"""
+    f.seek(2)
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        code = marker[1]
+        if code == 0xFF:
+            f.seek(-1, os.SEEK_CUR)
+            continue
+        if code in (0xD8, 0x01) or 0xD0 <= code <= 0xD7:
+            continue
+        length = struct.unpack(">H", f.read(2))[0]
+        if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">HH", f.read(5)[1:5])
+            return width, height
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def _svg(head):
+    text = head.decode("utf-8", errors="replace")
+    tag = re.search(r"<svg\b[^>]*>", text, re.IGNORECASE | re.DOTALL)
+    if not tag:
+        return None
+    attrs = dict(re.findall(r'([\w:-]+)\s*=\s*["\']([^"\']*)["\']', tag.group(0)))
+    width = SVG_LENGTH_RE.match(attrs.get("width", ""))
+    height = SVG_LENGTH_RE.match(attrs.get("height", ""))
+    # A viewBox alone gives an aspect ratio, not a size: browsers render
+    # such an <img> at 300x150 unless told otherwise, so report nothing
+    if width and height:
+        return round(float(width.group(1))), round(float(height.group(1)))
+    return None
+
+
+def read_dimensions(path):
+    """(width, height) from the file header, or None if unknown"""
+    with open(path, "rb") as f:
+        head = f.read(HEADER_BYTES)
+        try:
+            if head.startswith(b"\x89PNG\r\n\x1a\n"):
+                return _png(head)
+            if head[:6] in (b"GIF87a", b"GIF89a"):
+                return _gif(head)
+            if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+                return _webp(head)
+            if head[:2] == b"\xff\xd8":
+                return _jpeg(f)
+            if path.lower().endswith(".svg"):
+                return _svg(head)
+        except (struct.error, ValueError):
+            return None
+    return None
+
+
+def dimensions(path):
+    """Memoized read_dimensions; None for missing or unrecognised files"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    key = (path, st.st_size, st.st_mtime_ns)
+    if key not in _cache:
+        try:
+            _cache[key] = read_dimensions(path)
+        except OSError:
+            _cache[key] = None
+    return _cache[key]
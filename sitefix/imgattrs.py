@@ -0,0 +1,263 @@
+"""
+imgattrs.py
+
+Rendering and loading hints on <img> and <iframe> tags.
+
+img-dimensions gives every local image an intrinsic width and height so
+the browser can reserve its box before the file arrives (no layout shift
+when it loads). Sizes come from imagesize.py, which reads only the file
+header and memoizes per file, so a full run opens each image once no
+matter how many pages use it.
+
+    no width, no height     both are filled in from the file
+    only one of them        the other follows from the aspect ratio
+    no decoding             decoding="async", so decoding never blocks the
+                            main thread
+
+Existing attributes are never changed. An image whose file is more than
+OVERSIZE_FACTOR times wider than its declared width, with no srcset to
+offer a smaller candidate, is noted on the page (see ``run --report``) -
+e.g. the 500 px placeholder recover_assets.py puts in 90 px testimonial
+slots.
+
+lcp-priority estimates each page's Largest Contentful Paint image: the
+image with the largest declared area in the above-the-fold zone (the
+Divi theme-builder header and the first content section), earliest first
+on a tie. That image gets fetchpriority="high", loses any
+loading="lazy", and is preloaded from <head>; other images in the zone
+lose a competing fetchpriority="high". Every image and iframe after the
+zone gets loading="lazy". Each change is noted on the page.
+"""
+
+import os
+import re
+
+from . import imagesize
+from . import paths
+from .htmlstream import Rewriter, iter_chunks
+from .transforms import transform
+
+OVERSIZE_FACTOR = 2
+
+STYLE_LENGTH_RE = re.compile(r'(?:^|;)\s*(width|height)\s*:\s*(\d+px)', re.IGNORECASE)
+
+# Elements that are on screen at first paint on every page template
+ABOVE_THE_FOLD = ("et_pb_section_0_tb_header", "et_pb_section_0")
+
+# Small chunks so the LCP analysis can stop soon after the zone ends
+ANALYSIS_CHUNK_SIZE = 8192
+
+PRELOAD_RE = re.compile(r'\t?<link rel="preload" as="image"[^>]*>\n?')
+# The preload goes right after the charset declaration, which has to stay
+# within the first 1024 bytes; <head> only if a page has none
+CHARSET_RE = re.compile(r'<meta charset=[^>]*>\n?', re.IGNORECASE)
+HEAD_RE = re.compile(r'<head>\n?', re.IGNORECASE)
+
+
+def local_path(root, page, url):
+    """Absolute path of the local file url points to, or None"""
+    if not url or url.startswith("data:"):
+        return None
+    rel_path = paths.resolve(page.rel_path, url)
+    return os.path.join(root, rel_path) if rel_path else None
+
+
+def pixels(value):
+    """Integer pixel length of a width/height attribute, or None ("100%", "auto")"""
+    value = (value or "").strip()
+    if value.endswith("px"):
+        value = value[:-2]
+    return int(value) if value.isdigit() else None
+
+
+def declared_size(token):
+    """
+    (width, height) the page renders token at, as far as the tag says:
+    inline style px lengths win over the width/height attributes. Either
+    may be None.
+    """
+    style = dict(STYLE_LENGTH_RE.findall(token.get("style") or ""))
+    width = pixels(style.get("width")) or pixels(token.get("width"))
+    height = pixels(style.get("height")) or pixels(token.get("height"))
+    return width, height
+
+
+def dimensions_rewriter(page):
+    """Rewriter adding width/height/decoding to the <img> tags of page"""
+    rewriter = Rewriter()
+
+    @rewriter.rule("img")
+    def add_dimensions(token, ctx):
+        if not token.has("decoding"):
+            token.set("decoding", "async")
+        src = token.get("src")
+        path = local_path(page.root, page, src)
+        size = imagesize.dimensions(path) if path else None
+        if not size or not all(size):
+            return None
+        width, height = size
+
+        has_width, has_height = token.has("width"), token.has("height")
+        if not has_width and not has_height:
+            token.set("width", str(width))
+            token.set("height", str(height))
+        elif not has_height and pixels(token.get("width")):
+            token.set("height", str(round(pixels(token.get("width")) * height / width)))
+        elif not has_width and pixels(token.get("height")):
+            token.set("width", str(round(pixels(token.get("height")) * width / height)))
+
+        declared = declared_size(token)[0]
+        if declared and width > OVERSIZE_FACTOR * declared and not token.has("srcset"):
+            page.note(f"{paths.split_url(src)[0]} is {width}x{height}, shown at {declared} px wide")
+        return None
+
+    return rewriter
+
+
+@transform("img-dimensions")
+def img_dimensions(content, page):
+    """Add intrinsic width/height and decoding="async" to <img> tags"""
+    if "<img" not in content:
+        return content
+    return dimensions_rewriter(page).rewrite(content)
+
+
+def short_url(url):
+    return paths.split_url(url or "")[0] or "(no src)"
+
+
+def in_zone(ctx):
+    """True if the current tag is inside an above-the-fold element"""
+    return any(ctx.ancestor(cls=cls) is not None for cls in ABOVE_THE_FOLD)
+
+
+def find_lcp(content):
+    """Index (in document order) of the likely LCP <img>, or None"""
+    rewriter = Rewriter()
+    candidates = []     # (area, -index)
+    count = [0]
+    done = [False]
+
+    @rewriter.rule("img")
+    def measure(token, ctx):
+        index = count[0]
+        count[0] += 1
+        if not in_zone(ctx):
+            done[0] = bool(candidates)
+        elif not token.get("src", "").startswith("data:"):
+            width, height = declared_size(token)
+            area = (width or 0) * (height or 0)
+            candidates.append((area, -index))
+        return None
+
+    @rewriter.rule(cls="et_pb_section_1")
+    def leave_zone(token, ctx):
+        done[0] = True
+        return None
+
+    # Only the top of <body> matters: stop tokenizing once past the zone
+    for _ in rewriter.rewrite_stream(iter_chunks(content, ANALYSIS_CHUNK_SIZE)):
+        if done[0]:
+            break
+    return -max(candidates)[1] if candidates else None
+
+
+def preload_link(img, source):
+    """<link rel=preload> for the LCP <img> (and its WebP <source>, if any)"""
+    if source is not None:
+        attrs = [("type", source.get("type")), ("imagesrcset", source.get("srcset")),
+                 ("imagesizes", source.get("sizes") or img.get("sizes"))]
+    elif img.get("srcset"):
+        attrs = [("href", img.get("src")), ("imagesrcset", img.get("srcset")), ("imagesizes", img.get("sizes"))]
+    else:
+        attrs = [("href", img.get("src"))]
+    parts = ['<link rel="preload" as="image"']
+    for name, value in attrs:
+        if value:
+            escaped = value.replace("&", "&amp;").replace('"', "&quot;")
+            parts.append(f'{name}="{escaped}"')
+    parts.append('fetchpriority="high">')
+    return " ".join(parts)
+
+
+def priority_rewriter(page, lcp_index, preload):
+    """Rewriter applying fetch priority and lazy loading around the LCP image"""
+    rewriter = Rewriter()
+    count = [0]
+    lazy = {"img": 0, "iframe": 0}
+    zone_passed = [False]
+
+    @rewriter.rule("img")
+    def prioritize_img(token, ctx):
+        index = count[0]
+        count[0] += 1
+        zone = in_zone(ctx)
+        if index == lcp_index:
+            if token.get("fetchpriority") != "high":
+                token.set("fetchpriority", "high")
+            if token.get("loading") == "lazy":
+                token.remove("loading")
+                page.note(f"loading=lazy removed from LCP image {short_url(token.get('src'))}")
+            previous = ctx.previous_sibling
+            source = previous if ctx.ancestor("picture") is not None and previous is not None \
+                and previous.tag == "source" else None
+            preload.append((preload_link(token, source), token))
+        elif zone:
+            if token.get("fetchpriority") == "high":
+                token.remove("fetchpriority")
+                page.note(f"fetchpriority=high removed from {short_url(token.get('src'))}")
+        if zone:
+            return None
+        zone_passed[0] = True
+        if not token.has("loading"):
+            token.set("loading", "lazy")
+            lazy["img"] += 1
+        return None
+
+    @rewriter.rule("iframe")
+    def lazy_iframe(token, ctx):
+        # Hidden tracking iframes (GTM's <noscript>) come before the zone;
+        # a facade's <template> player is only created on click
+        if in_zone(ctx) or not zone_passed[0] or ctx.ancestor("noscript") is not None \
+                or ctx.ancestor("template") is not None:
+            return None
+        if not token.has("loading"):
+            token.set("loading", "lazy")
+            lazy["iframe"] += 1
+        return None
+
+    return rewriter, lazy
+
+
+def insert_preload(content, link):
+    """Replace any previous image preload with link, right after <meta charset>"""
+    end = content.find("</head>")
+    if end < 0:
+        return content
+    head, rest = content[:end], content[end:]
+    stripped = PRELOAD_RE.sub("", head)
+    anchor = CHARSET_RE.search(stripped) or HEAD_RE.search(stripped)
+    if not anchor:
+        return content
+    new_head = f"{stripped[:anchor.end()]}{link}\n{stripped[anchor.end():]}"
+    return content if new_head == head else new_head + rest
+
+
+@transform("lcp-priority", version=2)
+def lcp_priority(content, page):
+    """Prioritize the likely LCP image and lazy-load everything after the fold"""
+    if "<img" not in content and "<iframe" not in content:
+        return content
+    lcp_index = find_lcp(content)
+    preload = []
+    rewriter, lazy = priority_rewriter(page, lcp_index, preload)
+    new_content = rewriter.rewrite(content)
+    if preload:
+        link, img = preload[0]
+        new_content = insert_preload(new_content, link)
+    if new_content != content:
+        if preload:
+            page.note(f"LCP image: {short_url(img.get('src'))} ({img.get('width')}x{img.get('height')})")
+        if lazy["img"] or lazy["iframe"]:
+            page.note(f"loading=lazy added to {lazy['img']} images and {lazy['iframe']} iframes")
+    return new_content
@@ -0,0 +1,281 @@
+"""
+minify.py
+
+Conservative JavaScript and CSS minification, with no dependencies.
+
+minify_js() tokenizes the source - strings, template literals (with
+nested ${...}), regular expression literals (told apart from division by
+the token before them, as JSMin does), comments - and re-joins the tokens
+with as little whitespace as is safe: a space only between two
+identifier characters (or "+ +", "- -"), a newline only where automatic
+semicolon insertion could depend on it. /*! license */ comments are kept.
+
+Token text is never changed, but a regex taken for a division is split
+into tokens and loses its spaces (/a +b/ would become /a+b/). After ")"
+the tokenizer knows which it is from the bracket it closes (if/while/
+for/with conditions are followed by a regex, anything else by a
+division); after "}", "++" or "--" it cannot tell, and minify_js() copies
+the rest of the file from there on unchanged.
+
+minify_css() is stylesheet.parse() + serialize() with whitespace squeezed
+out of selectors and declarations (never inside strings or url()).
+"""
+
+import re
+
+from . import stylesheet
+
+IDENT_CHARS = set("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_$\\")
+
+# A "/" after one of these starts a regular expression, not a division
+REGEX_PRECEDING_KEYWORDS = {
+    "return", "typeof", "case", "do", "else", "in", "instanceof", "new", "delete",
+    "void", "throw", "yield", "await", "of",
+}
+
+# ... and so does a "/" after the ")" closing the condition of one of these
+CONDITION_KEYWORDS = {"if", "while", "for", "with"}
+
+# A "/" after these may start either, depending on what came before them
+AMBIGUOUS_BEFORE_SLASH = {"}", "++", "--"}
+
+# A newline between tokens is kept when the one before ends with and the
+# one after starts with these, since a statement may end there
+ASI_BEFORE = IDENT_CHARS | set(")]}\"'`+-/")
+ASI_AFTER = IDENT_CHARS | set("([{+-!~\"'`/")
+
+WHITESPACE = " \t\n\r\f\v\u00a0\ufeff\u2028\u2029"
+LINE_TERMINATORS = "\n\r\u2028\u2029"
+
+PUNCTUATORS = sorted("""
+>>>= ... === !== **= <<= >>= >>> ?. ?? ??= &&= ||= => == != <= >= && || ++ -- += -= *= /= %= &= |= ^= << >> **
+{ } ( ) [ ] ; , < > + - * / % & | ^ ! ~ ? : = . @ #
+""".split(), key=len, reverse=True)
+
+
+def is_ident_char(char):
+    return char in IDENT_CHARS or ord(char) > 126
+
+
+def _skip_string(text, pos):
+    """Index just past the quoted string starting at pos"""
+    quote = text[pos]
+    pos += 1
+    while pos < len(text):
+        char = text[pos]
+        if char == "\\":
+            pos += 2
+        elif char == quote or char == "\n":
+            return pos + 1
+        else:
+            pos += 1
+    return len(text)
+
+
+def _skip_regex(text, pos):
+    """Index just past the regex literal starting at pos, flags included"""
+    pos += 1
+    in_class = False
+    while pos < len(text):
+        char = text[pos]
+        if char == "\\":
+            pos += 2
+            continue
+        if char == "\n":
+            return pos
+        if char == "[":
+            in_class = True
+        elif char == "]":
+            in_class = False
+        elif char == "/" and not in_class:
+            pos += 1
+            break
+        pos += 1
+    while pos < len(text) and is_ident_char(text[pos]):
+        pos += 1
+    return pos
+
+
+def tokenize_js(text):
+    """
+    Yield (kind, text) with kind one of "ws", "nl" (whitespace holding a
+    newline), "comment", "license", "token". Template literals are single
+    tokens up to each ${ and from each matching }. A "/" that may start a
+    regex as well as be a division is preceded by ("unsure", "") and then
+    tokenized as a division.
+    """
+    pos = 0
+    length = len(text)
+    previous = ""            # last significant token
+    braces = []              # per open "{": True if it opened a template ${
+    parens = []              # per open "(": True if it holds an if/while/for/with condition
+    condition = None         # whether the last ")" closed a condition, None if unknown
+    while pos < length:
+        char = text[pos]
+        if char in WHITESPACE:
+            end = pos
+            while end < length and text[end] in WHITESPACE:
+                end += 1
+            chunk = text[pos:end]
+            yield ("nl" if any(c in LINE_TERMINATORS for c in chunk) else "ws"), chunk
+            pos = end
+            continue
+        if text.startswith("//", pos):
+            end = text.find("\n", pos)
+            end = length if end < 0 else end
+            yield "comment", text[pos:end]
+            pos = end
+            continue
+        if text.startswith("/*", pos):
+            end = text.find("*/", pos + 2)
+            end = length if end < 0 else end + 2
+            comment = text[pos:end]
+            yield ("license" if comment.startswith("/*!") else "comment"), comment
+            pos = end
+            continue
+        if char == "`" or (char == "}" and braces and braces[-1]):
+            if char == "}":
+                braces.pop()
+            end = pos + 1
+            while end < length:
+                if text[end] == "\\":
+                    end += 2
+                    continue
+                if text[end] == "`":
+                    end += 1
+                    break
+                if text.startswith("${", end):
+                    end += 2
+                    braces.append(True)
+                    break
+                end += 1
+            token = text[pos:end]
+            yield "token", token
+            previous = token
+            pos = end
+            continue
+        unsure = char == "/" and (previous in AMBIGUOUS_BEFORE_SLASH or (previous == ")" and condition is None))
+        if unsure:
+            yield "unsure", ""
+        if char in "\"'":
+            end = _skip_string(text, pos)
+        elif char == "/" and not unsure and (not previous or previous in REGEX_PRECEDING_KEYWORDS
+                                             or (previous == ")" and condition)
+                                             or (not is_ident_char(previous[-1]) and previous[-1] not in ")]}\"'`")):
+            end = _skip_regex(text, pos)
+        elif is_ident_char(char) or char == ".":
+            end = pos + 1
+            if char == "." and not (end < length and text[end].isdigit()):
+                end = pos + 1 + (2 if text.startswith("...", pos) else 0)
+            else:
+                while end < length and (is_ident_char(text[end]) or
+                                        (text[end] == "." and text[pos].isdigit()) or
+                                        (text[end] in "+-" and text[end - 1] in "eE" and text[pos].isdigit())):
+                    end += 1
+        else:
+            end = pos + 1
+            for punctuator in PUNCTUATORS:
+                if text.startswith(punctuator, pos):
+                    end = pos + len(punctuator)
+                    break
+            if char == "{":
+                braces.append(False)
+            elif char == "}" and braces:
+                braces.pop()
+            elif char == "(":
+                parens.append(previous in CONDITION_KEYWORDS)
+            elif char == ")":
+                condition = parens.pop() if parens else None
+        token = text[pos:end]
+        yield "token", token
+        previous = token
+        pos = end
+
+
+def minify_js(text):
+    """text with comments and redundant whitespace removed"""
+    out = []
+    previous = ""
+    pending = None          # "ws" or "nl" seen since the previous token
+    pos = copied = 0        # end of the text read so far, and of the text in out
+    for kind, value in tokenize_js(text):
+        pos += len(value)
+        if kind == "unsure":
+            out.append(text[copied:])
+            break
+        if kind in ("ws", "comment"):
+            if kind == "comment" and "\n" in value:
+                pending = "nl"
+            elif pending is None:
+                pending = "ws"
+            continue
+        if kind == "nl":
+            pending = "nl"
+            continue
+        if kind == "license":
+            if out:
+                out.append("\n")
+            out.append(value)
+            out.append("\n")
+            previous, pending, copied = "", None, pos
+            continue
+        if previous and pending:
+            before, after = previous[-1], value[0]
+            if pending == "nl" and before in ASI_BEFORE and after in ASI_AFTER:
+                out.append("\n")
+            elif (is_ident_char(before) and is_ident_char(after)) or \
+                    (before in "+-" and after == before) or (before == "/" and after == "/"):
+                out.append(" ")
+        out.append(value)
+        previous = value
+        pending = None
+        copied = pos
+    return "".join(out).strip() + "\n"
+
+
+PROTECTED_RE = re.compile(r'"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'|url\([^)]*\)', re.IGNORECASE)
+PLACEHOLDER_RE = re.compile(r'\x00(\d+)\x00')
+DECLARATION_SPACE_RE = re.compile(r'\s*([;:{}!,])\s*')
+SELECTOR_SPACE_RE = re.compile(r'\s*([>,~])\s*')
+
+
+def _squeeze(text, pattern):
+    """Collapse whitespace and drop it around pattern's characters, outside strings and url()"""
+    protected = []
+
+    def protect(m):
+        protected.append(m.group(0))
+        return f"\x00{len(protected) - 1}\x00"
+
+    squeezed = pattern.sub(r"\1", stylesheet.WHITESPACE_RE.sub(" ", PROTECTED_RE.sub(protect, text)))
+    return PLACEHOLDER_RE.sub(lambda m: protected[int(m.group(1))], squeezed).strip()
+
+
+def _minify_rules(rules):
+    minified = []
+    for rule in rules:
+        if isinstance(rule, stylesheet.Rule):
+            if "[" in rule.selector or "(" in rule.selector:
+                selector = rule.selector
+            else:
+                selector = _squeeze(rule.selector, SELECTOR_SPACE_RE)
+            declarations = _squeeze(rule.declarations, DECLARATION_SPACE_RE).rstrip(";")
+            minified.append(stylesheet.Rule(selector, declarations))
+        elif rule.rules is not None:
+            minified.append(stylesheet.AtRule(rule.name, rule.prelude, rules=_minify_rules(rule.rules)))
+        elif rule.block is not None and not rule.name.endswith("keyframes"):
+            minified.append(stylesheet.AtRule(rule.name, rule.prelude,
+                                              block=_squeeze(rule.block, DECLARATION_SPACE_RE).rstrip(";")))
+        else:
+            minified.append(rule)
+    return minified
+
+
+LICENSE_COMMENT_RE = re.compile(r'/\*!.*?\*/', re.DOTALL)
+
+
+def minify_css(text):
+    """text without comments (but /*! licenses */) and redundant whitespace"""
+    licenses = LICENSE_COMMENT_RE.findall(text)
+    css = stylesheet.serialize(_minify_rules(stylesheet.parse(text)))
+    return ("\n".join(licenses) + "\n" if licenses else "") + css + "\n"
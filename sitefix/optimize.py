@@ -0,0 +1,220 @@
+"""
+optimize.py
+
+Lossless / near-lossless recompression of the PNG and JPEG assets.
+
+Each image is re-encoded a few ways in a worker pool and the smallest
+candidate that is both smaller than the file on disk and visually within
+tolerance replaces it:
+
+    PNG   optimize=True (lossless), and a 256-colour palette quantization
+          kept only if its PSNR against the original is >= --min-psnr
+    JPEG  progressive + optimized Huffman tables, re-encoded with the
+          original quantization tables and subsampling (quality="keep"),
+          so the generational loss is far below the tolerance
+
+ICC profiles and EXIF are carried over. Every file's resulting content
+hash is recorded in .sitefix/optimize-cache.json, so a file that has been
+optimized (or found not to improve) is never processed again until its
+content changes.
+"""
+
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from PIL import Image, ImageChops, ImageStat
+
+from . import fingerprint
+from . import state
+from .paths import SKIP_DIRS
+
+CACHE_PATH = os.path.join(state.STATE_DIR, "optimize-cache.json")
+CACHE_VERSION = 1
+
+DEFAULT_DIRS = ("assets/uploads", "images")
+EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+# Default tolerance: 40 dB PSNR is below visible difference for these
+# logos and photos at their display sizes
+DEFAULT_MIN_PSNR = 40.0
+# Ignore wins smaller than this (bytes), not worth a changed file in git
+MIN_SAVING = 512
+
+
+def iter_images(root, dirs=DEFAULT_DIRS):
+    """Yield repository-relative PNG/JPEG paths under dirs"""
+    for top in dirs:
+        for dirpath, dirnames, filenames in os.walk(os.path.join(root, top)):
+            dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS)
+            for filename in sorted(filenames):
+                if filename.lower().endswith(EXTENSIONS):
+                    path = os.path.join(dirpath, filename)
+                    yield os.path.relpath(path, root).replace(os.sep, "/")
+
+
+def psnr(a, b):
+    """Peak signal-to-noise ratio (dB) between two same-size images"""
+    mode = "RGBA" if "A" in a.mode or "A" in b.mode else "RGB"
+    diff = ImageChops.difference(a.convert(mode), b.convert(mode))
+    mse = sum(rms * rms for rms in ImageStat.Stat(diff).rms) / len(mode)
+    return float("inf") if mse == 0 else 20 * math.log10(255 / math.sqrt(mse))
+
+
+def save_options(img):
+    """Metadata to carry over into a re-encoded file"""
+    options = {}
+    for key in ("icc_profile", "exif", "dpi"):
+        if img.info.get(key):
+            options[key] = img.info[key]
+    return options
+
+
+def png_candidates(img, min_psnr):
+    """[(method, bytes)] for a PNG"""
+    options = save_options(img)
+    if "transparency" in img.info:
+        options["transparency"] = img.info["transparency"]
+    candidates = []
+
+    buffer = BytesIO()
+    img.save(buffer, "PNG", optimize=True, **options)
+    candidates.append(("optimize", buffer.getvalue()))
+
+    if img.mode not in ("P", "1", "L"):
+        source = img.convert("RGBA" if "A" in img.mode or "transparency" in img.info else "RGB")
+        method = Image.Quantize.FASTOCTREE if source.mode == "RGBA" else Image.Quantize.MEDIANCUT
+        quantized = source.quantize(colors=256, method=method)
+        quality = psnr(source, quantized)
+        if quality >= min_psnr:
+            options.pop("transparency", None)
+            buffer = BytesIO()
+            quantized.save(buffer, "PNG", optimize=True, **options)
+            candidates.append((f"palette ({quality:.1f} dB)", buffer.getvalue()))
+    return candidates
+
+
+def jpeg_candidates(img, min_psnr):
+    """[(method, bytes)] for a JPEG"""
+    buffer = BytesIO()
+    img.save(buffer, "JPEG", quality="keep", subsampling="keep", qtables="keep",
+             optimize=True, progressive=True, **save_options(img))
+    data = buffer.getvalue()
+    with Image.open(BytesIO(data)) as reencoded:
+        quality = psnr(img, reencoded)
+    if quality < min_psnr:
+        return []
+    return [(f"progressive ({quality:.1f} dB)" if quality != float("inf") else "progressive", data)]
+
+
+def optimize_file(root, rel_path, min_psnr, dry_run=False):
+    """
+    Worker unit: try every candidate for one image and keep the smallest
+    if it saves at least MIN_SAVING bytes. Returns
+    (rel_path, before, after, method or None, error).
+    """
+    path = os.path.join(root, rel_path)
+    try:
+        before = os.path.getsize(path)
+        with Image.open(path) as img:
+            img.load()
+            if img.format == "PNG":
+                candidates = png_candidates(img, min_psnr)
+            elif img.format == "JPEG":
+                candidates = jpeg_candidates(img, min_psnr)
+            else:
+                return rel_path, before, before, None, None
+    except (OSError, ValueError, SyntaxError) as e:
+        return rel_path, 0, 0, None, str(e)
+
+    if not candidates:
+        return rel_path, before, before, None, None
+    method, data = min(candidates, key=lambda candidate: len(candidate[1]))
+    if before - len(data) < MIN_SAVING:
+        return rel_path, before, before, None, None
+    if not dry_run:
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    return rel_path, before, len(data), method, None
+
+
+def load_cache(root):
+    return state.load_json(os.path.join(root, CACHE_PATH), CACHE_VERSION).get("files", {})
+
+
+def save_cache(root, files):
+    state.save_json(os.path.join(root, CACHE_PATH), {"version": CACHE_VERSION, "files": files})
+
+
+class OptimizeReport:
+    def __init__(self):
+        self.files = 0
+        self.cached = 0
+        self.optimized = []     # (rel_path, before, after, method)
+        self.unchanged = 0
+        self.errors = []
+        self.seconds = 0.0
+
+    def print_summary(self, verbose=False):
+        before = sum(row[1] for row in self.optimized)
+        after = sum(row[2] for row in self.optimized)
+        print("=" * 60)
+        print(f"Images: {self.files} ({self.cached} already processed)")
+        print(f"Optimized: {len(self.optimized)}")
+        if verbose:
+            for rel_path, old, new, method in self.optimized:
+                print(f"  ✓ {rel_path}: {old / 1024:.0f} KB -> {new / 1024:.0f} KB, {method}")
+        print(f"No improvement within tolerance: {self.unchanged}")
+        for rel_path, error in self.errors:
+            print(f"  ❌ {rel_path}: {error}")
+        if before:
+            print(f"Saved: {(before - after) / 1e6:.2f} MB "
+                  f"({before / 1e6:.2f} MB -> {after / 1e6:.2f} MB, {(1 - after / before) * 100:.0f}%)")
+        print(f"Time: {self.seconds:.1f} s")
+        print("=" * 60)
+
+
+def optimize(root, rel_paths=None, jobs=1, min_psnr=DEFAULT_MIN_PSNR, force=False, dry_run=False):
+    """Optimize rel_paths (default: every image under DEFAULT_DIRS)"""
+    report = OptimizeReport()
+    cache = load_cache(root)
+    rel_paths = list(rel_paths) if rel_paths else list(iter_images(root))
+    report.files = len(rel_paths)
+
+    todo = []
+    for rel_path in rel_paths:
+        entry = cache.get(rel_path)
+        if not force and entry and entry["min_psnr"] <= min_psnr \
+                and entry["hash"] == fingerprint.hash_file(os.path.join(root, rel_path)):
+            report.cached += 1
+            continue
+        todo.append(rel_path)
+
+    start = time.perf_counter()
+    args = ([root] * len(todo), todo, [min_psnr] * len(todo), [dry_run] * len(todo))
+    if jobs > 1 and len(todo) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(optimize_file, *args))
+    else:
+        results = list(map(optimize_file, *args))
+    report.seconds = time.perf_counter() - start
+
+    for rel_path, before, after, method, error in results:
+        if error:
+            # Cached too: an unreadable file is not retried until it changes
+            report.errors.append((rel_path, error))
+        elif method:
+            report.optimized.append((rel_path, before, after, method))
+        else:
+            report.unchanged += 1
+        if not dry_run:
+            cache[rel_path] = {"hash": fingerprint.hash_file(os.path.join(root, rel_path)),
+                               "min_psnr": min_psnr, "before": before, "after": after,
+                               "method": method, "error": error}
+    if not dry_run:
+        save_cache(root, cache)
+    return report
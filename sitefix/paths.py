@@ -0,0 +1,85 @@
+"""
+paths.py
+
+Resolve URLs found in pages to files in the repository.
+
+The site is served from https://freeforcharity.github.io/FFC-EX-SRRN.net/,
+so pages mix three styles of local reference:
+
+    /FFC-EX-SRRN.net/assets/uploads/...   (repo-absolute)
+    /assets/uploads/...                   (domain-root, as scraped)
+    ../assets/uploads/...                 (page-relative)
+"""
+
+import posixpath
+from urllib.parse import unquote
+
+REPO_NAME = "/FFC-EX-SRRN.net/"
+
+# Directories that never contain site pages or assets
+SKIP_DIRS = {".git", ".github", ".sitefix", "node_modules", "__pycache__"}
+
+# URL prefixes that never point at a local file
+EXTERNAL_PREFIXES = ("http:", "https:", "//", "data:", "mailto:", "tel:", "javascript:", "#", "about:")
+
+
+def split_url(url):
+    """Split a URL into (path, query, fragment); query and fragment keep their ? and #"""
+    fragment = ""
+    if "#" in url:
+        url, fragment = url.split("#", 1)
+        fragment = "#" + fragment
+    query = ""
+    if "?" in url:
+        url, query = url.split("?", 1)
+        query = "?" + query
+    return url, query, fragment
+
+
+def is_external(url):
+    """True if url points off-site or is not a file reference at all"""
+    return url.strip().lower().startswith(EXTERNAL_PREFIXES)
+
+
+def resolve(page_rel_path, url, decode=True):
+    """
+    Resolve url, as written in the page at page_rel_path, to a
+    repository-relative posix path. Returns None for external URLs and for
+    paths that climb out of the repository. decode=False keeps %-escapes,
+    for files saved by the scraper with escapes in their names.
+    """
+    url = url.strip()
+    if not url or is_external(url):
+        return None
+    path = split_url(url)[0]
+    if decode:
+        path = unquote(path)
+    if not path:
+        return None
+
+    if path.startswith(REPO_NAME):
+        joined = path[len(REPO_NAME):]
+    elif path.startswith("/"):
+        joined = path[1:]
+    else:
+        joined = posixpath.join(posixpath.dirname(page_rel_path), path)
+
+    resolved = posixpath.normpath(joined) if joined else "."
+    if resolved == ".." or resolved.startswith("../"):
+        return None
+    return resolved
+
+
+def parse_srcset(value):
+    """Split a srcset attribute into [(url, descriptor), ...]"""
+    candidates = []
+    for entry in value.split(","):
+        parts = entry.strip().split(None, 1)
+        if parts:
+            candidates.append((parts[0], parts[1] if len(parts) > 1 else ""))
+    return candidates
+
+
+def format_srcset(candidates):
+    """Inverse of parse_srcset"""
+    return ", ".join(f"{url} {descriptor}".strip() for url, descriptor in candidates)
@@ -0,0 +1,334 @@
+"""
+purge.py
+
+Drop CSS rules that can never match anything on the site.
+
+A usage index is built once from every HTML page: each tag, class, id and
+attribute name that appears anywhere (including <noscript> and <template>
+content), plus every word in the string literals of the site's scripts -
+inline blocks, every local script a page loads through <script src>
+(Divi's scripts.min.js, the MEC and YouTube-embed plugins, bundles) and
+custom-menu.js and fix_toggles.js - since any of those may add it at
+runtime (``addClass("et_mobile_device")``). A literal that ends in - or _
+(``"et_pb_bg_layout_" + value``) names every class it starts, one that
+starts with one (``"_phone"``) every class it ends. A selector can
+never match if one of its compounds needs a tag, class, id or attribute
+the index does not know, e.g. ``.et_pb_slider .et-pb-arrow-next`` on a
+site without sliders. Names inside :not() are not required (a missing
+class makes :not() true), :is()/:where()/:has() need one possible
+alternative, and :hover-style states count as possible.
+
+Classes that library code builds in ways no literal shows, or that come
+from scripts loaded by other scripts - Divi's et_pb_toggle_open,
+MediaElement's mejs-*, Magnific Popup's mfp-* - are kept through an
+allowlist of fnmatch patterns (ALLOWLIST, extended with ``--allow``).
+
+A rule is dropped when none of its selectors is possible; otherwise the
+impossible selectors are removed from its list - unless the list has a
+vendor-prefixed pseudo (``::-moz-selection``), which makes browsers that
+do not know it drop the whole rule. Group rules left empty are dropped.
+@font-face, @keyframes and every other at-rule are kept, and so are rules
+whose selectors cannot be parsed. Files are rewritten only when something
+was dropped; /*! license */ comments are carried over. css/custom-fixes.css
+is only purged when named on the command line.
+"""
+
+import fnmatch
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from . import paths
+from . import stylesheet
+from .cssmatch import LOGICAL_PSEUDO_CLASSES, SelectorError, parse_selector_list
+from .engine import iter_pages
+from .htmlstream import iter_chunks, tokenize
+from .paths import SKIP_DIRS
+
+# Scripts scanned even if no page loads them through <script src>
+JS_SOURCES = ("custom-menu.js", "fix_toggles.js")
+# Shortest literal fragment ("et_pb_", "-phone") taken as a class prefix or suffix
+FRAGMENT_MIN_LENGTH = 4
+
+ALLOWLIST = (
+    # Divi states toggled by its scripts
+    "et_pb_toggle_open", "et_pb_toggle_close", "et-fixed-header", "et_pb_sticky*",
+    "et-animated", "et_animated", "et-waypoint", "et_pb_animation_*",
+    "et-pb-active-slide", "et-pb-moved-slide", "et_pb_tab_active",
+    # Markup built by libraries at runtime
+    "mfp-*", "mejs-*", "lity*", "featherlight*", "select2*", "tooltipster*", "nice-select*",
+    # Attributes scripts set
+    "aria-*", "style", "open",
+)
+
+# Hand-maintained, and styles markup later stages add (youtube-facade):
+# purged only when named explicitly
+EXCLUDE = ("css/custom-fixes.css",)
+
+# Present in every DOM even when missing from the markup
+IMPLIED_TAGS = {"html", "head", "body", "tbody"}
+
+STRING_RE = re.compile(r'"((?:[^"\\\n]|\\.)*)"|\'((?:[^\'\\\n]|\\.)*)\'|`([^`]*)`')
+WORD_RE = re.compile(r'-?[A-Za-z_][\w-]*')
+LICENSE_COMMENT_RE = re.compile(r'/\*!.*?\*/', re.DOTALL)
+
+
+def iter_stylesheets(root):
+    """Yield the repository-relative path of every .css file under root but EXCLUDE"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS)
+        for filename in sorted(filenames):
+            if filename.lower().endswith(".css"):
+                rel_path = os.path.relpath(os.path.join(dirpath, filename), root).replace(os.sep, "/")
+                if rel_path not in EXCLUDE:
+                    yield rel_path
+
+
+def local_script(root, page_rel_path, src):
+    """Repository-relative path of the local file a <script src> loads, or None"""
+    for decode in (True, False):
+        rel_path = paths.resolve(page_rel_path, src or "", decode=decode)
+        if rel_path and os.path.isfile(os.path.join(root, rel_path)):
+            return rel_path
+    return None
+
+
+def scan_page(root, path):
+    """
+    (tags, classes, ids, attribute names, local scripts loaded, words in
+    inline scripts) of one page
+    """
+    tags, classes, ids, attrs, scripts = set(), set(), set(), set(), set()
+    inline = []
+    rel_path = os.path.relpath(path, root).replace(os.sep, "/")
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        content = f.read()
+    in_script = False
+    for token in tokenize(iter_chunks(content)):
+        if in_script:
+            if token.kind == "endtag" and token.tag == "script":
+                in_script = False
+            else:
+                inline.append(token.raw)
+            continue
+        if not token.is_start:
+            continue
+        tags.add(token.tag)
+        for name, value in token.attrs:
+            attrs.add(name)
+            if name == "class" and value:
+                classes.update(value.split())
+            elif name == "id" and value:
+                ids.add(value)
+        if token.tag == "script" and token.kind == "starttag":
+            script = local_script(root, rel_path, token.get("src")) if token.has("src") else None
+            if script:
+                scripts.add(script)
+            in_script = not token.has("src")
+    return tags, classes, ids, attrs, scripts, literal_words("".join(inline))
+
+
+def literal_words(text):
+    """Every identifier-like word in the string literals of script text"""
+    words = set()
+    for m in STRING_RE.finditer(text):
+        literal = next(group for group in m.groups() if group is not None)
+        words.update(WORD_RE.findall(literal))
+    return words
+
+
+def script_words(path):
+    """Every identifier-like word in the string literals of a script"""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        return literal_words(f.read())
+
+
+class UsageIndex:
+    """Names the site's markup and scripts can ever put in the DOM"""
+
+    def __init__(self, allowlist=ALLOWLIST):
+        self.tags = set(IMPLIED_TAGS)
+        self.classes = set()
+        self.ids = set()
+        self.attrs = set()
+        self.allowlist = list(allowlist)
+        self.prefixes = ()
+        self.suffixes = ()
+        self.pages = 0
+        self.scripts = []
+
+    def add_words(self, words):
+        """Names a script may put in the DOM, as a class, id, attribute or tag"""
+        self.classes |= words
+        self.ids |= words
+        self.attrs |= words
+        self.tags |= {word.lower() for word in words}
+        fragments = [word for word in words if len(word) >= FRAGMENT_MIN_LENGTH]
+        self.prefixes += tuple(word for word in fragments if word[-1] in "-_")
+        self.suffixes += tuple(word for word in fragments if word[0] in "-_")
+
+    def scan(self, root, jobs=1, scripts=JS_SOURCES):
+        pages = list(iter_pages(root))
+        if jobs > 1 and len(pages) > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                results = list(executor.map(scan_page, [root] * len(pages), pages, chunksize=8))
+        else:
+            results = [scan_page(root, path) for path in pages]
+        loaded = set(scripts)
+        inline = set()
+        for tags, classes, ids, attrs, page_scripts, words in results:
+            self.tags |= tags
+            self.classes |= classes
+            self.ids |= ids
+            self.attrs |= attrs
+            loaded |= page_scripts
+            inline |= words
+            self.pages += 1
+        self.add_words(inline)
+        for rel_path in sorted(loaded):
+            path = os.path.join(root, rel_path)
+            if os.path.exists(path):
+                self.add_words(script_words(path))
+                self.scripts.append(rel_path)
+        self.prefixes = tuple(sorted(set(self.prefixes)))
+        self.suffixes = tuple(sorted(set(self.suffixes)))
+        return self
+
+    def allowed(self, name):
+        return name.startswith(self.prefixes) or name.endswith(self.suffixes) \
+            or any(fnmatch.fnmatchcase(name, pattern) for pattern in self.allowlist)
+
+    def knows(self, names, name):
+        return name in names or self.allowed(name)
+
+    def compound_possible(self, compound):
+        if compound.tag is not None and not self.knows(self.tags, compound.tag):
+            return False
+        if not all(self.knows(self.ids, id_) for id_ in compound.ids):
+            return False
+        if not all(self.knows(self.classes, cls) for cls in compound.classes):
+            return False
+        if not all(self.knows(self.attrs, name) for name, _, _, _ in compound.attrs):
+            return False
+        for name, argument in compound.pseudos:
+            if name in LOGICAL_PSEUDO_CLASSES and name != "not":
+                if not any(self.possible(selector) for selector in argument):
+                    return False
+            elif name == "has":
+                if not any(self.possible(selector) for _, selector in argument):
+                    return False
+        return True
+
+    def possible(self, selector):
+        """False if selector can never match anything on the site"""
+        return all(self.compound_possible(compound) for _, compound in selector.parts)
+
+
+def purge_rules(rules, index):
+    """(kept rules, number of style rules dropped or trimmed)"""
+    kept = []
+    dropped = 0
+    for rule in rules:
+        if isinstance(rule, stylesheet.Rule):
+            try:
+                selectors = parse_selector_list(rule.selector)
+            except SelectorError:
+                kept.append(rule)
+                continue
+            possible = [selector for selector in selectors if index.possible(selector)]
+            if not possible:
+                dropped += 1
+            elif len(possible) == len(selectors) or any(":-" in selector.text for selector in selectors):
+                kept.append(rule)
+            else:
+                kept.append(stylesheet.Rule(",".join(selector.text for selector in possible), rule.declarations))
+                dropped += 1
+        elif rule.rules is not None:
+            children, count = purge_rules(rule.rules, index)
+            dropped += count
+            if children:
+                kept.append(stylesheet.AtRule(rule.name, rule.prelude, rules=children))
+        else:
+            kept.append(rule)
+    return kept, dropped
+
+
+def count_rules(rules):
+    return sum(count_rules(rule.rules) if isinstance(rule, stylesheet.AtRule) and rule.rules is not None
+               else isinstance(rule, stylesheet.Rule) for rule in rules)
+
+
+def purge_file(root, rel_path, index, dry_run=False):
+    """(before bytes, after bytes, style rules, rules dropped or trimmed)"""
+    path = os.path.join(root, rel_path)
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        text = f.read()
+    before = len(text.encode("utf-8"))
+    rules = stylesheet.parse(text)
+    kept, dropped = purge_rules(rules, index)
+    if not dropped:
+        return before, before, count_rules(rules), 0
+    licenses = LICENSE_COMMENT_RE.findall(text)
+    purged = ("\n".join(licenses) + "\n" if licenses else "") + stylesheet.serialize(kept) + "\n"
+    after = len(purged.encode("utf-8"))
+    if not dry_run:
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+            f.write(purged)
+        os.replace(tmp_path, path)
+    return before, after, count_rules(rules), dropped
+
+
+class PurgeReport:
+    def __init__(self):
+        self.index = None
+        self.files = []         # (rel_path, before, after, rules, dropped)
+        self.errors = []
+        self.seconds = 0.0
+
+    def print_summary(self, verbose=False):
+        before = sum(row[1] for row in self.files)
+        after = sum(row[2] for row in self.files)
+        changed = sorted((row for row in self.files if row[4]), key=lambda row: row[2] - row[1])
+        print("=" * 60)
+        print(f"Usage index: {self.index.pages} pages, {len(self.index.scripts)} scripts: "
+              f"{len(self.index.tags)} tags, {len(self.index.classes)} classes, "
+              f"{len(self.index.ids)} ids, {len(self.index.attrs)} attributes, "
+              f"{len(self.index.prefixes)} prefixes, {len(self.index.suffixes)} suffixes")
+        if verbose:
+            for rel_path in self.index.scripts:
+                print(f"    script: {rel_path}")
+        print(f"Stylesheets: {len(self.files)} ({len(changed)} with rules that never match)")
+        for rel_path, old, new, rules, dropped in changed:
+            print(f"  ✓ {rel_path}: {old / 1024:.1f} KB -> {new / 1024:.1f} KB, "
+                  f"{dropped} of {rules} rules dropped or trimmed")
+        if verbose:
+            for rel_path, old, _, rules, dropped in self.files:
+                if not dropped:
+                    print(f"    {rel_path}: {old / 1024:.1f} KB, all {rules} rules can match")
+        for rel_path, error in self.errors:
+            print(f"  ❌ {rel_path}: {error}")
+        if before:
+            print(f"Saved: {(before - after) / 1e6:.2f} MB "
+                  f"({before / 1e6:.2f} MB -> {after / 1e6:.2f} MB, {(1 - after / before) * 100:.0f}%)")
+        print(f"Time: {self.seconds:.1f} s")
+        print("=" * 60)
+
+    def as_json(self):
+        return {"files": {rel_path: {"before": old, "after": new, "rules": rules, "dropped": dropped}
+                          for rel_path, old, new, rules, dropped in self.files}}
+
+
+def purge(root, rel_paths=None, jobs=1, allow=(), dry_run=False):
+    """Purge rel_paths (default: every stylesheet under root)"""
+    report = PurgeReport()
+    start = time.perf_counter()
+    report.index = UsageIndex(ALLOWLIST + tuple(allow)).scan(root, jobs)
+    for rel_path in rel_paths or iter_stylesheets(root):
+        try:
+            report.files.append((rel_path, *purge_file(root, rel_path, report.index, dry_run)))
+        except (OSError, UnicodeDecodeError) as e:
+            report.errors.append((rel_path, str(e)))
+    report.seconds = time.perf_counter() - start
+    return report
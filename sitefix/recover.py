@@ -0,0 +1,79 @@
+"""
+recover.py
+
+Recover missing assets from the live WordPress origin.
+
+Takes the missing-asset list from the reference report (or explicit
+repository-relative paths), maps each local path back to the URL it was
+mirrored from and downloads them concurrently through fetch.Downloader
+and the shared HTTP cache.
+
+    assets/uploads/2021/09/a.jpg      -> <origin>/wp-content/uploads/2021/09/a.jpg
+    wp-includes/js/jquery.min_ver=3.js -> <origin>/wp-includes/js/jquery.min.js?ver=3
+
+The origin is configurable, so a local stand-in (python3 -m http.server)
+can be used to test the whole flow offline.
+"""
+
+import os
+import re
+
+from . import refindex
+from .fetch import Downloader
+
+ORIGIN = "https://srrn.net"
+
+# Local directory prefix -> path on the origin
+ORIGIN_PATHS = {
+    "assets/uploads/": "wp-content/uploads/",
+    "assets/plugins/": "wp-content/plugins/",
+    "assets/themes/": "wp-content/themes/",
+    "assets/et-cache/": "wp-content/et-cache/",
+    "wp-content/": "wp-content/",
+    "wp-includes/": "wp-includes/",
+}
+
+# The mirroring tool saved "x.min.js?ver=1.2" as "x.min_ver=1.2.js"
+MANGLED_QUERY_RE = re.compile(r"^(.*)_((?:v|ver)=[^/]*?)(\.[A-Za-z0-9]+)$")
+
+
+def origin_url(rel_path, origin=ORIGIN):
+    """URL a local asset was mirrored from, or None if it has no origin path"""
+    for local, remote in ORIGIN_PATHS.items():
+        if rel_path.startswith(local):
+            path = remote + rel_path[len(local):]
+            break
+    else:
+        return None
+    m = MANGLED_QUERY_RE.match(path)
+    if m:
+        path = f"{m.group(1)}{m.group(3)}?{m.group(2)}"
+    return f"{origin.rstrip('/')}/{path}"
+
+
+def plan(root, rel_paths, origin=ORIGIN):
+    """([(url, dest), ...], unmapped rel_paths)"""
+    jobs, unmapped = [], []
+    for rel_path in dict.fromkeys(rel_paths):
+        url = origin_url(rel_path, origin)
+        if url is None:
+            unmapped.append(rel_path)
+        else:
+            jobs.append((url, os.path.join(root, rel_path.replace("/", os.sep))))
+    return jobs, unmapped
+
+
+def missing_from_report(root, report_path=None, jobs=1):
+    """Missing asset paths from a saved report, indexing the site if there is none"""
+    report = refindex.load_report(report_path or os.path.join(root, refindex.REPORT_PATH))
+    if not report:
+        report = refindex.build_report(root, jobs=jobs)
+    return refindex.missing_assets(report)
+
+
+def recover(root, rel_paths, origin=ORIGIN, concurrency=8, retries=3, revalidate=True, cache=None):
+    """Download rel_paths from the origin; returns (results, unmapped)"""
+    jobs, unmapped = plan(root, rel_paths, origin)
+    with Downloader(root, concurrency=concurrency, retries=retries, cache=cache) as downloader:
+        results = downloader.fetch_all(jobs, revalidate=revalidate)
+    return results, unmapped
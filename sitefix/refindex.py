@@ -0,0 +1,232 @@
+"""
+refindex.py
+
+Site-wide reference index and missing-asset / broken-link report.
+
+One pass over every HTML page and stylesheet extracts each local
+reference - src, href, srcset candidates, poster, inline style and
+<style> url(), and url()/@import in CSS files - together with the ids each
+page defines. Every reference is then resolved against a snapshot of the
+file tree:
+
+    missing           the target file does not exist
+    broken-fragment   the target page exists but has no matching id/name
+
+The report is written as JSON (default .sitefix/reference-report.json) so
+the recovery tools can take the missing-asset list as input.
+"""
+
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from . import engine
+from . import paths
+from . import state
+from .htmlstream import tokenize, iter_chunks
+from .paths import SKIP_DIRS
+
+REPORT_PATH = os.path.join(state.STATE_DIR, "reference-report.json")
+REPORT_VERSION = 1
+
+URL_ATTRS = {"src", "href", "poster", "data-src", "action"}
+SRCSET_ATTRS = {"srcset", "data-srcset"}
+# <a href> and friends point at pages; everything else is an asset
+PAGE_LINK_TAGS = {"a", "area", "form"}
+# <link rel=...> values that load a file (canonical, alternate, ... are page links)
+LINK_ASSET_RELS = {"stylesheet", "icon", "shortcut", "apple-touch-icon", "preload", "prefetch", "modulepreload", "manifest"}
+
+CSS_URL_RE = re.compile(r'url\(\s*([\'"]?)([^\'")]*)\1\s*\)', re.IGNORECASE)
+CSS_IMPORT_RE = re.compile(r'@import\s+([\'"])([^\'"]+)\1', re.IGNORECASE)
+
+
+def css_references(css):
+    """[(kind, url), ...] for url() and @import in a stylesheet"""
+    refs = [("css-url", m.group(2)) for m in CSS_URL_RE.finditer(css)]
+    refs.extend(("css-import", m.group(2)) for m in CSS_IMPORT_RE.finditer(css))
+    return refs
+
+
+def reference_kind(token, attr):
+    """"link" for references to pages, otherwise the attribute name"""
+    if token.tag in PAGE_LINK_TAGS:
+        return "link"
+    if token.tag == "link" and not LINK_ASSET_RELS.intersection((token.get("rel") or "").lower().split()):
+        return "link"
+    return attr
+
+
+def scan_html(text):
+    """Return (refs, ids) for a page; refs are (kind, url) pairs"""
+    refs = []
+    ids = set()
+    in_style = False
+    for token in tokenize(iter_chunks(text)):
+        if token.is_start:
+            for name, value in token.attrs:
+                if value is None:
+                    continue
+                if name in ("id", "name") and (name == "id" or token.tag == "a"):
+                    ids.add(value)
+                elif name in URL_ATTRS:
+                    refs.append((reference_kind(token, name), value))
+                elif name in SRCSET_ATTRS:
+                    refs.extend(("srcset", url) for url, _ in paths.parse_srcset(value))
+                elif name == "style" and "url(" in value:
+                    refs.extend(css_references(value))
+            in_style = token.tag == "style" and token.kind == "starttag"
+        elif token.kind == "endtag":
+            in_style = False
+        elif in_style and token.kind == "data":
+            refs.extend(css_references(token.raw))
+    return refs, ids
+
+
+def scan_file(root, rel_path):
+    """Worker unit: extract references (and ids, for pages) from one file"""
+    path = os.path.join(root, rel_path)
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace", newline="") as f:
+            text = f.read()
+    except OSError as e:
+        return rel_path, [], set(), str(e)
+    if rel_path.lower().endswith(".css"):
+        return rel_path, css_references(text), set(), None
+    refs, ids = scan_html(text)
+    return rel_path, refs, ids, None
+
+
+def scan_chunk(root, chunk):
+    return [scan_file(root, rel_path) for rel_path in chunk]
+
+
+def snapshot(root):
+    """(files, dirs): every repository-relative file and directory path"""
+    files, dirs = set(), {"."}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS]
+        rel_dir = os.path.relpath(dirpath, root).replace(os.sep, "/")
+        prefix = "" if rel_dir == "." else rel_dir + "/"
+        for d in dirnames:
+            dirs.add(prefix + d)
+        for filename in filenames:
+            files.add(prefix + filename)
+    return files, dirs
+
+
+def locate(target, files, dirs):
+    """The file a resolved path is served from, or None"""
+    if target in files:
+        return target
+    if target in dirs:
+        index = "index.html" if target == "." else f"{target}/index.html"
+        return index if index in files else None
+    if f"{target}.html" in files:
+        return f"{target}.html"
+    return None
+
+
+class ReferenceIndex:
+    """All references in the site, resolved against the file tree"""
+
+    def __init__(self, root):
+        self.root = root
+        self.files, self.dirs = snapshot(root)
+        self.refs = {}          # source rel_path -> [(kind, url), ...]
+        self.ids = {}           # page rel_path -> set of ids
+        self.errors = []
+
+    def sources(self):
+        return sorted(p for p in self.files if p.lower().endswith((".html", ".css")))
+
+    def scan(self, jobs=1):
+        """Extract references from every page and stylesheet"""
+        sources = self.sources()
+        if jobs > 1 and len(sources) > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                futures = [executor.submit(scan_chunk, self.root, chunk)
+                           for chunk in engine.chunked(sources, jobs)]
+                results = [result for future in futures for result in future.result()]
+        else:
+            results = scan_chunk(self.root, sources)
+        for rel_path, refs, ids, error in results:
+            self.refs[rel_path] = refs
+            if rel_path.lower().endswith(".html"):
+                self.ids[rel_path] = ids
+            if error:
+                self.errors.append((rel_path, error))
+        return self
+
+    def check(self, source, url):
+        """(status, target, fragment) for one reference; status None if external"""
+        url = url.strip()
+        if not url or (paths.is_external(url) and not url.startswith("#")):
+            return None, None, None
+        fragment = paths.split_url(url)[2][1:]
+        if url.startswith("#"):
+            target = source
+        else:
+            resolved = paths.resolve(source, url)
+            if resolved is None:
+                return "missing", url, fragment
+            target = locate(resolved, self.files, self.dirs)
+            if target is None:
+                raw = paths.resolve(source, url, decode=False)
+                target = locate(raw, self.files, self.dirs) if raw != resolved else None
+            if target is None:
+                return "missing", resolved, fragment
+        if fragment and target in self.ids and fragment not in self.ids[target]:
+            return "broken-fragment", target, fragment
+        return "ok", target, fragment
+
+    def report(self):
+        """Machine-readable summary of missing targets and broken fragments"""
+        missing = {}
+        broken = []
+        counts = {"references": 0, "external": 0, "ok": 0, "missing": 0, "broken-fragment": 0}
+        for source in sorted(self.refs):
+            for kind, url in self.refs[source]:
+                counts["references"] += 1
+                status, target, fragment = self.check(source, url)
+                if status is None:
+                    counts["external"] += 1
+                    continue
+                counts[status] += 1
+                if status == "missing":
+                    entry = missing.setdefault(target, {"target": target, "kinds": set(), "sources": set()})
+                    entry["kinds"].add(kind)
+                    entry["sources"].add(source)
+                elif status == "broken-fragment":
+                    broken.append({"source": source, "url": url, "target": target, "fragment": fragment})
+
+        missing_list = []
+        for target in sorted(missing):
+            entry = missing[target]
+            missing_list.append({
+                "target": target,
+                "type": "page" if entry["kinds"] == {"link"} else "asset",
+                "kinds": sorted(entry["kinds"]),
+                "sources": sorted(entry["sources"]),
+            })
+        counts["missing-targets"] = len(missing_list)
+        return {
+            "version": REPORT_VERSION,
+            "summary": counts,
+            "missing": missing_list,
+            "broken_fragments": broken,
+            "errors": [{"source": s, "error": e} for s, e in self.errors],
+        }
+
+
+def build_report(root, jobs=1):
+    return ReferenceIndex(root).scan(jobs).report()
+
+
+def load_report(path):
+    """Load a saved report ({} if missing)"""
+    return state.load_json(path, REPORT_VERSION)
+
+
+def missing_assets(report):
+    """Repository-relative paths of missing asset (non-page) targets"""
+    return [entry["target"] for entry in report.get("missing", []) if entry["type"] == "asset"]
@@ -0,0 +1,112 @@
+"""
+replacer.py
+
+Multi-pattern string replacement in a single scan.
+
+A replacement table {old: new} is compiled into one regular expression
+whose alternatives are factored into a trie (a prefix-sharing automaton),
+so each page is scanned once, left to right, instead of once per entry.
+Matching is leftmost-longest: at the first position where any key
+matches, the longest matching key wins. Replacements are never re-scanned,
+so the output of one entry cannot be matched by another.
+
+When every key shares a literal substring of at least ANCHOR_MIN_LENGTH
+characters (e.g. "srrn.net/"), the scan jumps between occurrences of that
+anchor with str.find and only runs the automaton in a small window before
+each one, which keeps tables that start with common letters fast.
+
+    replacer = Replacer({"wp-content/uploads": "assets/uploads"})
+    content = replacer.replace(content)
+"""
+
+import re
+
+ANCHOR_MIN_LENGTH = 4
+
+
+def _node_pattern(node):
+    """Regex for a trie node; greedy optionals make the longest key win"""
+    branches = [re.escape(ch) + _node_pattern(child) for ch, child in sorted(node.items()) if ch]
+    if not branches:
+        return ""
+    if "" in node:
+        return "(?:" + "|".join(branches) + ")?"
+    if len(branches) == 1:
+        return branches[0]
+    return "(?:" + "|".join(branches) + ")"
+
+
+def trie_pattern(keys):
+    """Build a regex source matching any of keys, factored by common prefix"""
+    trie = {}
+    for key in keys:
+        if not key:
+            raise ValueError("Replacement keys must be non-empty")
+        node = trie
+        for ch in key:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+    return _node_pattern(trie)
+
+
+def common_substring(keys):
+    """Longest substring present in every key ("" if none)"""
+    shortest = min(keys, key=len)
+    for length in range(len(shortest), 0, -1):
+        for start in range(len(shortest) - length + 1):
+            candidate = shortest[start:start + length]
+            if all(candidate in key for key in keys):
+                return candidate
+    return ""
+
+
+class Replacer:
+    """A replacement table compiled for one-pass, leftmost-longest rewriting"""
+
+    def __init__(self, table):
+        self.table = dict(table)
+        self.regex = re.compile(trie_pattern(self.table)) if self.table else None
+        self.anchor = common_substring(self.table) if self.table else ""
+        if len(self.anchor) < ANCHOR_MIN_LENGTH:
+            self.anchor = ""
+        # Furthest the anchor can sit from the start of a match
+        self.max_offset = max((key.index(self.anchor) for key in self.table), default=0)
+
+    def _dispatch(self, match):
+        return self.table[match.group(0)]
+
+    def replace(self, text):
+        """Return text with every table key replaced in one linear scan"""
+        if self.regex is None:
+            return text
+        if not self.anchor:
+            return self.regex.sub(self._dispatch, text)
+        return self._replace_anchored(text)
+
+    def _replace_anchored(self, text):
+        """Same result as regex.sub, but only tries matches near the anchor"""
+        anchor, match, table = self.anchor, self.regex.match, self.table
+        out = []
+        pos = 0
+        i = text.find(anchor)
+        while i >= 0:
+            # Leftmost first: any match containing this occurrence starts
+            # at most max_offset characters before it
+            for start in range(max(pos, i - self.max_offset), i + 1):
+                m = match(text, start)
+                if m:
+                    out.append(text[pos:start])
+                    out.append(table[m.group(0)])
+                    pos = m.end()
+                    break
+            i = text.find(anchor, max(pos, i + 1))
+        if not out:
+            return text
+        out.append(text[pos:])
+        return "".join(out)
+
+    def __len__(self):
+        return len(self.table)
+
+    def __repr__(self):
+        return f"Replacer({len(self.table)} entries)"
@@ -0,0 +1,297 @@
+"""
+responsive.py
+
+Generate the responsive image variants pages reference but the tree lacks.
+
+Every srcset (and src) across the site is taken from the reference index.
+Any reference following the WordPress naming convention
+
+    assets/uploads/2025/12/Talk-Today-2026-980x761.png
+                           <-- stem ----> <WxH> <ext>
+
+is a variant of a source image: the unsuffixed original, its -scaled
+copy, or failing those the largest existing variant of the same stem that
+is at least as big. Missing variants are generated in a process pool -
+each source is decoded once and all of its sizes derived from it, largest
+first - and recorded in .sitefix/responsive-manifest.json with the hash of
+the source they came from; a generated variant is only rebuilt when that
+source changes. Variants that shipped with the WordPress export are left
+alone.
+"""
+
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+from . import fingerprint
+from . import paths
+from . import refindex
+from . import state
+
+MANIFEST_PATH = os.path.join(state.STATE_DIR, "responsive-manifest.json")
+MANIFEST_VERSION = 1
+
+VARIANT_RE = re.compile(r"^(?P<stem>.+)-(?P<width>\d+)x(?P<height>\d+)(?P<ext>\.(?:jpe?g|png|gif|webp))$",
+                        re.IGNORECASE)
+
+JPEG_QUALITY = 90
+# Keep working copies at least this many times the target before the final
+# LANCZOS pass; beyond it, box-filter reduction is visually lossless
+REDUCING_GAP = 2.0
+
+
+def parse_variant(rel_path):
+    """(stem, width, height, ext) for a -WxH variant path, or None"""
+    m = VARIANT_RE.match(rel_path)
+    if not m:
+        return None
+    return m.group("stem"), int(m.group("width")), int(m.group("height")), m.group("ext")
+
+
+def sibling_index(files):
+    """{stem + ext: [(width, height, rel_path), ...]} for existing variants"""
+    siblings = {}
+    for rel_path in files:
+        parsed = parse_variant(rel_path)
+        if parsed:
+            stem, width, height, ext = parsed
+            siblings.setdefault(stem + ext, []).append((width, height, rel_path))
+    return siblings
+
+
+def find_source(stem, width, height, ext, files, siblings):
+    """Best existing image to derive a width x height variant from, or None"""
+    for candidate in (stem + ext, f"{stem}-scaled{ext}"):
+        if candidate in files:
+            return candidate
+    larger = [(w * h, rel_path) for w, h, rel_path in siblings.get(stem + ext, ())
+              if w >= width and h >= height and (w, h) != (width, height)]
+    return max(larger)[1] if larger else None
+
+
+def load_manifest(root):
+    return state.load_json(os.path.join(root, MANIFEST_PATH), MANIFEST_VERSION).get("variants", {})
+
+
+def save_manifest(root, variants):
+    state.save_json(os.path.join(root, MANIFEST_PATH), {"version": MANIFEST_VERSION, "variants": variants})
+
+
+class Plan:
+    """Variants to build, grouped by source"""
+
+    def __init__(self):
+        self.tasks = {}         # source rel_path -> [(variant rel_path, width, height), ...]
+        self.hashes = {}        # source rel_path -> hash
+        self.referenced = 0
+        self.unchanged = 0
+        self.existing = 0
+        self.unresolved = []    # variants with no usable source
+
+
+def plan(root, jobs=1, force=False):
+    """Work out which referenced variants need (re)building"""
+    index = refindex.ReferenceIndex(root).scan(jobs)
+    siblings = sibling_index(index.files)
+    manifest = load_manifest(root)
+    result = Plan()
+
+    variants = set()
+    for source_page, refs in index.refs.items():
+        for _, url in refs:
+            rel_path = paths.resolve(source_page, url)
+            if rel_path and parse_variant(rel_path):
+                variants.add(rel_path)
+    result.referenced = len(variants)
+
+    for rel_path in sorted(variants):
+        exists = rel_path in index.files
+        if exists and rel_path not in manifest:
+            result.existing += 1
+            continue
+        stem, width, height, ext = parse_variant(rel_path)
+        source = find_source(stem, width, height, ext, index.files, siblings)
+        if source is None:
+            result.unresolved.append(rel_path)
+            continue
+        if source not in result.hashes:
+            result.hashes[source] = fingerprint.hash_file(os.path.join(root, source))
+        if exists and not force and manifest[rel_path]["source_hash"] == result.hashes[source]:
+            result.unchanged += 1
+            continue
+        result.tasks.setdefault(source, []).append((rel_path, width, height))
+    return result
+
+
+def cover_box(src_width, src_height, width, height):
+    """Centered region of the source with the target's aspect ratio"""
+    source_ratio = src_width / src_height
+    target_ratio = width / height
+    if abs(source_ratio - target_ratio) < 0.01:
+        return (0, 0, src_width, src_height)
+    if source_ratio > target_ratio:
+        # Source is wider, keep full height
+        box_width = src_height * target_ratio
+        left = (src_width - box_width) / 2
+        return (left, 0, left + box_width, src_height)
+    # Source is taller, keep full width
+    box_height = src_width / target_ratio
+    top = (src_height - box_height) / 2
+    return (0, top, src_width, top + box_height)
+
+
+def open_source(path, largest):
+    """
+    Decode an image once, at the smallest scale that still covers the
+    largest requested (width, height). For JPEG, draft() lets the decoder
+    skip detail by 1/2, 1/4 or 1/8 scaling during the DCT. Returns the
+    image and the source's full size.
+    """
+    img = Image.open(path)
+    src_width, src_height = img.size
+    if img.format == "JPEG":
+        box = cover_box(src_width, src_height, *largest)
+        # Request the full frame at the scale the cropped box needs
+        scale = max(largest[0] / (box[2] - box[0]), largest[1] / (box[3] - box[1]))
+        # DCT scaling is a proper low-pass, so no REDUCING_GAP margin is needed
+        img.draft(img.mode, (int(src_width * scale) + 1, int(src_height * scale) + 1))
+    img.load()
+    if img.mode in ("P", "1"):
+        # Palette images would otherwise be resized with NEAREST
+        img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+    return img, (src_width, src_height)
+
+
+def derive_sizes(img, sizes, original_size=None):
+    """
+    Yield ((width, height), image) for every size, largest first, from one
+    decoded image. Between sizes the working copy is shrunk with
+    Image.reduce (a fast box filter) while it stays at least REDUCING_GAP
+    times the next target, and each output is a single LANCZOS resize of
+    its cover box, so no pass ever touches more pixels than it needs.
+    original_size is the undrafted size, for the crop geometry.
+    """
+    src_width, src_height = original_size or img.size
+    current = img
+    for width, height in sorted(set(sizes), key=lambda size: size[0] * size[1], reverse=True):
+        left, top, right, bottom = cover_box(src_width, src_height, width, height)
+        scale_x = current.width / src_width
+        scale_y = current.height / src_height
+        factor = int(min((right - left) * scale_x / width, (bottom - top) * scale_y / height) / REDUCING_GAP)
+        if factor >= 2:
+            current = current.reduce(factor)
+            scale_x = current.width / src_width
+            scale_y = current.height / src_height
+        box = (left * scale_x, top * scale_y, right * scale_x, bottom * scale_y)
+        yield (width, height), current.resize((width, height), Image.Resampling.LANCZOS, box=box)
+
+
+def save_image(img, path):
+    """Save in the format implied by path, atomically"""
+    ext = os.path.splitext(path)[1].lower()
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if ext in (".jpg", ".jpeg"):
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        img.save(tmp_path, "JPEG", quality=JPEG_QUALITY, optimize=True)
+    elif ext == ".webp":
+        img.save(tmp_path, "WEBP", quality=JPEG_QUALITY)
+    elif ext == ".gif":
+        img.save(tmp_path, "GIF")
+    else:
+        img.save(tmp_path, "PNG", optimize=True)
+    os.replace(tmp_path, path)
+
+
+def build_source(root, source, outputs):
+    """
+    Worker unit: decode one source once and write all of its variants.
+    Returns [(rel_path, width, height, bytes, error), ...] and the
+    source's pixel count.
+    """
+    sizes = {}
+    for rel_path, width, height in outputs:
+        sizes.setdefault((width, height), []).append(rel_path)
+    largest = max(sizes, key=lambda size: size[0] * size[1])
+    try:
+        img, original_size = open_source(os.path.join(root, source), largest)
+    except OSError as e:
+        return [(rel_path, width, height, 0, str(e)) for rel_path, width, height in outputs], 0
+
+    results = []
+    with img:
+        for (width, height), resized in derive_sizes(img, sizes, original_size):
+            for rel_path in sizes[(width, height)]:
+                try:
+                    output_path = os.path.join(root, rel_path)
+                    save_image(resized, output_path)
+                    results.append((rel_path, width, height, os.path.getsize(output_path), None))
+                except (OSError, ValueError) as e:
+                    results.append((rel_path, width, height, 0, str(e)))
+    return results, original_size[0] * original_size[1]
+
+
+class BuildReport:
+    """What a build produced and how fast"""
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.generated = []     # (rel_path, width, height, bytes)
+        self.errors = []        # (rel_path, error)
+        self.source_pixels = 0
+        self.seconds = 0.0
+
+    def print_summary(self, verbose=False):
+        plan = self.plan
+        print("=" * 60)
+        print(f"Referenced variants: {plan.referenced}")
+        print(f"Already present: {plan.existing + plan.unchanged} ({plan.unchanged} generated, source unchanged)")
+        print(f"Generated: {len(self.generated)}")
+        if verbose:
+            for rel_path, width, height, size in self.generated:
+                print(f"  ✓ {rel_path} ({width}x{height}, {size / 1024:.0f} KB)")
+        if plan.unresolved:
+            print(f"No source image: {len(plan.unresolved)}")
+            for rel_path in plan.unresolved if verbose else plan.unresolved[:5]:
+                print(f"  ? {rel_path}")
+        for rel_path, error in self.errors:
+            print(f"  ❌ {rel_path}: {error}")
+        if self.generated and self.seconds:
+            print(f"Throughput: {len(self.generated) / self.seconds:.1f} images/s, "
+                  f"{self.source_pixels / 1e6 / self.seconds:.1f} source MP/s")
+        print(f"Time: {self.seconds:.2f} s")
+        print("=" * 60)
+
+
+def build(root, jobs=1, force=False, dry_run=False):
+    """Plan and generate missing variants; returns a BuildReport"""
+    result = plan(root, jobs, force)
+    report = BuildReport(result)
+    if dry_run or not result.tasks:
+        return report
+
+    start = time.perf_counter()
+    sources = sorted(result.tasks)
+    if jobs > 1 and len(sources) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(build_source, root, source, result.tasks[source]) for source in sources]
+            outcomes = [future.result() for future in futures]
+    else:
+        outcomes = [build_source(root, source, result.tasks[source]) for source in sources]
+    report.seconds = time.perf_counter() - start
+
+    manifest = load_manifest(root)
+    for source, (results, pixels) in zip(sources, outcomes):
+        report.source_pixels += pixels
+        for rel_path, width, height, size, error in results:
+            if error:
+                report.errors.append((rel_path, error))
+                continue
+            report.generated.append((rel_path, width, height, size))
+            manifest[rel_path] = {"source": source, "source_hash": result.hashes[source],
+                                  "width": width, "height": height}
+    save_manifest(root, manifest)
+    return report
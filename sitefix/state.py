@@ -0,0 +1,102 @@
+"""
+state.py
+
+Persistent build state kept under .sitefix/.
+
+The build manifest records, for every page, the size, mtime and content
+hash seen after the last run plus the version of each transform applied
+to it. On the next run a page whose size and mtime are unchanged and
+whose recorded transform versions match is skipped after a single stat,
+without being read.
+"""
+
+import hashlib
+import json
+import os
+
+STATE_DIR = ".sitefix"
+BUILD_MANIFEST_PATH = os.path.join(STATE_DIR, "build-manifest.json")
+BUILD_MANIFEST_VERSION = 1
+
+
+def load_json(path, version):
+    """Load a versioned JSON state file; {} if missing, corrupt or outdated"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("version") != version:
+        return {}
+    return data
+
+
+def save_json(path, data):
+    """Write a JSON state file atomically (temp file + rename)"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def content_hash(content):
+    """sha256 of a page's text"""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def is_fresh(entry, st, versions):
+    """True if a page is untouched since entry was recorded with these versions"""
+    if not entry:
+        return False
+    if entry["size"] != st.st_size or entry["mtime_ns"] != st.st_mtime_ns:
+        return False
+    applied = entry["transforms"]
+    return all(applied.get(name) == version for name, version in versions.items())
+
+
+def pending(entry, content, versions):
+    """
+    Return (names, unchanged): the transforms that still need to run on
+    content - all of them if the page changed since entry was recorded,
+    otherwise only those whose version differs from the one recorded -
+    and whether the content matches the recorded hash.
+    """
+    if not entry or entry["hash"] != content_hash(content):
+        return list(versions), False
+    applied = entry["transforms"]
+    return [name for name, version in versions.items() if applied.get(name) != version], True
+
+
+def make_entry(entry, st, content, versions, carry_over):
+    """New manifest entry for a page; carry_over keeps versions from entry"""
+    applied = dict(entry["transforms"]) if entry and carry_over else {}
+    applied.update(versions)
+    return {
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "hash": content_hash(content),
+        "transforms": applied,
+    }
+
+
+class BuildManifest:
+    """Per-page record of content hash and applied transform versions"""
+
+    def __init__(self, root):
+        self.path = os.path.join(root, BUILD_MANIFEST_PATH)
+        self.pages = load_json(self.path, BUILD_MANIFEST_VERSION).get("pages", {})
+
+    def get(self, rel_path):
+        return self.pages.get(rel_path)
+
+    def set(self, rel_path, entry):
+        self.pages[rel_path] = entry
+
+    def prune(self, seen):
+        """Forget pages that no longer exist"""
+        for rel_path in set(self.pages) - set(seen):
+            del self.pages[rel_path]
+
+    def save(self):
+        save_json(self.path, {"version": BUILD_MANIFEST_VERSION, "pages": self.pages})
@@ -0,0 +1,418 @@
+"""
+styleclasses.py
+
+Replace repeated style="..." attributes with shared classes.
+
+Building (python3 -m sitefix style-classes): every style attribute of
+every page is normalised (declarations trimmed, property names
+lower-cased, relative url()s rebased to the site) and counted. A value
+used at least MIN_USES times gets a class named after its hash, sx-xxxxx,
+and one rule in css/style-attributes.css; the classes and what the site's
+CSS needs to keep them equivalent are recorded in
+.sitefix/style-classes.json.
+
+A style attribute beats every selector, so each rule is written to beat
+every selector on the site as well: ``.sx-xxxxx:not(#sx-):not(#sx-)``
+carries one ID more than the most ID-heavy selector found in any
+stylesheet or inline <style> block. !important author rules still win,
+as they did over the attribute, and a script setting a property on
+element.style still overrides the class - but a script clearing one
+(element.style.display = "", removeAttribute("style")) leaves the class
+rule in force. So values that set display or visibility, which scripts
+clear to show an element (WordPress's "Cancel reply" link), stay inline.
+So do values with !important: a script can clear an important inline
+declaration by setting the same property, but not an important class
+rule. So do attributes inside <noscript> and <template>, and values with
+a url() that cannot be rebased.
+
+Rewriting (the style-classes transform): each style attribute whose value
+has a class loses the attribute and gains the class, unless a selector
+on the site tests the style or class attribute in a way that would see
+the difference (``.mejs-controls:not([style*="display: none"])``,
+``[class^="et_pb"]``). The stylesheet is linked before </head> of every
+page that uses one of the classes. A class stays in the manifest as long
+as a page uses it; one whose value may no longer be a class is retired,
+and the transform turns it back into the style attribute.
+"""
+
+import hashlib
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from . import bundle
+from . import engine
+from . import fingerprint
+from . import hoist
+from . import paths
+from . import state
+from . import stylesheet
+from .cssmatch import Compound, Element, Matcher, SelectorError, parse_selector_list, split_top_level
+from .htmlstream import iter_chunks, tokenize
+from .transforms import transform
+
+MANIFEST_PATH = os.path.join(state.STATE_DIR, "style-classes.json")
+MANIFEST_VERSION = 1
+
+STYLESHEET = "css/style-attributes.css"
+CLASS_PREFIX = "sx-"
+# No element has this id, so :not() with it matches everything and only adds specificity
+NEVER_ID = "sx-"
+
+# A value becomes a class once used this many times
+MIN_USES = 2
+
+IMPORTANT_RE = re.compile(r'!\s*important', re.IGNORECASE)
+# Properties scripts clear to show an element, which a class rule would survive
+SCRIPT_TOGGLED_RE = re.compile(r'(?:^|;)(?:display|visibility):')
+ID_RE = re.compile(r'#[\w-]')
+CLASS_RE = re.compile(r'(?<![\w-])sx-[0-9a-z]+')
+
+HEADER = "/* Generated by python3 -m sitefix style-classes from repeated style attributes - do not edit */\n"
+
+# root -> manifest, loaded once per process
+_manifest_by_root = {}
+_conditions = {}
+
+
+def load_manifest(root):
+    return state.load_json(os.path.join(root, MANIFEST_PATH), MANIFEST_VERSION)
+
+
+def save_manifest(root, manifest):
+    state.save_json(os.path.join(root, MANIFEST_PATH), dict(manifest, version=MANIFEST_VERSION))
+
+
+def get_manifest(root):
+    root = os.path.abspath(root)
+    if root not in _manifest_by_root:
+        manifest = load_manifest(root)
+        _manifest_by_root[root] = {"classes": manifest.get("classes", {}), "retired": manifest.get("retired", {}),
+                                   "conditions": manifest.get("conditions", [])}
+    return _manifest_by_root[root]
+
+
+def style_classes_version(root):
+    """Transform version: changes whenever a class or an attribute condition is added, retired or dropped"""
+    manifest = get_manifest(root)
+    digest = hashlib.sha256()
+    for value, entry in sorted(manifest["classes"].items()):
+        digest.update(f"{entry['class']}={value}\n".encode("utf-8"))
+    for value, entry in sorted(manifest["retired"].items()):
+        digest.update(f"{entry['class']} retired\n".encode("utf-8"))
+    for condition in manifest["conditions"]:
+        digest.update(f"{condition}\n".encode("utf-8"))
+    return f"2-{digest.hexdigest()[:10]}"
+
+
+def normalize(value, rel_path):
+    """Canonical declarations of a style attribute on the page at rel_path, or None if it must stay"""
+    if IMPORTANT_RE.search(value):
+        return None
+    declarations = []
+    for part in split_top_level(value, ";"):
+        part = part.strip()
+        if not part:
+            continue
+        name, colon, text = part.partition(":")
+        name, text = name.strip(), text.strip()
+        if not colon or not name or not text or " " in name:
+            return None
+        declarations.append(f"{name if name.startswith('--') else name.lower()}:{text}")
+    if not declarations or SCRIPT_TOGGLED_RE.search(";".join(declarations)):
+        return None
+    for m in stylesheet.URL_RE.finditer(value):
+        url = m.group(2).strip()
+        if url and not url.startswith("/") and (url.startswith("#") or not paths.is_external(url)) \
+                and paths.resolve(rel_path, url) is None:
+            return None
+    # Site-relative, so the same value on pages at different depths is one class
+    return stylesheet.rebase_urls(";".join(declarations), rel_path, "")
+
+
+def class_name(value, taken=()):
+    """sx- and the shortest hash prefix of value no other value uses"""
+    digest = int(hashlib.sha256(value.encode("utf-8")).hexdigest(), 16)
+    text = ""
+    while digest:
+        digest, remainder = divmod(digest, 36)
+        text += "0123456789abcdefghijklmnopqrstuvwxyz"[remainder]
+    for length in range(5, len(text) + 1):
+        name = CLASS_PREFIX + text[:length]
+        if name not in taken:
+            return name
+    raise ValueError(f"no free class name for {value!r}")
+
+
+def style_attributes(content):
+    """Yield (start, end, token) for each start tag with a style attribute outside <noscript>/<template>"""
+    pos = 0
+    skip_until = None
+    for token in tokenize(iter_chunks(content)):
+        start = pos
+        pos += len(token.raw)
+        if skip_until is not None:
+            if token.kind == "endtag" and token.tag == skip_until:
+                skip_until = None
+            continue
+        if token.kind == "starttag" and token.tag in ("noscript", "template"):
+            skip_until = token.tag
+        elif token.is_start and token.get("style") is not None:
+            yield start, pos, token
+
+
+def compounds_of(conditions):
+    if not conditions:
+        return []
+    key = tuple(tuple(condition) for condition in conditions)
+    if key not in _conditions:
+        compounds = []
+        for name, op, value, ignore_case in conditions:
+            compound = Compound()
+            compound.attrs.append((name, op, value, ignore_case))
+            compounds.append(compound)
+        _conditions[key] = compounds
+    return _conditions[key]
+
+
+def unchanged_for_selectors(token, new_class, compounds):
+    """True if no selector's style/class attribute test tells the rewritten tag from the original"""
+    if not compounds:
+        return True
+    matcher = Matcher()
+    before = Element(token.tag, token.attrs, None)
+    after = Element(token.tag, [(name, value) for name, value in token.attrs if name not in ("style", "class")]
+                    + [("class", new_class)], None)
+    return all(matcher.matches_compound(compound, before) == matcher.matches_compound(compound, after)
+               for compound in compounds)
+
+
+def restore_styles(content, page, retired):
+    """content with each retired class turned back into its style attribute"""
+    styles = {entry["class"]: value for value, entry in retired.items()}
+    replacements = []
+    pos = 0
+    for token in tokenize(iter_chunks(content)):
+        start = pos
+        pos += len(token.raw)
+        if not token.is_start or not token.get("class"):
+            continue
+        names = token.get("class").split()
+        values = [styles[name] for name in names if name in styles]
+        if not values:
+            continue
+        kept = [name for name in names if name not in styles]
+        if kept:
+            token.set("class", " ".join(kept))
+        else:
+            token.remove("class")
+        values = [stylesheet.rebase_urls(value, "index.html", page.prefix) for value in values]
+        token.set("style", ";".join(values + ([token.get("style")] if token.get("style") else [])))
+        replacements.append((start, pos, token.text()))
+    if not replacements:
+        return content
+    page.note(f"{len(replacements)} retired class(es) turned back into style attributes")
+    return bundle.replace_spans(content, replacements)
+
+
+def stylesheet_link(page):
+    return f'<link rel="stylesheet" href="{page.prefix}{STYLESHEET}">'
+
+
+@transform("style-classes", version=style_classes_version)
+def style_classes(content, page):
+    """Replace repeated style attributes with shared classes"""
+    manifest = get_manifest(page.root)
+    classes = manifest["classes"]
+    if manifest["retired"]:
+        content = restore_styles(content, page, manifest["retired"])
+    if not classes:
+        return content
+    compounds = compounds_of(manifest["conditions"])
+    replacements = []
+    for start, end, token in style_attributes(content):
+        value = normalize(token.get("style"), page.rel_path)
+        entry = classes.get(value) if value is not None else None
+        if entry is None:
+            continue
+        new_class = " ".join((token.get("class") or "").split() + [entry["class"]])
+        if not unchanged_for_selectors(token, new_class, compounds):
+            continue
+        token.remove("style")
+        token.set("class", new_class)
+        replacements.append((start, end, token.text()))
+    if not replacements:
+        return content
+    page.note(f"{len(replacements)} style attribute(s) replaced by classes")
+    content = bundle.replace_spans(content, replacements)
+    if STYLESHEET not in content and "</head>" in content:
+        content = content.replace("</head>", f"\t{stylesheet_link(page)}\n</head>", 1)
+    return content
+
+
+def selector_facts(css):
+    """(most IDs in one selector, {(name, op, value, ignore_case)} style/class attribute tests) of a stylesheet"""
+    most = 0
+    conditions = set()
+
+    def visit(rules):
+        nonlocal most
+        for rule in rules:
+            if isinstance(rule, stylesheet.Rule):
+                try:
+                    selectors = parse_selector_list(rule.selector)
+                except SelectorError:
+                    most = max(most, len(ID_RE.findall(rule.selector)))
+                    for name in ("style", "class"):
+                        if re.search(rf'\[\s*{name}\b', rule.selector):
+                            # Cannot tell what it tests: make every rewrite look different
+                            conditions.add((name, None, None, False))
+                    continue
+                for selector in selectors:
+                    if any(cls.startswith(CLASS_PREFIX) for cls in selector.subject.classes):
+                        # One of ours, copied into critical CSS or a bundle
+                        continue
+                    compounds = list(selector.compounds())
+                    most = max(most, sum(len(compound.ids) for compound in compounds))
+                    for compound in compounds:
+                        conditions.update(attr for attr in compound.attrs if attr[0] in ("style", "class"))
+            elif rule.rules is not None:
+                visit(rule.rules)
+
+    visit(stylesheet.parse(css))
+    return most, conditions
+
+
+def scan_stylesheet(root, rel_path):
+    with open(os.path.join(root, rel_path), "r", encoding="utf-8", errors="replace") as f:
+        return selector_facts(f.read())
+
+
+def scan_page(root, path):
+    """(rel_path, {value: [uses, bytes saved]}, classes in use, most IDs, attribute conditions) of one page"""
+    page = engine.Page(root, path)
+    content = engine.read_page(path)
+    values = {}
+    for start, end, token in style_attributes(content):
+        value = normalize(token.get("style"), page.rel_path)
+        if value is not None:
+            stats = values.setdefault(value, [0, 0])
+            stats[0] += 1
+            # ' style="..."' goes, ' class="sx-xxxxx"' or ' sx-xxxxx' comes
+            stats[1] += len(f' style="{token.get("style")}"') - (9 if token.get("class") else 17)
+    most, conditions = 0, set()
+    for kind, _, _, _, body in hoist.inline_blocks(content):
+        if kind == "css":
+            facts = selector_facts(body)
+            most = max(most, facts[0])
+            conditions |= facts[1]
+    return page.rel_path, values, set(CLASS_RE.findall(content)), most, conditions
+
+
+def render(classes, ids):
+    """css/style-attributes.css for {value: entry} with rules carrying ids IDs"""
+    boost = f":not(#{NEVER_ID})" * ids
+    rules = sorted((entry["class"], value) for value, entry in classes.items())
+    css = "".join(f".{name}{boost}{{{stylesheet.rebase_urls(value, 'index.html', '../' * STYLESHEET.count('/'))}}}\n"
+                  for name, value in rules)
+    return HEADER + css
+
+
+class StyleReport:
+    def __init__(self):
+        self.pages = {}         # rel_path -> bytes saved
+        self.classes = []       # (class, value, uses)
+        self.retired = []       # (class, value) turned back into style attributes
+        self.ids = 0
+        self.conditions = []
+        self.stylesheet_bytes = 0
+        self.seconds = 0.0
+
+    def print_summary(self, verbose=False):
+        print("=" * 60)
+        print(f"Pages scanned: {len(self.pages)}")
+        print(f"Classes: {len(self.classes)} in {STYLESHEET} ({self.stylesheet_bytes / 1024:.1f} KB), "
+              f"each with {self.ids} ID(s) of specificity")
+        for name, value, uses in sorted(self.classes, key=lambda row: -row[2]) if verbose else []:
+            print(f"  ✓ .{name} x{uses}: {value}")
+        for name, value in self.retired:
+            print(f"  - .{name} retired: {value}")
+        print(f"Selectors testing style/class attributes: {len(self.conditions)} (rewrites they could see are skipped)")
+        for condition in self.conditions if verbose else []:
+            print(f"  - {condition}")
+        saved = sum(self.pages.values())
+        changed = sum(1 for value in self.pages.values() if value)
+        print(f"Page HTML saved: {saved / 1024:.1f} KB on {changed} page(s)")
+        print(f"Time: {self.seconds:.1f} s")
+        print("=" * 60)
+
+    def as_json(self):
+        return {"classes": {name: {"value": value, "uses": uses} for name, value, uses in self.classes},
+                "pages": self.pages}
+
+
+def build(root, jobs=1, min_uses=MIN_USES, dry_run=False):
+    """Count style attributes, assign classes, write the stylesheet and the manifest"""
+    report = StyleReport()
+    start = time.perf_counter()
+    manifest = load_manifest(root)
+    previous = manifest.get("classes", {})
+    pages = list(engine.iter_pages(root))
+    sheets = [rel_path for rel_path in fingerprint.get_hashes(root)
+              if rel_path.endswith(".css") and rel_path != STYLESHEET]
+    if jobs > 1 and len(pages) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(scan_page, [root] * len(pages), pages, chunksize=8))
+            facts = list(executor.map(scan_stylesheet, [root] * len(sheets), sheets, chunksize=8))
+    else:
+        results = [scan_page(root, path) for path in pages]
+        facts = [scan_stylesheet(root, rel_path) for rel_path in sheets]
+
+    ids = 0
+    conditions = set()
+    for most, found in facts + [(most, found) for *_, most, found in results]:
+        ids = max(ids, most)
+        conditions |= found
+    uses = {}
+    for _, values, _, _, _ in results:
+        for value, (count, _) in values.items():
+            uses[value] = uses.get(value, 0) + count
+    in_use = set().union(*(used for _, _, used, _, _ in results))
+
+    classes = {}
+    retired = {value: entry for value, entry in manifest.get("retired", {}).items() if entry["class"] in in_use}
+    taken = {entry["class"] for entry in retired.values()}
+    for value, entry in previous.items():
+        if entry["class"] not in in_use:
+            continue
+        if normalize(value, "index.html") != value:
+            # Built before the value had to stay inline
+            retired[value] = entry
+        else:
+            classes[value] = dict(entry, uses=uses.get(value, 0))
+        taken.add(entry["class"])
+    for value in sorted(uses):
+        if value not in classes and uses[value] >= min_uses:
+            name = class_name(value, taken)
+            taken.add(name)
+            classes[value] = {"class": name, "uses": uses[value]}
+
+    css = render(classes, ids + 1)
+    report.ids = ids + 1
+    report.conditions = sorted(str(condition) for condition in conditions)
+    report.stylesheet_bytes = len(css.encode("utf-8"))
+    report.classes = [(entry["class"], value, entry["uses"]) for value, entry in classes.items()]
+    report.retired = sorted((entry["class"], value) for value, entry in retired.items())
+    for rel_path, values, _, _, _ in results:
+        report.pages[rel_path] = sum(saved for value, (_, saved) in values.items() if value in classes)
+
+    if not dry_run:
+        path = os.path.join(root, STYLESHEET)
+        if bundle.read_text(path) != css:
+            bundle.write_atomic(path, css)
+        save_manifest(root, {"classes": classes, "retired": retired,
+                             "conditions": sorted(map(list, conditions), key=str)})
+        _manifest_by_root.pop(os.path.abspath(root), None)
+    report.seconds = time.perf_counter() - start
+    return report
@@ -0,0 +1,219 @@
+"""
+stylesheet.py
+
+A small CSS parser: just enough structure to pick rules out of a
+stylesheet and write the survivors back.
+
+parse() splits a stylesheet into style rules and at-rules. Comments are
+dropped; strings and parentheses are respected when looking for the ``{``,
+``}`` and ``;`` that end a rule. Conditional group rules (@media,
+@supports, ...) are parsed recursively, every other at-rule (@font-face,
+@keyframes, @page, ...) keeps its block as opaque text. Selector and
+declaration text is kept verbatim apart from whitespace trimming, so
+serialize() reproduces every rule it was given.
+
+Nothing is validated: malformed input never raises, it only produces
+rules a browser would ignore too.
+"""
+
+import posixpath
+import re
+
+from . import paths
+
+# At-rules whose block holds more rules rather than declarations
+GROUP_AT_RULES = {"media", "supports", "document", "-moz-document", "layer", "container", "scope"}
+
+URL_RE = re.compile(r'url\(\s*(["\']?)([^"\')]*)\1\s*\)', re.IGNORECASE)
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+class Rule:
+    """A style rule: selector list and declaration block text"""
+
+    __slots__ = ("selector", "declarations")
+
+    def __init__(self, selector, declarations):
+        self.selector = selector
+        self.declarations = declarations
+
+    def text(self):
+        return f"{self.selector}{{{self.declarations}}}"
+
+    def __repr__(self):
+        return f"Rule({self.selector!r})"
+
+
+class AtRule:
+    """
+    An at-rule. rules is the parsed child list of a group rule, block the
+    raw block text of any other rule with a block, and both are None for
+    a statement such as @import or @charset.
+    """
+
+    __slots__ = ("name", "prelude", "rules", "block")
+
+    def __init__(self, name, prelude, rules=None, block=None):
+        self.name = name
+        self.prelude = prelude
+        self.rules = rules
+        self.block = block
+
+    def text(self):
+        head = f"@{self.name} {self.prelude}" if self.prelude else f"@{self.name}"
+        if self.rules is not None:
+            return f"{head}{{{serialize(self.rules)}}}"
+        if self.block is not None:
+            return f"{head}{{{self.block}}}"
+        return f"{head};"
+
+    def __repr__(self):
+        return f"AtRule({self.name!r}, {self.prelude!r})"
+
+
+def strip_comments(text):
+    """text without /* comments */ (comment markers inside strings are kept)"""
+    out = []
+    pos = 0
+    length = len(text)
+    while pos < length:
+        char = text[pos]
+        if char in "\"'":
+            end = _string_end(text, pos)
+            out.append(text[pos:end])
+            pos = end
+        elif text.startswith("/*", pos):
+            end = text.find("*/", pos + 2)
+            pos = length if end < 0 else end + 2
+        else:
+            next_pos = pos + 1
+            while next_pos < length and text[next_pos] not in "\"'/":
+                next_pos += 1
+            out.append(text[pos:next_pos])
+            pos = next_pos
+    return "".join(out)
+
+
+def _string_end(text, pos):
+    """Index just past the string literal starting at pos"""
+    quote = text[pos]
+    pos += 1
+    while pos < len(text):
+        char = text[pos]
+        if char == "\\":
+            pos += 2
+            continue
+        if char == quote or char == "\n":
+            return pos + 1
+        pos += 1
+    return len(text)
+
+
+def _scan(text, pos, stops):
+    """Index of the first character in stops at nesting depth 0, or len(text)"""
+    depth = 0
+    length = len(text)
+    while pos < length:
+        char = text[pos]
+        if char in "\"'":
+            pos = _string_end(text, pos)
+            continue
+        if char == "\\":
+            pos += 2
+            continue
+        if char in "([":
+            depth += 1
+        elif char in ")]":
+            depth = max(depth - 1, 0)
+        elif depth == 0 and char in stops:
+            return pos
+        pos += 1
+    return length
+
+
+def _block_end(text, pos):
+    """Index of the } closing the block whose { is at pos - 1"""
+    depth = 1
+    length = len(text)
+    while pos < length:
+        char = text[pos]
+        if char in "\"'":
+            pos = _string_end(text, pos)
+            continue
+        if char == "\\":
+            pos += 2
+            continue
+        if char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return pos
+        pos += 1
+    return length
+
+
+def _parse(text):
+    rules = []
+    pos = 0
+    length = len(text)
+    while pos < length:
+        while pos < length and (text[pos].isspace() or text[pos] in ";}"):
+            pos += 1
+        if pos >= length:
+            break
+        if text.startswith("<!--", pos) or text.startswith("-->", pos):
+            pos += 4 if text[pos] == "<" else 3
+            continue
+        end = _scan(text, pos, "{;")
+        prelude = WHITESPACE_RE.sub(" ", text[pos:end]).strip()
+        if end >= length or text[end] == ";":
+            if prelude.startswith("@"):
+                name, _, rest = prelude[1:].partition(" ")
+                rules.append(AtRule(name.lower(), rest.strip()))
+            pos = end + 1
+            continue
+        close = _block_end(text, end + 1)
+        body = text[end + 1:close]
+        pos = close + 1
+        if prelude.startswith("@"):
+            name, _, rest = prelude[1:].partition(" ")
+            name = name.lower()
+            if name in GROUP_AT_RULES:
+                rules.append(AtRule(name, rest.strip(), rules=_parse(body)))
+            else:
+                rules.append(AtRule(name, rest.strip(), block=body.strip()))
+        elif prelude:
+            rules.append(Rule(prelude, body.strip()))
+    return rules
+
+
+def parse(text):
+    """[Rule | AtRule] for the stylesheet text"""
+    return _parse(strip_comments(text))
+
+
+def serialize(rules):
+    """CSS text for a rule list"""
+    return "".join(rule.text() for rule in rules)
+
+
+def rebase_urls(text, sheet_rel_path, prefix):
+    """
+    Rewrite the relative url()s in text, written relative to the stylesheet
+    at sheet_rel_path, as prefix + their site-relative path - so the CSS
+    still works when moved into a page (prefix is then page.prefix).
+    """
+    base = posixpath.dirname(sheet_rel_path)
+
+    def replace(m):
+        url = m.group(2).strip()
+        if not url or paths.is_external(url) or url.startswith("/"):
+            return m.group(0)
+        path, query, fragment = paths.split_url(url)
+        rel_path = posixpath.normpath(posixpath.join(base, path))
+        if rel_path.startswith("../"):
+            return m.group(0)
+        return f'url("{prefix}{rel_path}{query}{fragment}")'
+
+    return URL_RE.sub(replace, text)
@@ -0,0 +1,210 @@
+"""
+thirdparty.py
+
+Keep third-party embeds off the critical path.
+
+youtube-facade replaces each YouTube <iframe> with a click-to-load facade:
+a locally cached poster image and a play button, with the original iframe
+(autoplay on) kept in a <template>. custom-menu.js swaps the template in
+on click, so the YouTube player - several hundred KB of script - is only
+fetched for visitors who actually press play. Posters are downloaded
+beforehand with ``python3 -m sitefix youtube`` to assets/youtube/<id>.jpg;
+an embed without a poster is left as it is.
+
+defer-gtm replaces the Google Tag Manager loader (which Divi's header
+template repeats a second time in <body>) with a single copy in <head>
+that injects gtm.js on the first interaction, or once the browser is
+idle after load. The copy goes after <meta charset>: the original loader
+sat before it, and the longer deferred one would push the charset
+declaration out of the first 1024 bytes. The <noscript> ns.html iframe
+is kept: it only loads when JavaScript is off.
+"""
+
+import hashlib
+import os
+import re
+
+from . import paths
+from . import refindex
+from .htmlstream import tokenize
+from .transforms import transform
+
+POSTER_DIR = "assets/youtube"
+THUMBNAIL_BASE = "https://i.ytimg.com/vi"
+# Best first; maxresdefault only exists for HD uploads
+THUMBNAIL_NAMES = ("maxresdefault", "hqdefault")
+
+YOUTUBE_EMBED_RE = re.compile(r'^(?:https?:)?//(?:www\.)?youtube(?:-nocookie)?\.com/embed/([\w-]{11})')
+# The player kept in a facade's <template> is not an embed to replace
+IFRAME_RE = re.compile(r'(?<!<template>)<iframe\b[^>]*>.*?</iframe>', re.IGNORECASE | re.DOTALL)
+
+GTM_BLOCK_RE = re.compile(
+    r'[ \t]*<!-- Google Tag Manager -->\s*<script>.*?</script>\s*<!-- End Google Tag Manager -->\n?',
+    re.DOTALL)
+GTM_ID_RE = re.compile(r"GTM-[A-Z0-9]+")
+DEFERRED_GTM_RE = re.compile(
+    r'[ \t]*<!-- Google Tag Manager \(deferred\) -->\s*<script>.*?</script>\s*'
+    r'<!-- End Google Tag Manager \(deferred\) -->\n?',
+    re.DOTALL)
+CHARSET_RE = re.compile(r'<meta charset=[^>]*>\n?', re.IGNORECASE)
+HEAD_RE = re.compile(r'<head>\n?', re.IGNORECASE)
+
+DEFERRED_GTM = """    <!-- Google Tag Manager (deferred) -->
+    <script>
+      ;(function (w, d, id) {
+        var events = ['pointerdown', 'keydown', 'touchstart', 'scroll'], loaded = false
+        function load() {
+          if (loaded) return
+          loaded = true
+          events.forEach(function (e) { w.removeEventListener(e, load, { passive: true }) })
+          w.dataLayer = w.dataLayer || []
+          w.dataLayer.push({ 'gtm.start': new Date().getTime(), event: 'gtm.js' })
+          var j = d.createElement('script')
+          j.async = true
+          j.src = 'https://www.googletagmanager.com/gtm.js?id=' + id
+          d.head.appendChild(j)
+        }
+        events.forEach(function (e) { w.addEventListener(e, load, { passive: true }) })
+        w.addEventListener('load', function () {
+          if (w.requestIdleCallback) w.requestIdleCallback(load, { timeout: 5000 })
+          else setTimeout(load, 3000)
+        })
+      })(window, document, '%(id)s')
+    </script>
+    <!-- End Google Tag Manager (deferred) -->
+"""
+
+
+def video_id(url):
+    """YouTube video id of an embed URL, or None"""
+    m = YOUTUBE_EMBED_RE.match((url or "").strip())
+    return m.group(1) if m else None
+
+
+def poster_rel_path(vid):
+    return f"{POSTER_DIR}/{vid}.jpg"
+
+
+def embedded_videos(root, jobs=1):
+    """{video id: [pages embedding it]} across the site"""
+    index = refindex.ReferenceIndex(root).scan(jobs)
+    videos = {}
+    for source, refs in index.refs.items():
+        for kind, url in refs:
+            vid = video_id(url) if kind == "src" else None
+            if vid:
+                videos.setdefault(vid, [])
+                if source not in videos[vid]:
+                    videos[vid].append(source)
+    return videos
+
+
+def fetch_posters(root, vids, base=THUMBNAIL_BASE, concurrency=4, cache=None, refresh=False):
+    """
+    Download a poster for each video id that lacks one. Returns
+    {vid: FetchResult} for the best thumbnail found (or the last failure).
+    """
+    # Imported here so rewriting pages does not need requests
+    from .fetch import Downloader
+
+    results = {}
+    pending = [vid for vid in vids if refresh or not os.path.exists(os.path.join(root, poster_rel_path(vid)))]
+    with Downloader(root, concurrency=concurrency, cache=cache) as downloader:
+        for name in THUMBNAIL_NAMES:
+            if not pending:
+                break
+            jobs = [(f"{base}/{vid}/{name}.jpg", os.path.join(root, poster_rel_path(vid))) for vid in pending]
+            for vid, result in zip(pending, downloader.fetch_all(jobs, revalidate=refresh)):
+                results[vid] = result
+            pending = [vid for vid in pending if results[vid].status == "failed"]
+    return results
+
+
+def get_posters(root):
+    """Set of video ids with a local poster"""
+    poster_dir = os.path.join(root, POSTER_DIR)
+    if not os.path.isdir(poster_dir):
+        return set()
+    return {name[:-4] for name in os.listdir(poster_dir) if name.endswith(".jpg")}
+
+
+def posters_version(root):
+    """Transform version: changes whenever the set of posters changes"""
+    digest = hashlib.sha256("\n".join(sorted(get_posters(root))).encode("utf-8"))
+    return f"1-{digest.hexdigest()[:10]}"
+
+
+def escape(value):
+    return value.replace("&", "&amp;").replace('"', "&quot;")
+
+
+def autoplay_src(src):
+    """The embed URL with autoplay on, for a player the visitor asked for"""
+    path, query, fragment = paths.split_url(src)
+    params = [p for p in query.lstrip("?").split("&") if p and not p.startswith("autoplay=")]
+    return f"{path}?{'&'.join(params + ['autoplay=1'])}{fragment}"
+
+
+def facade(iframe, vid, page):
+    """Facade markup for one YouTube <iframe> element (start tag to end tag)"""
+    token = next(tokenize([iframe[:iframe.index(">") + 1]]))
+    title = token.get("title")
+    width, height = token.get("width"), token.get("height")
+
+    token.remove("loading")
+    token.set("src", autoplay_src(token.get("src")))
+    allow = token.get("allow")
+    if allow is not None and "autoplay" not in allow:
+        token.set("allow", f"autoplay; {allow}")
+    player = token.text() + "</iframe>"
+
+    style = ""
+    if (width or "").isdigit() and (height or "").isdigit():
+        style = f' style="aspect-ratio: {width} / {height}"'
+    label = f"Play video: {title}" if title else "Play video"
+    return (f'<div class="yt-facade" data-video="{vid}"{style}>'
+            f'<img src="{page.prefix}{poster_rel_path(vid)}" alt="{escape(title or "")}" loading="lazy" decoding="async">'
+            f'<button type="button" class="yt-facade-play" aria-label="{escape(label)}"></button>'
+            f'<template>{player}</template></div>')
+
+
+@transform("youtube-facade", version=posters_version)
+def youtube_facade(content, page):
+    """Replace YouTube iframes with click-to-load poster facades"""
+    if "youtube" not in content:
+        return content
+    posters = get_posters(page.root)
+
+    def replace(m):
+        start_tag = m.group(0)[:m.group(0).index(">") + 1]
+        vid = video_id(next(tokenize([start_tag])).get("src"))
+        if not vid:
+            return m.group(0)
+        if vid not in posters:
+            page.note(f"no local poster for YouTube video {vid}, run 'python3 -m sitefix youtube'")
+            return m.group(0)
+        page.note(f"YouTube video {vid} replaced with a facade")
+        return facade(m.group(0), vid, page)
+
+    return IFRAME_RE.sub(replace, content)
+
+
+@transform("defer-gtm", version=2)
+def defer_gtm(content, page):
+    """Load Google Tag Manager on first interaction or idle, once per page"""
+    blocks = list(GTM_BLOCK_RE.finditer(content))
+    deferred = DEFERRED_GTM_RE.search(content)
+    if deferred:
+        charset = CHARSET_RE.search(content)
+        if not blocks and charset and charset.end() <= deferred.start():
+            return content
+        loader = deferred.group(0)
+    elif blocks and GTM_ID_RE.search(blocks[0].group(0)):
+        loader = DEFERRED_GTM % {"id": GTM_ID_RE.search(blocks[0].group(0)).group(0)}
+    else:
+        return content
+    stripped = DEFERRED_GTM_RE.sub("", GTM_BLOCK_RE.sub("", content))
+    anchor = CHARSET_RE.search(stripped) or HEAD_RE.search(stripped)
+    if not anchor:
+        return content
+    return stripped[:anchor.end()] + loader + stripped[anchor.end():]
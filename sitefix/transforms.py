@@ -0,0 +1,268 @@
+"""
+transforms.py
+
+Registry of page transforms and the built-in fixes ported from the
+one-off scripts in the repository root.
+
+A transform is a plain function ``func(content, page) -> content``. It must
+be idempotent: running it on its own output returns the same string, so
+the engine can tell "nothing to do" from "page changed" by comparing bytes.
+tests/test_transforms.py checks this for every transform in
+DEFAULT_PIPELINE, including on pages minify-html has already rewritten.
+"""
+
+import re
+from functools import lru_cache
+
+from .htmlstream import Rewriter, iter_chunks, tokenize
+from .paths import REPO_NAME
+from .replacer import Replacer
+
+# name -> Transform, in registration order
+REGISTRY = {}
+
+
+class Transform:
+    """
+    A named, versioned page rewrite. Bump version whenever the output of
+    func changes so the build manifest re-applies it; version may also be
+    a callable taking the site root for transforms that depend on files
+    outside the page.
+
+    A transform that keeps state between runs (a cache) records it with
+    page.remember() and passes save: after a run that writes, the engine
+    calls save(root, {key: value}) once, in the main process, with
+    everything remembered on any page. Transforms never write state
+    themselves, so --dry-run leaves .sitefix/ alone and parallel workers
+    do not race on the same file.
+    """
+
+    def __init__(self, name, func, version=1, description="", save=None):
+        self.name = name
+        self.func = func
+        self.version = version
+        self.description = description
+        self.save = save
+
+    def version_for(self, root):
+        """Concrete version string for a run over root"""
+        if callable(self.version):
+            return str(self.version(root))
+        return str(self.version)
+
+    def __call__(self, content, page):
+        return self.func(content, page)
+
+    def __repr__(self):
+        return f"Transform({self.name!r}, version={self.version!r})"
+
+
+def transform(name, version=1, save=None):
+    """Decorator registering ``func`` as the transform ``name``"""
+    def register(func):
+        if name in REGISTRY:
+            raise ValueError(f"Transform already registered: {name}")
+        doc = (func.__doc__ or "").strip().splitlines()
+        REGISTRY[name] = Transform(name, func, version, doc[0] if doc else "", save)
+        return func
+    return register
+
+
+def get_transforms(names):
+    """Look up transforms by name, preserving the requested order"""
+    unknown = [name for name in names if name not in REGISTRY]
+    if unknown:
+        raise KeyError(f"Unknown transform(s): {', '.join(unknown)}")
+    return [REGISTRY[name] for name in names]
+
+
+# ---------------------------------------------------------------------------
+# Built-in fixes
+# ---------------------------------------------------------------------------
+
+CSS_FILE_NAME = "custom-fixes.css"
+JS_FILE_NAME = "custom-menu.js"
+CACHE_BUSTER = "?v=final21"
+
+DONATE_HTML = """
+<!-- Custom Donate Button Injection -->
+<div class="custom-donate-button-wrapper">
+    <a href="https://p2p.onecause.com/srrn/donate" target="_blank" class="custom-donate-button" title="Donate Now">
+        <span class="icon" aria-hidden="true">$</span>
+        <span class="label">Donate Now</span>
+    </a>
+</div>
+</body>
+"""
+
+DONATE_BLOCK_RE = re.compile(r'<!-- Custom Donate Button Injection -->.*?</div>', re.DOTALL)
+CACHE_BUSTER_RE = re.compile(r'custom-fixes\.css\?v=[a-zA-Z0-9_]+')
+
+
+@transform("inject-custom-css")
+def inject_custom_css(content, page):
+    """Link css/custom-fixes.css before </head> (fix_footer_global.py)"""
+    if CSS_FILE_NAME in content or "</head>" not in content:
+        return content
+    css_link = f'<link rel="stylesheet" href="{page.prefix}css/{CSS_FILE_NAME}">'
+    return content.replace("</head>", f"\t{css_link}\n</head>")
+
+
+@transform("inject-custom-menu-js")
+def inject_custom_menu_js(content, page):
+    """Load custom-menu.js before </head> (fix_footer_global.py)"""
+    if JS_FILE_NAME in content or "</head>" not in content:
+        return content
+    js_script = f'<script src="{page.prefix}{JS_FILE_NAME}" defer=""></script>'
+    return content.replace("</head>", f"\t{js_script}\n</head>")
+
+
+WP_CONTENT_REPLACER = Replacer({
+    "wp-content/uploads": "assets/uploads",
+    "wp-content/plugins": "assets/plugins",
+    "wp-content/themes": "assets/themes",
+    "wp-content/et-cache": "assets/et-cache",
+})
+
+
+def _repo_paths_table():
+    """fix_paths_absolute.py's 4 prefixes x 9 targets x 2 attributes"""
+    prefixes = ['./', '../', '../../', '../../../']
+    targets = ['assets/', 'wp-content/', 'wp-includes/', 'css/', 'js/', 'images/', 'feed/', 'comments/', 'xmlrpc.php']
+    table = {}
+    for prefix in prefixes:
+        for target in targets:
+            for attr in ('href="', 'src="'):
+                table[f'{attr}{prefix}{target}'] = f'{attr}{REPO_NAME}{target}'
+    return table
+
+
+REPO_PATHS_REPLACER = Replacer(_repo_paths_table())
+
+
+@lru_cache(maxsize=None)
+def domain_assets_replacer(prefix):
+    """Absolute srrn.net asset URLs -> {prefix}assets, one replacer per page depth"""
+    bad_tlds = [
+        "//srrn.net/assets",
+        "https://srrn.net/assets",
+        "http://srrn.net/assets",
+        "//srrn.net/wp-content",
+        "https://srrn.net/wp-content",
+        "http://srrn.net/wp-content",
+    ]
+    return Replacer({bad: f"{prefix}assets" for bad in bad_tlds})
+
+
+@transform("wp-content-to-assets")
+def wp_content_to_assets(content, page):
+    """Point wp-content/* references at the local assets/* mirror"""
+    return WP_CONTENT_REPLACER.replace(content)
+
+
+@transform("absolute-domain-assets")
+def absolute_domain_assets(content, page):
+    """Rewrite //srrn.net/assets style URLs to page-relative assets"""
+    # Leftmost-longest matching keeps the scheme of https://srrn.net/... URLs
+    # from being left behind by the bare //srrn.net/... entries
+    return domain_assets_replacer(page.prefix).replace(content)
+
+
+@transform("absolute-repo-paths")
+def absolute_repo_paths(content, page):
+    """Rewrite ./ and ../ asset paths to /FFC-EX-SRRN.net/ (fix_paths_absolute.py)"""
+    return REPO_PATHS_REPLACER.replace(content)
+
+
+PORTRAIT_HTML = '<div class="et_pb_testimonial_portrait"></div>'
+PORTRAIT_REWRITER = Rewriter()
+
+
+@PORTRAIT_REWRITER.rule(cls="et_pb_testimonial_no_image")
+def _drop_no_image_class(token, ctx):
+    classes = ["et_pb_testimonial" if c == "et_pb_testimonial_no_image" else c for c in token.classes]
+    token.set("class", " ".join(dict.fromkeys(classes)))
+
+
+@PORTRAIT_REWRITER.rule("div", cls="et_pb_testimonial_description")
+def _add_missing_portrait(token, ctx):
+    previous = ctx.previous_sibling
+    if previous is not None and previous.has_class("et_pb_testimonial_portrait"):
+        return None
+    return PORTRAIT_HTML + token.text()
+
+
+@transform("testimonial-portraits", version=2)
+def testimonial_portraits(content, page):
+    """Add empty portrait divs to testimonials (fix_testimonials_html_pure.py)"""
+    if "et_pb_testimonial" not in content:
+        return content
+    return PORTRAIT_REWRITER.rewrite(content)
+
+
+def markup(html):
+    """Tags with their attributes and the words between them: html up to whitespace and quoting"""
+    items = []
+    for token in tokenize(iter_chunks(html)):
+        if token.is_start:
+            items.append((token.tag, tuple(token.attrs)))
+        elif token.kind == "data":
+            items.extend(token.raw.split())
+        else:
+            items.append((token.kind, token.tag or token.raw))
+    return items
+
+
+@lru_cache(maxsize=None)
+def donate_markup():
+    return markup(DONATE_BLOCK_RE.search(DONATE_HTML).group(0))
+
+
+@transform("donate-button")
+def donate_button(content, page):
+    """(Re-)inject the floating Donate Now button (inject_donate_button_v2.py)"""
+    if "</body>" not in content:
+        return content
+    blocks = list(DONATE_BLOCK_RE.finditer(content))
+    # minify-html may have collapsed its whitespace and quotes since
+    if len(blocks) == 1 and content[blocks[0].end():].lstrip().startswith("</body>") \
+            and markup(blocks[0].group(0)) == donate_markup():
+        return content
+    cleaned = DONATE_BLOCK_RE.sub('', content)
+    return cleaned.replace("</body>", DONATE_HTML)
+
+
+@transform("custom-fixes-buster")
+def custom_fixes_buster(content, page):
+    """Set a fixed custom-fixes.css ?v= buster (superseded by fingerprint-assets)"""
+    return CACHE_BUSTER_RE.sub(f'{CSS_FILE_NAME}{CACHE_BUSTER}', content)
+
+
+# Order matters: paths are normalised before assets are fingerprinted,
+# inline blocks are hoisted into files once their URLs are final, and
+# stylesheets are bundled before critical CSS is extracted from them.
+# defer-gtm, youtube-facade, img-dimensions, webp-picture, lcp-priority,
+# style-classes, hoist-inline, bundle-assets, defer-scripts, critical-css,
+# fingerprint-assets and minify-html are registered by
+# sitefix/thirdparty.py, imgattrs.py, webp.py, styleclasses.py, hoist.py,
+# bundle.py, critical.py, fingerprint.py and htmlmin.py. minify-html comes
+# last, once every other transform has written its markup.
+DEFAULT_PIPELINE = [
+    "inject-custom-css",
+    "inject-custom-menu-js",
+    "wp-content-to-assets",
+    "absolute-domain-assets",
+    "donate-button",
+    "defer-gtm",
+    "youtube-facade",
+    "img-dimensions",
+    "webp-picture",
+    "lcp-priority",
+    "style-classes",
+    "hoist-inline",
+    "bundle-assets",
+    "defer-scripts",
+    "critical-css",
+    "fingerprint-assets",
+    "minify-html",
+]
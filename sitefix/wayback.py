@@ -0,0 +1,203 @@
+"""
+wayback.py
+
+Recover assets the live site no longer serves from the Wayback Machine.
+
+1. Targets are the missing assets from the reference report plus Git LFS
+   pointer stubs checked in instead of the real file (e.g. the 134-byte
+   assets/Michael-Webster-640x360-1.mp4).
+2. Snapshots are looked up in batches through the CDX API: one prefix
+   query per origin directory for targets with a known origin path, and
+   one filtered query per group of file names for the rest. Lookups go
+   through the HTTP cache, so repeat runs do not hit archive.org.
+3. The newest 200 capture of each target is fetched raw (the id_ form,
+   without the Wayback toolbar or URL rewriting) by fetch.Downloader.
+
+CDX queries and capture downloads share one rate limiter. The archive base
+URL is configurable, so a local stand-in server can answer both.
+"""
+
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+
+from . import recover
+from .fetch import Downloader, RateLimiter, is_lfs_stub
+from .httpcache import HTTPCache
+
+ARCHIVE = "https://web.archive.org"
+DOMAIN = "srrn.net"
+
+# Snapshots do not change; CDX answers are good for a week
+LOOKUP_TTL = 7 * 24 * 3600
+# File names per filtered CDX query
+NAMES_PER_QUERY = 20
+# Directory searched for assets with no known origin path
+FALLBACK_PREFIX = "wp-content/uploads/"
+
+
+def lfs_stubs(root, extensions=(".mp4", ".webm", ".mov", ".mp3", ".pdf", ".zip", ".png", ".jpg", ".jpeg", ".gif")):
+    """Repository-relative paths of LFS pointer stubs under assets/"""
+    stubs = []
+    for dirpath, _, filenames in os.walk(os.path.join(root, "assets")):
+        for filename in filenames:
+            if filename.lower().endswith(extensions):
+                path = os.path.join(dirpath, filename)
+                if is_lfs_stub(path):
+                    stubs.append(os.path.relpath(path, root).replace(os.sep, "/"))
+    return sorted(stubs)
+
+
+def url_key(url):
+    """Scheme-, www- and port-insensitive form of a URL for matching captures"""
+    parts = urlsplit(url if "://" in url else "http://" + url)
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    key = host + (parts.path or "/")
+    return key + ("?" + parts.query if parts.query else "")
+
+
+def capture_url(timestamp, original, archive=ARCHIVE):
+    """Raw (id_) capture URL: the archived bytes without Wayback rewriting"""
+    return f"{archive.rstrip('/')}/web/{timestamp}id_/{original}"
+
+
+class Target:
+    """A local path to fill and the origin URL it should have come from"""
+
+    def __init__(self, rel_path, original):
+        self.rel_path = rel_path
+        self.original = original        # origin URL, or None to search by name
+        self.capture = None             # (timestamp, original) once found
+
+    @property
+    def name(self):
+        return self.rel_path.rsplit("/", 1)[-1]
+
+
+def make_targets(rel_paths):
+    targets = []
+    for rel_path in dict.fromkeys(rel_paths):
+        targets.append(Target(rel_path, recover.origin_url(rel_path, f"https://{DOMAIN}")))
+    return targets
+
+
+def batch_queries(targets):
+    """[(params, [targets]), ...]: prefix queries by directory, filtered queries by name"""
+    by_dir = {}
+    by_name = []
+    for target in targets:
+        if target.original:
+            key = url_key(target.original).split("?")[0]
+            by_dir.setdefault(key.rsplit("/", 1)[0] + "/", []).append(target)
+        else:
+            by_name.append(target)
+
+    queries = []
+    for prefix, group in sorted(by_dir.items()):
+        queries.append(({"url": prefix, "matchType": "prefix"}, group))
+    for start in range(0, len(by_name), NAMES_PER_QUERY):
+        group = by_name[start:start + NAMES_PER_QUERY]
+        names = "|".join(re.escape(target.name) for target in group)
+        params = {"url": f"{DOMAIN}/{FALLBACK_PREFIX}", "matchType": "prefix",
+                  "filter": [f"original:.*/({names})(\\?.*)?$"]}
+        queries.append((params, group))
+    return queries
+
+
+def parse_cdx(data):
+    """Rows of a CDX JSON answer as dicts (the first row holds field names)"""
+    if not data:
+        return []
+    fields = data[0]
+    return [dict(zip(fields, row)) for row in data[1:]]
+
+
+def match_captures(group, rows):
+    """Set target.capture to the newest 200 capture matching each target"""
+    newest = {}
+    for row in rows:
+        if row.get("statuscode") != "200":
+            continue
+        key = url_key(row["original"])
+        for candidate in (key, key.split("?")[0], key.split("?")[0].rsplit("/", 1)[-1]):
+            if candidate not in newest or row["timestamp"] > newest[candidate][0]:
+                newest[candidate] = (row["timestamp"], row["original"])
+    for target in group:
+        if target.original:
+            key = url_key(target.original)
+            target.capture = newest.get(key) or newest.get(key.split("?")[0])
+        else:
+            target.capture = newest.get(target.name)
+
+
+class WaybackRecovery:
+    """Batched CDX lookups and concurrent raw-capture downloads"""
+
+    def __init__(self, root, archive=ARCHIVE, concurrency=4, rate=2.0, cache=None):
+        self.root = root
+        self.archive = archive.rstrip("/")
+        self.concurrency = concurrency
+        self.limiter = RateLimiter(rate, burst=concurrency)
+        self.cache = cache if cache is not None else HTTPCache(root)
+        self.session = requests.Session()
+        self.errors = []
+
+    def _cdx(self, params):
+        url = f"{self.archive}/cdx/search/cdx"
+        query = dict(params, output="json", fl="original,timestamp,statuscode,mimetype,length",
+                     collapse="digest")
+        # Encode into the URL so the cache key covers the whole query
+        prepared = requests.Request("GET", url, params=query).prepare().url
+        entry = self.cache.lookup("GET", prepared)
+        if not self.cache.is_fresh(entry, LOOKUP_TTL):
+            self.limiter.wait()
+        response = self.cache.get(self.session, prepared, ttl=LOOKUP_TTL, timeout=30)
+        if response.status_code != 200:
+            raise requests.HTTPError(f"CDX HTTP {response.status_code} for {params['url']}")
+        return parse_cdx(response.json() if response.content.strip() else [])
+
+    def lookup(self, targets):
+        """Find a capture for each target; returns the targets that have one"""
+        def run(query):
+            params, group = query
+            try:
+                match_captures(group, self._cdx(params))
+            except (requests.RequestException, ValueError) as e:
+                self.errors.append((params["url"], str(e)))
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            list(executor.map(run, batch_queries(targets)))
+        return [target for target in targets if target.capture]
+
+    def download(self, targets, retries=3):
+        """Fetch the raw captures of targets into place"""
+        jobs = [(capture_url(*target.capture, archive=self.archive),
+                 os.path.join(self.root, target.rel_path.replace("/", os.sep)))
+                for target in targets]
+        with Downloader(self.root, concurrency=self.concurrency, retries=retries,
+                        cache=self.cache, limiter=self.limiter) as downloader:
+            # Captures never change, and a stub on disk must not look current
+            return downloader.fetch_all(jobs, revalidate=False)
+
+    def close(self):
+        self.cache.save()
+        self.session.close()
+
+
+def recover_from_wayback(root, rel_paths, archive=ARCHIVE, concurrency=4, rate=2.0):
+    """Look up and download rel_paths; returns (targets, results, errors, seconds)"""
+    start = time.perf_counter()
+    wayback = WaybackRecovery(root, archive, concurrency, rate)
+    try:
+        targets = make_targets(rel_paths)
+        found = wayback.lookup(targets)
+        results = wayback.download(found)
+    finally:
+        wayback.close()
+    return targets, results, wayback.errors, time.perf_counter() - start
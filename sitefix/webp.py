@@ -0,0 +1,257 @@
+"""
+webp.py
+
+WebP siblings for every raster a page references, and <picture> markup to
+serve them.
+
+Building (python3 -m sitefix webp): each PNG/JPEG referenced from an
+<img> src or srcset is encoded to a sibling ``name.ext.webp`` in a
+process pool - JPEGs and photographic PNGs lossy at the target quality,
+flat graphics (logos, few colours) lossless so edges stay exact.
+A sibling is only written when it is smaller than the original. Results
+are recorded in .sitefix/webp-manifest.json with the source hash, so
+unchanged sources are never re-encoded (including ones whose WebP lost).
+
+Rewriting (the webp-picture transform): an <img> whose src and every
+srcset candidate have a sibling is wrapped as
+
+    <picture><source type="image/webp" srcset="a.png.webp 480w, ..." sizes="...">
+    <img src="a.png" srcset="a.png 480w, ..." ...></picture>
+
+so browsers without WebP support keep loading the original.
+"""
+
+import hashlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from . import fingerprint
+from . import paths
+from . import refindex
+from . import state
+from .htmlstream import Rewriter
+from .transforms import transform
+
+MANIFEST_PATH = os.path.join(state.STATE_DIR, "webp-manifest.json")
+MANIFEST_VERSION = 1
+
+SOURCE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+SUFFIX = ".webp"
+
+DEFAULT_QUALITY = 80
+# Encoder effort, 0 (fast) to 6 (smallest); 6 is 2x slower for ~3% less
+METHOD = 4
+# Lossless effort, 0-100 (Pillow passes it as "quality" when lossless)
+LOSSLESS_EFFORT = 80
+# PNGs with more colours than this are treated as photographs and encoded
+# lossy; lossless WebP of a photo is both slow and larger than the PNG
+PHOTO_COLOURS = 4096
+
+# root -> set of rel_paths that have a WebP sibling, loaded once per process
+_siblings_by_root = {}
+
+
+def webp_path(rel_path):
+    return rel_path + SUFFIX
+
+
+def load_manifest(root):
+    return state.load_json(os.path.join(root, MANIFEST_PATH), MANIFEST_VERSION).get("images", {})
+
+
+def save_manifest(root, images):
+    state.save_json(os.path.join(root, MANIFEST_PATH), {"version": MANIFEST_VERSION, "images": images})
+
+
+def referenced_rasters(root, jobs=1):
+    """Repository-relative PNG/JPEG paths referenced by an <img> src or srcset"""
+    index = refindex.ReferenceIndex(root).scan(jobs)
+    rasters = set()
+    for source, refs in index.refs.items():
+        if not source.endswith(".html"):
+            continue
+        for kind, url in refs:
+            if kind not in ("src", "srcset", "data-src"):
+                continue
+            rel_path = paths.resolve(source, url)
+            if rel_path and rel_path.lower().endswith(SOURCE_EXTENSIONS) and rel_path in index.files:
+                rasters.add(rel_path)
+    return sorted(rasters)
+
+
+def is_photographic(img):
+    return img.getcolors(maxcolors=PHOTO_COLOURS) is None
+
+
+def encode(img, lossless, quality):
+    buffer = BytesIO()
+    img.save(buffer, "WEBP", lossless=lossless, quality=LOSSLESS_EFFORT if lossless else quality, method=METHOD)
+    return buffer.getvalue()
+
+
+def encode_image(root, rel_path, quality):
+    """
+    Worker unit: encode one raster. Returns (rel_path, original bytes,
+    webp bytes or 0, mode, error); writes the sibling only if it is smaller.
+    """
+    # Imported here: rewriting pages (the transform) must not need Pillow
+    from PIL import Image
+
+    path = os.path.join(root, rel_path)
+    try:
+        original = os.path.getsize(path)
+        with Image.open(path) as img:
+            img.load()
+            if img.mode not in ("RGB", "RGBA"):
+                has_alpha = img.mode in ("LA", "PA") or "transparency" in img.info
+                img = img.convert("RGBA" if has_alpha else "RGB")
+            if rel_path.lower().endswith(".png") and not is_photographic(img):
+                mode, data = "lossless", encode(img, True, quality)
+            else:
+                mode, data = f"q{quality}", encode(img, False, quality)
+    except (OSError, ValueError) as e:
+        return rel_path, 0, 0, None, str(e)
+
+    out_path = os.path.join(root, webp_path(rel_path))
+    if len(data) >= original:
+        if os.path.exists(out_path):
+            os.remove(out_path)
+        return rel_path, original, 0, mode, None
+    tmp_path = f"{out_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, out_path)
+    return rel_path, original, len(data), mode, None
+
+
+class BuildReport:
+    def __init__(self):
+        self.rasters = 0
+        self.unchanged = 0
+        self.encoded = []       # (rel_path, original, webp, mode)
+        self.not_smaller = []   # rel_paths
+        self.errors = []        # (rel_path, error)
+        self.seconds = 0.0
+
+    def print_summary(self, verbose=False):
+        original = sum(row[1] for row in self.encoded)
+        webp = sum(row[2] for row in self.encoded)
+        print("=" * 60)
+        print(f"Referenced rasters: {self.rasters} ({self.unchanged} unchanged since last build)")
+        print(f"WebP written: {len(self.encoded)}")
+        if verbose:
+            for rel_path, before, after, mode in self.encoded:
+                print(f"  ✓ {rel_path}: {before / 1024:.0f} KB -> {after / 1024:.0f} KB ({mode})")
+        print(f"Skipped, WebP not smaller: {len(self.not_smaller)}")
+        if verbose:
+            for rel_path in self.not_smaller:
+                print(f"  = {rel_path}")
+        for rel_path, error in self.errors:
+            print(f"  ❌ {rel_path}: {error}")
+        if original:
+            print(f"Bytes: {original / 1e6:.2f} MB -> {webp / 1e6:.2f} MB "
+                  f"({(1 - webp / original) * 100:.0f}% smaller)")
+        print(f"Time: {self.seconds:.1f} s")
+        print("=" * 60)
+
+
+def build(root, jobs=1, quality=DEFAULT_QUALITY, force=False):
+    """Encode WebP siblings for every referenced raster that needs one"""
+    report = BuildReport()
+    manifest = load_manifest(root)
+    rasters = referenced_rasters(root, jobs)
+    report.rasters = len(rasters)
+
+    todo = []
+    hashes = {}
+    for rel_path in rasters:
+        hashes[rel_path] = fingerprint.hash_file(os.path.join(root, rel_path))
+        entry = manifest.get(rel_path)
+        if (not force and entry and entry["source_hash"] == hashes[rel_path]
+                and entry["quality"] == quality
+                and (not entry["webp"] or os.path.exists(os.path.join(root, webp_path(rel_path))))):
+            report.unchanged += 1
+            continue
+        todo.append(rel_path)
+
+    start = time.perf_counter()
+    if jobs > 1 and len(todo) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(encode_image, [root] * len(todo), todo, [quality] * len(todo)))
+    else:
+        results = [encode_image(root, rel_path, quality) for rel_path in todo]
+    report.seconds = time.perf_counter() - start
+
+    for rel_path, original, size, mode, error in results:
+        if error:
+            report.errors.append((rel_path, error))
+            continue
+        manifest[rel_path] = {"source_hash": hashes[rel_path], "quality": quality,
+                              "webp": bool(size), "bytes": size, "original": original}
+        if size:
+            report.encoded.append((rel_path, original, size, mode))
+        else:
+            report.not_smaller.append(rel_path)
+    save_manifest(root, manifest)
+    _siblings_by_root.pop(os.path.abspath(root), None)
+    return report
+
+
+def get_siblings(root):
+    """Set of rel_paths with a current WebP sibling"""
+    root = os.path.abspath(root)
+    if root not in _siblings_by_root:
+        _siblings_by_root[root] = {rel_path for rel_path, entry in load_manifest(root).items()
+                                   if entry["webp"] and os.path.exists(os.path.join(root, webp_path(rel_path)))}
+    return _siblings_by_root[root]
+
+
+def siblings_version(root):
+    """Transform version: changes whenever the set of WebP siblings changes"""
+    digest = hashlib.sha256("\n".join(sorted(get_siblings(root))).encode("utf-8"))
+    return f"1-{digest.hexdigest()[:10]}"
+
+
+def webp_url(url, page, siblings):
+    """The WebP sibling's URL for url as written in page, or None"""
+    rel_path = paths.resolve(page.rel_path, url)
+    if rel_path not in siblings:
+        return None
+    path = paths.split_url(url)[0]
+    return path + SUFFIX
+
+
+def escape(value):
+    return value.replace("&", "&amp;").replace('"', "&quot;")
+
+
+def picture_rewriter(page, siblings):
+    """Rewriter wrapping each convertible <img> of page in a <picture>"""
+    rewriter = Rewriter()
+
+    @rewriter.rule("img")
+    def wrap_in_picture(token, ctx):
+        src = token.get("src")
+        if not src or ctx.ancestor("picture") is not None:
+            return None
+        candidates = paths.parse_srcset(token.get("srcset") or "") or [(src, "")]
+        converted = [(webp_url(url, page, siblings), descriptor) for url, descriptor in candidates]
+        if webp_url(src, page, siblings) is None or any(url is None for url, _ in converted):
+            return None
+        source = f'<source type="image/webp" srcset="{escape(paths.format_srcset(converted))}"'
+        if token.get("sizes"):
+            source += f' sizes="{escape(token.get("sizes"))}"'
+        return f"<picture>{source}>{token.text()}</picture>"
+
+    return rewriter
+
+
+@transform("webp-picture", version=siblings_version)
+def webp_picture(content, page):
+    """Serve WebP siblings through <picture> with the original as fallback"""
+    siblings = get_siblings(page.root)
+    if not siblings or "<img" not in content:
+        return content
+    return picture_rewriter(page, siblings).rewrite(content)
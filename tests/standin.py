@@ -0,0 +1,119 @@
+"""
+standin.py
+
+A local HTTP server standing in for the WordPress origin or archive.org in
+tests. Each path answers from a script of canned responses, and every
+request is recorded.
+
+    with StandIn() as server:
+        server.route("/a.jpg", (503, {"Retry-After": "1"}, b""), (200, {}, b"..."))
+        fetch(server.url("/a.jpg"))
+        server.hits("/a.jpg")       # [(method, path, headers), ...]
+
+A route without a query string also answers that path with any query.
+A path with no route answers 404. StandInTestCase gives each test a
+running server and an empty site root.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StandIn:
+    """Threaded HTTP server on a free local port, answering from scripts"""
+
+    def __init__(self):
+        self.routes = {}
+        self.requests = []          # (method, path with query, headers)
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+
+    def route(self, path, *responses):
+        """
+        Answer path with responses in turn, repeating the last. A response
+        is (status, headers, body), or a callable taking the request path
+        and headers and returning one.
+        """
+        with self._lock:
+            self.routes[path] = list(responses)
+
+    def url(self, path=""):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}{path}"
+
+    def hits(self, path):
+        with self._lock:
+            return [request for request in self.requests if request[1] == path]
+
+    def answer(self, method, path, headers):
+        with self._lock:
+            self.requests.append((method, path, headers))
+            script = self.routes.get(path) or self.routes.get(path.split("?")[0])
+            if not script:
+                return 404, {}, b"not found"
+            response = script.pop(0) if len(script) > 1 else script[0]
+        return response(path, headers) if callable(response) else response
+
+    def _handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                self.respond()
+
+            def do_HEAD(self):
+                self.respond()
+
+            def respond(self):
+                status, headers, body = standin.answer(self.command, self.path, self.headers)
+                if status in (204, 304) or self.command == "HEAD":
+                    body = b""
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class StandInTestCase(unittest.TestCase):
+    """self.server: a running StandIn; self.root: a temporary site root"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.server = StandIn().start()
+        self.addCleanup(self.server.stop)
+
+    def path(self, rel_path):
+        return os.path.join(self.root, rel_path)
+
+    def read(self, rel_path):
+        with open(self.path(rel_path), "rb") as f:
+            return f.read()
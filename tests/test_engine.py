@@ -0,0 +1,53 @@
+"""
+Incremental runs and the build manifest.
+
+    python3 -m pytest tests
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from sitefix import engine
+
+PAGE = '<html><head><link rel="stylesheet" href="css/custom-fixes.css?v=old"></head><body></body></html>\n'
+
+
+class IncrementalRunTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        os.makedirs(os.path.join(self.root, "css"))
+        self.write("css/custom-fixes.css", "body{color:red}\n")
+        self.write("index.html", PAGE)
+
+    def write(self, rel_path, text):
+        with open(os.path.join(self.root, rel_path), "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def read(self, rel_path):
+        with open(os.path.join(self.root, rel_path), encoding="utf-8") as f:
+            return f.read()
+
+    def test_subset_run_leaves_other_transforms_pending(self):
+        engine.run(self.root, ["fingerprint-assets"])
+        fingerprinted = self.read("index.html")
+        self.assertNotIn("?v=old", fingerprinted)
+
+        # custom-fixes-buster rewrites the page; fingerprint-assets never saw that
+        engine.run(self.root, ["custom-fixes-buster"])
+        self.assertIn("custom-fixes.css?v=final21", self.read("index.html"))
+
+        report = engine.run(self.root, ["fingerprint-assets"])
+        self.assertEqual(report.pages_skipped, 0)
+        self.assertEqual(self.read("index.html"), fingerprinted)
+
+    def test_unchanged_page_is_skipped(self):
+        engine.run(self.root, ["fingerprint-assets"])
+        report = engine.run(self.root, ["fingerprint-assets"])
+        self.assertEqual(report.pages_skipped, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
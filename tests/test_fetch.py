@@ -0,0 +1,132 @@
+"""
+Downloader and recover against a local stand-in for the origin.
+
+    python3 -m pytest tests
+"""
+
+import os
+import time
+import unittest
+
+from sitefix import recover
+from sitefix.fetch import Downloader, retry_after_seconds
+from standin import StandInTestCase
+
+STUB = b"version https://git-lfs.github.com/spec/v1\noid sha256:0123\nsize 4096\n"
+
+
+class DownloaderTest(StandInTestCase):
+    def fetch(self, url_path, rel_path, **kwargs):
+        kwargs.setdefault("backoff", 0.01)
+        revalidate = kwargs.pop("revalidate", True)
+        with Downloader(self.root, **kwargs) as downloader:
+            return downloader.fetch(self.server.url(url_path), self.path(rel_path), revalidate)
+
+    def test_download(self):
+        self.server.route("/a.css", (200, {"ETag": '"v1"'}, b"body{}"))
+        result = self.fetch("/a.css", "css/a.css")
+        self.assertEqual(result.status, "downloaded")
+        self.assertEqual(result.bytes, 6)
+        self.assertEqual(self.read("css/a.css"), b"body{}")
+        self.assertEqual([name for name in os.listdir(self.path("css"))], ["a.css"])
+
+    def test_revalidates_with_remembered_etag(self):
+        def answer(path, headers):
+            if headers.get("If-None-Match") == '"v1"':
+                return 304, {}, b""
+            return 200, {"ETag": '"v1"'}, b"body{}"
+
+        self.server.route("/a.css", answer)
+        self.assertEqual(self.fetch("/a.css", "css/a.css").status, "downloaded")
+        result = self.fetch("/a.css", "css/a.css")
+        self.assertEqual(result.status, "not-modified")
+        self.assertEqual(result.http_status, 304)
+        self.assertEqual(self.server.hits("/a.css")[-1][2].get("If-None-Match"), '"v1"')
+
+    def test_retries_server_errors(self):
+        self.server.route("/a.js", (503, {}, b""), (500, {}, b""), (200, {}, b"ok()"))
+        result = self.fetch("/a.js", "a.js", retries=3)
+        self.assertEqual(result.status, "downloaded")
+        self.assertEqual(result.attempts, 3)
+        self.assertEqual(self.read("a.js"), b"ok()")
+
+    def test_gives_up_after_retries(self):
+        self.server.route("/a.js", (503, {}, b""))
+        result = self.fetch("/a.js", "a.js", retries=2)
+        self.assertEqual(result.status, "failed")
+        self.assertEqual(result.attempts, 3)
+        self.assertEqual(result.error, "HTTP 503")
+        self.assertFalse(os.path.exists(self.path("a.js")))
+
+    def test_honours_retry_after(self):
+        self.server.route("/a.js", (429, {"Retry-After": "1"}, b""), (200, {}, b"ok()"))
+        start = time.monotonic()
+        result = self.fetch("/a.js", "a.js")
+        self.assertEqual(result.status, "downloaded")
+        self.assertGreaterEqual(time.monotonic() - start, 1)
+
+    def test_caps_retry_after(self):
+        self.server.route("/a.js", (503, {"Retry-After": "3600"}, b""), (200, {}, b"ok()"))
+        start = time.monotonic()
+        result = self.fetch("/a.js", "a.js", max_retry_after=0.2)
+        self.assertEqual(result.status, "downloaded")
+        self.assertLess(time.monotonic() - start, 5)
+
+    def test_retry_after_forms(self):
+        self.assertEqual(retry_after_seconds("120"), 120)
+        self.assertAlmostEqual(retry_after_seconds(time.strftime(
+            "%a, %d %b %Y %H:%M:%S GMT", time.gmtime(time.time() + 30))), 30, delta=2)
+        self.assertEqual(retry_after_seconds("Thu, 01 Jan 1970 00:00:00 GMT"), 0)
+        self.assertIsNone(retry_after_seconds("soon"))
+        self.assertIsNone(retry_after_seconds(None))
+
+    def test_not_found_is_not_retried(self):
+        result = self.fetch("/missing.png", "missing.png", retries=3)
+        self.assertEqual(result.status, "failed")
+        self.assertEqual(result.http_status, 404)
+        self.assertEqual(result.attempts, 1)
+        self.assertEqual(result.error, "HTTP 404")
+        self.assertFalse(os.path.exists(self.path("missing.png")))
+
+
+class RecoverTest(StandInTestCase):
+    def test_maps_local_paths_to_origin(self):
+        self.server.route("/wp-content/uploads/2021/09/a.jpg", (200, {}, b"jpeg"))
+        self.server.route("/wp-includes/js/jquery.min.js?ver=3", (200, {}, b"jquery"))
+        results, unmapped = recover.recover(
+            self.root, ["assets/uploads/2021/09/a.jpg", "wp-includes/js/jquery.min_ver=3.js", "css/local.css"],
+            origin=self.server.url())
+        self.assertEqual(unmapped, ["css/local.css"])
+        self.assertEqual([result.status for result in results], ["downloaded", "downloaded"])
+        self.assertEqual(self.read("assets/uploads/2021/09/a.jpg"), b"jpeg")
+        self.assertEqual(self.read("wp-includes/js/jquery.min_ver=3.js"), b"jquery")
+
+    def test_missing_on_origin(self):
+        results, _ = recover.recover(self.root, ["assets/uploads/gone.png"], origin=self.server.url(), retries=1)
+        self.assertEqual(results[0].status, "failed")
+        self.assertEqual(results[0].http_status, 404)
+
+    def test_replaces_lfs_stub(self):
+        # An origin that answers any conditional request with 304 would
+        # otherwise leave the freshly checked-out stub in place
+        def answer(path, headers):
+            if headers.get("If-Modified-Since") or headers.get("If-None-Match"):
+                return 304, {}, b""
+            return 200, {"Last-Modified": "Mon, 01 Feb 2021 00:00:00 GMT"}, b"\x00" * 4096
+
+        self.server.route("/wp-content/uploads/video.mp4", answer)
+        os.makedirs(self.path("assets/uploads"))
+        with open(self.path("assets/uploads/video.mp4"), "wb") as f:
+            f.write(STUB)
+        results, _ = recover.recover(self.root, ["assets/uploads/video.mp4"], origin=self.server.url())
+        self.assertEqual(results[0].status, "downloaded")
+        self.assertEqual(self.read("assets/uploads/video.mp4"), b"\x00" * 4096)
+        self.assertIsNone(self.server.hits("/wp-content/uploads/video.mp4")[0][2].get("If-Modified-Since"))
+
+        # The real file, once on disk, is revalidated as usual
+        results, _ = recover.recover(self.root, ["assets/uploads/video.mp4"], origin=self.server.url())
+        self.assertEqual(results[0].status, "not-modified")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+"""
+HTTPCache against a local stand-in server.
+
+    python3 -m pytest tests
+"""
+
+import unittest
+
+import requests
+
+from sitefix.httpcache import HTTPCache, entry_key
+from standin import StandInTestCase
+
+
+class HTTPCacheTest(StandInTestCase):
+    def setUp(self):
+        super().setUp()
+        self.session = requests.Session()
+        self.addCleanup(self.session.close)
+
+    def test_fresh_entry_needs_no_request(self):
+        self.server.route("/a.json", (200, {}, b"[1]"))
+        cache = HTTPCache(self.root)
+        first = cache.get(self.session, self.server.url("/a.json"), ttl=3600)
+        second = cache.get(self.session, self.server.url("/a.json"), ttl=3600)
+        self.assertFalse(first.from_cache)
+        self.assertTrue(second.from_cache)
+        self.assertEqual(second.json(), [1])
+        self.assertEqual(len(self.server.hits("/a.json")), 1)
+        self.assertEqual(cache.stats(), "1 cached, 0 revalidated, 1 fetched")
+
+    def test_stale_entry_is_revalidated(self):
+        def answer(path, headers):
+            if headers.get("If-None-Match") == '"v1"':
+                return 304, {}, b""
+            return 200, {"ETag": '"v1"', "Last-Modified": "Mon, 01 Feb 2021 00:00:00 GMT"}, b"body"
+
+        self.server.route("/a.css", answer)
+        cache = HTTPCache(self.root)
+        cache.get(self.session, self.server.url("/a.css"))
+        cache.save()
+
+        cache = HTTPCache(self.root)
+        response = cache.get(self.session, self.server.url("/a.css"), ttl=0)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"body")
+        self.assertTrue(response.from_cache)
+        self.assertEqual(cache.revalidated, 1)
+        headers = self.server.hits("/a.css")[-1][2]
+        self.assertEqual(headers.get("If-None-Match"), '"v1"')
+        self.assertEqual(headers.get("If-Modified-Since"), "Mon, 01 Feb 2021 00:00:00 GMT")
+
+    def test_changed_entry_is_replaced(self):
+        self.server.route("/a.css", (200, {"ETag": '"v1"'}, b"old"), (200, {"ETag": '"v2"'}, b"new"))
+        cache = HTTPCache(self.root)
+        cache.get(self.session, self.server.url("/a.css"))
+        response = cache.get(self.session, self.server.url("/a.css"), ttl=0)
+        self.assertFalse(response.from_cache)
+        self.assertEqual(response.content, b"new")
+        self.assertEqual(cache.read(cache.lookup("GET", self.server.url("/a.css"))), b"new")
+
+    def test_not_found_is_cached(self):
+        cache = HTTPCache(self.root)
+        cache.get(self.session, self.server.url("/gone.png"))
+        response = cache.get(self.session, self.server.url("/gone.png"))
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(response.from_cache)
+        self.assertEqual(len(self.server.hits("/gone.png")), 1)
+
+    def test_request_options_are_part_of_the_key(self):
+        self.server.route("/old", (301, {"Location": "/new"}, b""))
+        self.server.route("/new", (200, {}, b"page"))
+        cache = HTTPCache(self.root)
+        url = self.server.url("/old")
+        redirect = cache.get(self.session, url, allow_redirects=False)
+        followed = cache.get(self.session, url)
+        self.assertEqual(redirect.status_code, 301)
+        self.assertEqual(redirect.headers["Location"], "/new")
+        self.assertEqual(followed.status_code, 200)
+        self.assertEqual(followed.content, b"page")
+
+        # Each is answered from its own entry; the timeout does not matter
+        self.assertEqual(cache.get(self.session, url, allow_redirects=False, timeout=5).status_code, 301)
+        self.assertEqual(cache.get(self.session, url, allow_redirects=True, timeout=5).status_code, 200)
+        self.assertEqual(cache.hits, 2)
+        self.assertEqual(entry_key("GET", url, {"allow_redirects": True, "timeout": 5}), entry_key("GET", url))
+        self.assertNotEqual(entry_key("GET", url, {"headers": {"Range": "bytes=0-99"}}), entry_key("GET", url))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,28 @@
+"""
+minify_js around "/" that may start a regex or be a division.
+
+    python3 -m pytest tests
+"""
+
+import unittest
+
+from sitefix.minify import minify_js
+
+
+class MinifyJSTest(unittest.TestCase):
+    def test_regex_after_condition(self):
+        self.assertEqual(minify_js("if (a) /x +y/.test( s )"), "if(a)/x +y/.test(s)\n")
+        self.assertEqual(minify_js("while (x) /a b/.exec(s)"), "while(x)/a b/.exec(s)\n")
+
+    def test_division_after_parenthesis(self):
+        self.assertEqual(minify_js("z = (a + b) / 2 ; r = /a +b/g"), "z=(a+b)/2;r=/a +b/g\n")
+        self.assertEqual(minify_js("f(g(1)) / 2 / 3"), "f(g(1))/2/3\n")
+
+    def test_unclassifiable_slash_stops_minifying(self):
+        self.assertEqual(minify_js("function f() { }\n/a b/.test( s );\nx = 1"),
+                         "function f(){}\n/a b/.test( s );\nx = 1\n")
+        self.assertEqual(minify_js("var b = a ++ / 2 ;  c = 1"), "var b=a++ / 2 ;  c = 1\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+"""
+The default pipeline over a small site: three pages sharing a stylesheet,
+scripts, an inline block and repeated style attributes.
+
+    python3 -m pytest tests
+"""
+
+import base64
+import os
+import shutil
+import tempfile
+import unittest
+
+from sitefix import engine, hoist, styleclasses
+
+# A 1x1 PNG
+PNG = base64.b64decode("iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg==")
+
+# Long enough to be hoisted
+SHARED_CSS = "".join(f".shared-{i}{{color:#333;margin:0 auto;max-width:{1000 + i}px}}" for i in range(40))
+
+PAGE = """<!DOCTYPE html>
+<html lang="en-US">
+<head>
+	<meta charset="UTF-8">
+	<title>{title}</title>
+	<link rel="stylesheet" id="site-css" href="{up}css/site.css?ver=1" type="text/css" media="all">
+	<style id="shared-inline-css">{shared}</style>
+	<script type="text/javascript" src="{up}js/a.js"></script>
+	<script type="text/javascript" src="{up}js/b.js"></script>
+</head>
+<body class="home">
+	<div class="et_pb_section et_pb_section_0 header">
+		<h1>{title}</h1>
+		<img src="{up}images/hero.png" alt="Hero">
+	</div>
+	<p style="color: #ffffff;">One</p>
+	<p style="color: #ffffff;">Two</p>
+	<a id="cancel-comment-reply-link" style="display:none;" href="#respond">Cancel reply</a>
+	<div class="footer">Footer   text</div>
+</body>
+</html>
+"""
+
+FILES = {
+    "css/site.css": "body{margin:0}\n.header{background:#123;color:#fff}\n.header h1{font-size:2em}\n"
+                    ".footer{padding:40px}\n",
+    "css/custom-fixes.css": ".custom-donate-button{position:fixed}\n",
+    "js/custom-menu.js": "document.documentElement.className += ' js';\n",
+    "js/a.js": "console.log(1);\n",
+    "js/b.js": "console.log(2);\n",
+}
+
+PAGES = {"index.html": "Home", "about/index.html": "About", "news/index.html": "News"}
+
+
+class SiteTestCase(unittest.TestCase):
+    """self.root: the small site, with the style-classes and hoist manifests built"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        for rel_path, text in FILES.items():
+            self.write(rel_path, text)
+        for rel_path, title in PAGES.items():
+            self.write(rel_path, PAGE.format(title=title, up="../" * rel_path.count("/"), shared=SHARED_CSS))
+        self.write("images/hero.png", PNG)
+        styleclasses.build(self.root)
+        hoist.build(self.root)
+
+    def write(self, rel_path, data):
+        path = os.path.join(self.root, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb" if isinstance(data, bytes) else "w") as f:
+            f.write(data)
+
+
+class PipelineTest(SiteTestCase):
+    def test_full_rerun_over_minified_pages_changes_nothing(self):
+        first = engine.run(self.root)
+        self.assertEqual(len(first.written), len(PAGES))
+        self.assertGreater(first.pages_changed["minify-html"], 0)
+
+        # Every transform sees a minified page and must leave it alone,
+        # not change it and rely on minify-html to change it back
+        report = engine.run(self.root, incremental=False)
+        self.assertEqual(report.written, [])
+        self.assertEqual({name: count for name, count in report.pages_changed.items() if count}, {})
+
+    def test_second_run_skips_every_page(self):
+        engine.run(self.root)
+        self.assertEqual(engine.run(self.root).pages_skipped, len(PAGES))
+
+
+if __name__ == "__main__":
+    unittest.main()
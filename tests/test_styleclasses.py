@@ -0,0 +1,30 @@
+"""
+style-classes: which values may become classes, and retired classes.
+
+    python3 -m pytest tests
+"""
+
+import os
+import unittest
+
+from sitefix import engine, styleclasses
+
+
+class StyleClassesTest(unittest.TestCase):
+    def test_values_scripts_clear_stay_inline(self):
+        self.assertEqual(styleclasses.normalize("Color: #fff; ", "index.html"), "color:#fff")
+        self.assertIsNone(styleclasses.normalize("display: none", "index.html"))
+        self.assertIsNone(styleclasses.normalize("color: red; visibility: hidden", "index.html"))
+        self.assertIsNone(styleclasses.normalize("color: red !important", "index.html"))
+
+    def test_retired_class_is_turned_back_into_style(self):
+        page = engine.Page("/site", os.path.join("/site", "a", "index.html"))
+        retired = {"display:none": {"class": "sx-57cpa"}, "background:url(images/a.png)": {"class": "sx-abcde"}}
+        content = '<a id="cancel" class="sx-57cpa">x</a><div class="box sx-abcde" style="color:red"></div>'
+        self.assertEqual(styleclasses.restore_styles(content, page, retired),
+                         '<a id="cancel" style="display:none">x</a>'
+                         '<div class="box" style="background:url(&quot;../images/a.png&quot;);color:red"></div>')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+"""
+YouTube posters against a local stand-in for i.ytimg.com, and defer-gtm.
+
+    python3 -m pytest tests
+"""
+
+import os
+import unittest
+
+from sitefix import engine, thirdparty
+from standin import StandInTestCase
+
+GTM = """    <!-- Google Tag Manager -->
+    <script>
+      ;(function (w, d, s, l, i) {
+        j.src = 'https://www.googletagmanager.com/gtm.js?id=' + i + dl
+      })(window, document, 'script', 'dataLayer', 'GTM-PNNTMXLN')
+    </script>
+    <!-- End Google Tag Manager -->
+"""
+
+PAGE = f"""<!DOCTYPE html>
+<html lang="en-US">
+
+<head>
+{GTM}\t<meta charset="UTF-8">
+\t<title>Page</title>
+</head>
+<body>
+{GTM}<noscript><iframe src="https://www.googletagmanager.com/ns.html?id=GTM-PNNTMXLN"></iframe></noscript>
+</body>
+</html>
+"""
+
+
+class PosterTest(StandInTestCase):
+    def test_best_thumbnail_is_cached(self):
+        self.server.route("/vi/AAAAAAAAAAA/maxresdefault.jpg", (200, {}, b"hd"))
+        self.server.route("/vi/BBBBBBBBBBB/hqdefault.jpg", (200, {}, b"hq"))
+        results = thirdparty.fetch_posters(self.root, ["AAAAAAAAAAA", "BBBBBBBBBBB", "CCCCCCCCCCC"],
+                                           base=self.server.url("/vi"))
+        self.assertEqual({vid: result.status for vid, result in results.items()},
+                         {"AAAAAAAAAAA": "downloaded", "BBBBBBBBBBB": "downloaded", "CCCCCCCCCCC": "failed"})
+        self.assertEqual(self.read(thirdparty.poster_rel_path("AAAAAAAAAAA")), b"hd")
+        self.assertEqual(self.read(thirdparty.poster_rel_path("BBBBBBBBBBB")), b"hq")
+        self.assertEqual(thirdparty.get_posters(self.root), {"AAAAAAAAAAA", "BBBBBBBBBBB"})
+        # hqdefault is only tried where maxresdefault is missing
+        self.assertEqual(self.server.hits("/vi/AAAAAAAAAAA/hqdefault.jpg"), [])
+
+    def test_existing_posters_are_not_fetched_again(self):
+        self.server.route("/vi/AAAAAAAAAAA/maxresdefault.jpg", (200, {}, b"hd"))
+        thirdparty.fetch_posters(self.root, ["AAAAAAAAAAA"], base=self.server.url("/vi"))
+        self.assertEqual(thirdparty.fetch_posters(self.root, ["AAAAAAAAAAA"], base=self.server.url("/vi")), {})
+        self.assertEqual(len(self.server.hits("/vi/AAAAAAAAAAA/maxresdefault.jpg")), 1)
+
+
+class DeferGTMTest(unittest.TestCase):
+    def defer(self, content):
+        return thirdparty.defer_gtm(content, engine.Page("/site", os.path.join("/site", "index.html")))
+
+    def test_one_loader_after_charset(self):
+        result = self.defer(PAGE)
+        self.assertEqual(result.count("<!-- Google Tag Manager (deferred) -->"), 1)
+        self.assertNotIn("<!-- Google Tag Manager -->", result)
+        self.assertIn("'GTM-PNNTMXLN')", result)
+        self.assertIn("ns.html?id=GTM-PNNTMXLN", result)
+        charset = result.index("<meta charset")
+        self.assertLess(charset, 1024)
+        self.assertLess(charset, result.index("<!-- Google Tag Manager (deferred) -->"))
+
+    def test_idempotent(self):
+        result = self.defer(PAGE)
+        self.assertEqual(self.defer(result), result)
+
+    def test_loader_before_charset_is_moved(self):
+        loader = thirdparty.DEFERRED_GTM % {"id": "GTM-PNNTMXLN"}
+        page = PAGE.replace(GTM, "").replace("<head>\n", "<head>\n" + loader, 1)
+        result = self.defer(page)
+        self.assertLess(result.index("<meta charset"), result.index(loader))
+        self.assertEqual(result.count(loader), 1)
+
+    def test_page_without_gtm(self):
+        page = PAGE.replace(GTM, "")
+        self.assertIs(self.defer(page), page)
+
+
+if __name__ == "__main__":
+    unittest.main()
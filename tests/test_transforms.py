@@ -0,0 +1,55 @@
+"""
+The transform registry, DEFAULT_PIPELINE and the idempotence contract.
+
+    python3 -m pytest tests
+"""
+
+import os
+import unittest
+
+from sitefix import engine, transforms
+from test_pipeline import PAGES, SiteTestCase
+
+
+class RegistryTest(unittest.TestCase):
+    def test_default_pipeline_is_registered(self):
+        pipeline = transforms.DEFAULT_PIPELINE
+        self.assertEqual([t.name for t in transforms.get_transforms(pipeline)], pipeline)
+        self.assertEqual(len(set(pipeline)), len(pipeline))
+        with self.assertRaises(KeyError):
+            transforms.get_transforms(["no-such-transform"])
+
+    def test_default_pipeline_order(self):
+        order = transforms.DEFAULT_PIPELINE.index
+        # Paths are final before assets are fingerprinted or hoisted
+        for name in ("wp-content-to-assets", "absolute-domain-assets"):
+            self.assertLess(order(name), order("hoist-inline"))
+            self.assertLess(order(name), order("fingerprint-assets"))
+        self.assertLess(order("hoist-inline"), order("bundle-assets"))
+        self.assertLess(order("bundle-assets"), order("critical-css"))
+        self.assertEqual(transforms.DEFAULT_PIPELINE[-1], "minify-html")
+
+
+class IdempotenceTest(SiteTestCase):
+    def test_every_transform_leaves_its_own_output_alone(self):
+        for rel_path in PAGES:
+            page = engine.Page(self.root, os.path.join(self.root, rel_path))
+            content = engine.read_page(page.path)
+            for t in transforms.get_transforms(transforms.DEFAULT_PIPELINE):
+                with self.subTest(page=rel_path, transform=t.name):
+                    once = t(content, page)
+                    self.assertEqual(t(once, page), once)
+                content = once
+
+    def test_every_transform_leaves_pipeline_output_alone(self):
+        engine.run(self.root)
+        for rel_path in PAGES:
+            page = engine.Page(self.root, os.path.join(self.root, rel_path))
+            content = engine.read_page(page.path)
+            for t in transforms.get_transforms(transforms.DEFAULT_PIPELINE):
+                with self.subTest(page=rel_path, transform=t.name):
+                    self.assertEqual(t(content, page), content)
+
+
+if __name__ == "__main__":
+    unittest.main()
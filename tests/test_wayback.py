@@ -0,0 +1,125 @@
+"""
+Wayback Machine recovery against a local stand-in for archive.org.
+
+    python3 -m pytest tests
+"""
+
+import json
+import os
+import re
+import unittest
+from urllib.parse import parse_qs, urlsplit
+
+from sitefix import wayback
+from standin import StandInTestCase
+from test_fetch import STUB
+
+# (original, timestamp, statuscode) as archive.org would list them
+CAPTURES = [
+    ("https://srrn.net/wp-content/uploads/2021/09/a.jpg", "20211001000000", "200"),
+    ("https://www.srrn.net/wp-content/uploads/2021/09/a.jpg", "20230101000000", "200"),
+    # The newest capture of b.jpg is a redirect: the older 200 is used
+    ("https://srrn.net/wp-content/uploads/2021/09/b.jpg", "20210915000000", "200"),
+    ("https://srrn.net/wp-content/uploads/2021/09/b.jpg", "20240101000000", "302"),
+    ("https://srrn.net/wp-content/uploads/2021/09/never.jpg", "20220101000000", "404"),
+    ("http://srrn.net/wp-content/uploads/2019/05/d.png?ver=2", "20190601000000", "200"),
+    ("https://srrn.net/wp-content/uploads/2020/01/clip.mp4", "20200201000000", "200"),
+]
+
+
+def cdx(path, headers):
+    """The CDX API over CAPTURES: prefix queries, original:regex filters"""
+    query = parse_qs(urlsplit(path).query)
+    prefix = query["url"][0]
+    filters = [re.compile(f[len("original:"):]) for f in query.get("filter", [])]
+    fields = query["fl"][0].split(",")
+    rows = [fields]
+    for original, timestamp, status in CAPTURES:
+        if not wayback.url_key(original).startswith(prefix):
+            continue
+        if any(not f.fullmatch(original) for f in filters):
+            continue
+        row = {"original": original, "timestamp": timestamp, "statuscode": status,
+               "mimetype": "image/jpeg", "length": "100"}
+        rows.append([row[field] for field in fields])
+    return 200, {"Content-Type": "application/json"}, json.dumps(rows).encode("utf-8")
+
+
+class WaybackTest(StandInTestCase):
+    def setUp(self):
+        super().setUp()
+        self.server.route("/cdx/search/cdx", cdx)
+
+    def cdx_queries(self):
+        return [parse_qs(urlsplit(path).query) for _, path, _ in self.server.requests
+                if path.startswith("/cdx/")]
+
+    def lookup(self, rel_paths):
+        recovery = wayback.WaybackRecovery(self.root, archive=self.server.url(), rate=1000)
+        try:
+            targets = wayback.make_targets(rel_paths)
+            recovery.lookup(targets)
+        finally:
+            recovery.close()
+        self.assertEqual(recovery.errors, [])
+        return {target.rel_path: target.capture for target in targets}
+
+    def test_lookup_batches_by_directory(self):
+        captures = self.lookup(["assets/uploads/2021/09/a.jpg", "assets/uploads/2021/09/b.jpg",
+                                "assets/uploads/2021/09/never.jpg", "assets/uploads/2020/01/clip.mp4"])
+        self.assertEqual(captures, {
+            "assets/uploads/2021/09/a.jpg": ("20230101000000", "https://www.srrn.net/wp-content/uploads/2021/09/a.jpg"),
+            "assets/uploads/2021/09/b.jpg": ("20210915000000", "https://srrn.net/wp-content/uploads/2021/09/b.jpg"),
+            "assets/uploads/2021/09/never.jpg": None,
+            "assets/uploads/2020/01/clip.mp4": ("20200201000000", "https://srrn.net/wp-content/uploads/2020/01/clip.mp4"),
+        })
+        self.assertEqual(sorted(query["url"][0] for query in self.cdx_queries()),
+                         ["srrn.net/wp-content/uploads/2020/01/", "srrn.net/wp-content/uploads/2021/09/"])
+
+    def test_lookup_by_name_without_origin_path(self):
+        captures = self.lookup(["images/d.png"])
+        self.assertEqual(captures["images/d.png"],
+                         ("20190601000000", "http://srrn.net/wp-content/uploads/2019/05/d.png?ver=2"))
+        [query] = self.cdx_queries()
+        self.assertEqual(query["url"], [f"{wayback.DOMAIN}/{wayback.FALLBACK_PREFIX}"])
+        self.assertEqual(len(query["filter"]), 1)
+
+    def test_lookups_are_cached(self):
+        self.lookup(["assets/uploads/2021/09/a.jpg"])
+        self.lookup(["assets/uploads/2021/09/a.jpg"])
+        self.assertEqual(len(self.cdx_queries()), 1)
+
+    def test_cdx_errors_are_collected(self):
+        self.server.route("/cdx/search/cdx", (503, {}, b""))
+        recovery = wayback.WaybackRecovery(self.root, archive=self.server.url(), rate=1000)
+        targets = wayback.make_targets(["assets/uploads/2021/09/a.jpg"])
+        self.assertEqual(recovery.lookup(targets), [])
+        recovery.close()
+        self.assertEqual(len(recovery.errors), 1)
+        self.assertIn("503", recovery.errors[0][1])
+
+    def test_downloads_raw_captures(self):
+        self.server.route("/web/20230101000000id_/https://www.srrn.net/wp-content/uploads/2021/09/a.jpg",
+                          (200, {}, b"jpeg"))
+        self.server.route("/web/20200201000000id_/https://srrn.net/wp-content/uploads/2020/01/clip.mp4",
+                          (200, {}, b"\x00" * 4096))
+        os.makedirs(self.path("assets/uploads/2020/01"))
+        with open(self.path("assets/uploads/2020/01/clip.mp4"), "wb") as f:
+            f.write(STUB)
+        self.assertEqual(wayback.lfs_stubs(self.root), ["assets/uploads/2020/01/clip.mp4"])
+
+        targets, results, errors, _ = wayback.recover_from_wayback(
+            self.root, ["assets/uploads/2021/09/a.jpg", "assets/uploads/2020/01/clip.mp4",
+                        "assets/uploads/2021/09/never.jpg"],
+            archive=self.server.url(), rate=1000)
+        self.assertEqual(errors, [])
+        self.assertEqual(len(targets), 3)
+        self.assertEqual(sorted(result.status for result in results), ["downloaded", "downloaded"])
+        self.assertEqual(self.read("assets/uploads/2021/09/a.jpg"), b"jpeg")
+        self.assertEqual(self.read("assets/uploads/2020/01/clip.mp4"), b"\x00" * 4096)
+        self.assertEqual(wayback.lfs_stubs(self.root), [])
+        self.assertFalse(os.path.exists(self.path("assets/uploads/2021/09/never.jpg")))
+
+
+if __name__ == "__main__":
+    unittest.main()